@@ -0,0 +1,144 @@
+"""
+Admission control for agent turns
+At most CALLTAKER_MAX_CONCURRENT_TURNS turns run at once per worker; further requests wait in a
+bounded FIFO queue for up to CALLTAKER_ADMISSION_MAX_WAIT seconds. Requests that can't get a slot
+in time are shed straight away with a Retry-After hint instead of piling onto the model API:
+429 when the queue is full, 503 when the expected (or actual) wait exceeds the deadline.
+"""
+
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from src.agent.metrics import ADMISSION_SHED, ADMISSION_WAIT
+
+# Weight of the latest turn in the moving average of turn time used to estimate waits
+SERVICE_TIME_ALPHA = 0.2
+
+
+class Overloaded(Exception):
+    """A request was shed by admission control"""
+
+    def __init__(self, reason: str, status_code: int, retry_after: int):
+        super().__init__(f"Server is busy ({reason.replace('_', ' ')}), please retry in {retry_after}s")
+        self.reason = reason
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Concurrency limit with a bounded, deadline-aware wait queue (for one event loop)"""
+
+    def __init__(self, max_concurrent: int = 32, max_queue: int = 64, max_wait: float = 2.0,
+                 initial_service_seconds: float = 1.0):
+        """
+        Args:
+            max_concurrent: Turns running at once (<= 0 admits everything)
+            max_queue: Requests allowed to wait for a slot
+            max_wait: Default seconds a request may wait before it is shed
+            initial_service_seconds: Turn time assumed until turns have been measured
+        """
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.active = 0
+        self.service_seconds = initial_service_seconds
+        self._waiters: deque = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def expected_wait(self, position: int) -> float:
+        """Estimated seconds until the request at this queue position (1 = next) gets a slot"""
+        return position * self.service_seconds / max(self.max_concurrent, 1)
+
+    def retry_after(self) -> int:
+        """Whole seconds a shed client should wait before retrying"""
+        return max(1, math.ceil(self.expected_wait(self.waiting + 1)))
+
+    def _shed(self, reason: str, status_code: int) -> Overloaded:
+        ADMISSION_SHED.inc(reason)
+        return Overloaded(reason, status_code, self.retry_after())
+
+    async def acquire(self, max_wait: Optional[float] = None) -> float:
+        """Wait for a turn slot; returns the seconds waited or raises Overloaded"""
+        if self.max_concurrent <= 0 or (self.active < self.max_concurrent and not self._waiters):
+            self.active += 1
+            ADMISSION_WAIT.observe(0.0)
+            return 0.0
+        max_wait = self.max_wait if max_wait is None else max_wait
+        if self.waiting >= self.max_queue:
+            raise self._shed("queue_full", 429)
+        if self.expected_wait(self.waiting + 1) > max_wait:
+            # Would only time out in the queue: refuse now while the client can still retry elsewhere
+            raise self._shed("deadline", 503)
+
+        started = time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait([waiter], timeout=max_wait)
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+        if not waiter.done():
+            self._abandon(waiter)
+            raise self._shed("timeout", 503)
+        waited = time.monotonic() - started
+        ADMISSION_WAIT.observe(waited)
+        return waited
+
+    def _abandon(self, waiter: asyncio.Future) -> None:
+        if waiter.done() and not waiter.cancelled():
+            # The slot was handed over just as the request gave up: pass it on
+            self.release()
+            return
+        waiter.cancel()
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def release(self, service_seconds: Optional[float] = None) -> None:
+        """Free a slot (handing it to the next waiter), recording how long the turn took"""
+        if service_seconds is not None:
+            self.service_seconds += SERVICE_TIME_ALPHA * (service_seconds - self.service_seconds)
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self, max_wait: Optional[float] = None) -> AsyncIterator[float]:
+        """Hold a turn slot for the body of the block; yields the seconds spent waiting"""
+        waited = await self.acquire(max_wait)
+        started = time.monotonic()
+        try:
+            yield waited
+        finally:
+            self.release(time.monotonic() - started)
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "service_seconds": round(self.service_seconds, 3),
+        }
+
+
+def create_admission_controller() -> AdmissionController:
+    """Controller configured from CALLTAKER_MAX_CONCURRENT_TURNS / _ADMISSION_QUEUE / _ADMISSION_MAX_WAIT"""
+    return AdmissionController(
+        max_concurrent=int(os.getenv("CALLTAKER_MAX_CONCURRENT_TURNS", "32")),
+        max_queue=int(os.getenv("CALLTAKER_ADMISSION_QUEUE", "64")),
+        max_wait=float(os.getenv("CALLTAKER_ADMISSION_MAX_WAIT", "2.0")),
+    )
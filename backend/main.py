@@ -3,17 +3,36 @@ FastAPI Backend for Alora Call Taker
 Wraps the LangGraph agent and provides REST API endpoints
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
+import asyncio
+import hmac
+import json
+import resource
 import sys
+import time
 import os
 
 # Add parent directory to path to import agent
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.agent.utils import process_user_message
+from src.agent import metrics
+from src.agent.budget import reply_reserve, turn_budget
+from src.agent.cache import extraction_cache, reply_cache
+from src.agent.clients import close_http_clients
+from src.agent.speculation import discard as discard_speculation
+from src.agent.utils import aprocess_user_message, astream_user_message
+from src.agent.state import SessionState as AgentSession
+from src.agent.submission import OutboxFull, get_submission_pipeline
+from src.agent.tracing import recorder as trace_recorder
+from src.agent.warmup import warm_up, warmup_status
+from backend.admission import Overloaded, create_admission_controller
+from backend.turns import SessionLocks, TurnMismatch, remember_turn, replayed_turn, turn_key, turn_replay
+from backend.state_patch import json_patch, state_view
+from backend.session_store import StoredSession, VersionConflict, create_session_store
 
 app = FastAPI(title="Alora Call Taker API", version="1.0.0")
 
@@ -24,21 +43,38 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Read by the frontend when it resends a shed or replayed turn
+    expose_headers=["Retry-After", "X-Turn-Replayed"],
 )
 
-# In-memory session storage (in production, use Redis or database)
-sessions: Dict[str, Dict[str, Any]] = {}
+# Session storage, selected with CALLTAKER_SESSION_STORE (memory or sqlite for multiple workers)
+session_store = create_session_store()
+
+# Caps concurrent turns per worker and sheds requests that would wait too long (see admission.py)
+admission = create_admission_controller()
+
+# Turns of one session run one at a time in this worker (see turns.py)
+session_locks = SessionLocks()
 
 
 class ChatMessage(BaseModel):
     session_id: str
     message: str
+    # Session version whose state the client holds; the response then carries only a delta from it
+    base_version: Optional[int] = None
+    # Client-chosen id of this turn, reused on retries so a turn only runs once
+    turn_id: Optional[str] = None
 
 
 class ChatResponse(BaseModel):
     response: str
-    agent_state: Dict[str, Any]
     session_id: str
+    # Version of the session state after this turn
+    version: int
+    # JSON Patch operations from the client's base_version state to this version
+    state_patch: Optional[List[Dict[str, Any]]] = None
+    # Full state, sent instead when the client gave no base_version or holds an older one
+    agent_state: Optional[Dict[str, Any]] = None
 
 
 class SessionState(BaseModel):
@@ -46,13 +82,136 @@ class SessionState(BaseModel):
     state: Dict[str, Any]
 
 
+def resident_memory_bytes() -> int:
+    """Current resident set size (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def collect_runtime_metrics():
+    """Scrape-time metrics: sessions, response caches, complaint outbox and process memory"""
+    yield "calltaker_sessions", "gauge", "Live sessions in the session store", [({}, session_store.count())]
+    yield ("calltaker_session_bytes", "gauge", "Serialized size of live sessions",
+           [({}, session_store.stored_bytes())])
+    caches = {"extraction": extraction_cache.stats(), "reply": reply_cache.stats(),
+              "turn_replay": turn_replay.stats()}
+    for stat in ("hits", "misses", "evictions"):
+        yield (f"calltaker_cache_{stat}_total", "counter", f"Response cache {stat}",
+               [({"cache": name}, stats[stat]) for name, stats in caches.items()])
+    yield ("calltaker_cache_entries", "gauge", "Entries held in memory per response cache",
+           [({"cache": name}, stats["size"]) for name, stats in caches.items()])
+    outbox = get_submission_pipeline().stats()
+    yield ("calltaker_outbox_complaints", "gauge", "Complaints in the submission outbox by status",
+           [({"status": status}, outbox[status]) for status in ("pending", "inflight", "sent", "failed")])
+    yield ("calltaker_outbox_oldest_pending_seconds", "gauge", "Age of the oldest complaint waiting to be sent",
+           [({}, outbox["oldest_pending_age_seconds"])])
+    yield "calltaker_turns_in_flight", "gauge", "Turns holding an admission slot", [({}, admission.active)]
+    yield ("calltaker_admission_queue_depth", "gauge", "Requests waiting for a turn slot",
+           [({}, admission.waiting)])
+    yield "process_resident_memory_bytes", "gauge", "Resident memory size", [({}, resident_memory_bytes())]
+
+
+metrics.register_collector(collect_runtime_metrics)
+
+
+def get_or_create_session(session_id: str) -> StoredSession:
+    """Return the stored state for a session, or a fresh state at version 0 if there is none"""
+    stored = session_store.get(session_id)
+    if stored is None:
+        stored = StoredSession(AgentSession(), 0)
+    return stored
+
+
+def budget_after_wait(waited: float) -> Optional[float]:
+    """Turn budget left after waiting for admission (None = the default budget)"""
+    if not waited or turn_budget() <= 0:
+        return None
+    # Always leave time to generate the reply
+    return max(turn_budget() - waited, reply_reserve())
+
+
+def overloaded_error(error: Overloaded) -> HTTPException:
+    return HTTPException(status_code=error.status_code, detail=str(error),
+                         headers={"Retry-After": str(error.retry_after)})
+
+
+def turn_mismatch_error() -> HTTPException:
+    return HTTPException(status_code=422, detail="turn_id was already used for a different message")
+
+
+def turn_response(response_text: str, session_id: str, state: AgentSession, version: int,
+                  base_view: Optional[Dict[str, Any]]) -> ChatResponse:
+    """Reply plus the new state version, as a delta against base_view when the client holds it"""
+    view = state_view(state)
+    if base_view is None:
+        return ChatResponse(response=response_text, session_id=session_id, version=version, agent_state=view)
+    return ChatResponse(response=response_text, session_id=session_id, version=version,
+                        state_patch=json_patch(base_view, view))
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format a single Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """
+    Streaming response that holds an admission slot until it has been sent.
+
+    The slot is released when the response finishes, fails or is cancelled, including when the
+    client disconnects before the body starts (the body generator then never runs).
+    """
+
+    def __init__(self, content, started: float, **kwargs):
+        super().__init__(content, **kwargs)
+        self.started = started
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            admission.release(time.monotonic() - self.started)
+
+
+@app.on_event("startup")
+async def start_submission_workers():
+    """Start draining the complaint outbox (also resends anything left from a previous run)"""
+    get_submission_pipeline().start()
+
+
+@app.on_event("startup")
+async def start_warm_up():
+    """Warm the worker in the background; /ready answers 503 until it is done"""
+    app.state.warm_up = asyncio.create_task(warm_up())
+
+
+@app.on_event("shutdown")
+async def stop_submission_workers():
+    get_submission_pipeline().stop()
+
+
+@app.on_event("shutdown")
+async def close_model_connections():
+    await close_http_clients()
+
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
     return {"status": "healthy", "service": "Alora Call Taker API"}
 
 
-@app.post("/api/chat", response_model=ChatResponse)
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once the worker is warm (graph built, model connections open), 503 before"""
+    status = warmup_status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+@app.post("/api/chat", response_model=ChatResponse, response_model_exclude_none=True)
 async def chat(chat_message: ChatMessage):
     """
     Process a chat message and return the agent's response
@@ -60,61 +219,177 @@ async def chat(chat_message: ChatMessage):
     try:
         session_id = chat_message.session_id
         user_message = chat_message.message
+        replay_key = turn_key(session_id, chat_message.turn_id)
         
-        # Get or create session state
-        if session_id not in sessions:
-            sessions[session_id] = {
-                "complaint": None,
-                "mobile_number": None,
-                "is_registered": None,
-                "customer_data": {
-                    "priorityId": None,
-                    "sectorId": None,
-                    "networkId": None,
-                    "areaId": None,
-                    "labId": None,
-                    "commercialBranchCode": None,
-                    "clientAddress": None
-                },
-                "address_loaded_from_system": None,
-                "address_updated_by_user": None,
-                "confirmation": None,
-                "submitted": False,
-                "messages": []
-            }
-        
-        current_state = sessions[session_id]
+        # A retry of a turn that already completed gets the stored response
+        replayed = replayed_turn(replay_key, user_message)
+        if replayed is not None:
+            return JSONResponse(replayed, headers={"X-Turn-Replayed": "true"})
         
-        # Process message through agent
-        response_text, updated_state = process_user_message(user_message, current_state)
+        # Wait for a turn slot (or shed the request) before any model work
+        async with admission.slot() as waited, session_locks.hold(session_id):
+            # The duplicate may have been waiting for the original turn to finish
+            replayed = replayed_turn(replay_key, user_message)
+            if replayed is not None:
+                return JSONResponse(replayed, headers={"X-Turn-Replayed": "true"})
+            
+            # Get or create session state
+            current_state, version = get_or_create_session(session_id)
+            # The turn updates the state in place: keep the view the client holds to diff against
+            base_view = state_view(current_state) if chat_message.base_version == version else None
+            
+            # Process message through agent
+            response_text, updated_state = await aprocess_user_message(
+                user_message, current_state, session_id, budget=budget_after_wait(waited),
+                turn_id=chat_message.turn_id
+            )
+            
+            # Update session (fails if another worker updated it meanwhile)
+            new_version = session_store.put(session_id, updated_state, expected_version=version)
+            response = turn_response(response_text, session_id, updated_state, new_version, base_view)
+            remember_turn(replay_key, user_message, response.model_dump(mode="json", exclude_none=True))
         
-        # Update session
-        sessions[session_id] = updated_state
-        
-        return ChatResponse(
-            response=response_text,
-            agent_state=updated_state,
-            session_id=session_id
-        )
+        return response
         
+    except Overloaded as e:
+        raise overloaded_error(e)
+    except TurnMismatch:
+        raise turn_mismatch_error()
+    except VersionConflict:
+        raise HTTPException(status_code=409, detail="Session was updated by another request, please retry")
+    except OutboxFull:
+        raise HTTPException(status_code=503, detail="Complaint submissions are backed up, please retry shortly")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/chat/stream")
+async def chat_stream(chat_message: ChatMessage):
+    """
+    Process a chat message and stream the agent's reply as Server-Sent Events.
+    
+    Emits "token" events while the reply is generated, then one "done" event carrying
+    the response and the state update (or an "error" event). A replayed turn only gets "done".
+    A "reset" event means the tokens sent so far are not the reply after all (the model call
+    streaming them failed or was outrun, or a fallback answered): discard them and show "done".
+    """
+    session_id = chat_message.session_id
+    user_message = chat_message.message
+    replay_key = turn_key(session_id, chat_message.turn_id)
+    
+    async def replay_stream(replayed: Dict[str, Any]):
+        yield sse_event("done", replayed)
+    
+    try:
+        replayed = replayed_turn(replay_key, user_message)
+    except TurnMismatch:
+        raise turn_mismatch_error()
+    if replayed is not None:
+        return StreamingResponse(replay_stream(replayed), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Turn-Replayed": "true"})
+    
+    # Admit before the response starts, so a shed request still gets its status code
+    try:
+        waited = await admission.acquire()
+    except Overloaded as e:
+        raise overloaded_error(e)
+    started = time.monotonic()
+    
+    # Slot released by the response once sent (see AdmittedStreamingResponse)
+    async def event_stream():
+        try:
+            async with session_locks.hold(session_id):
+                replayed = replayed_turn(replay_key, user_message)
+                if replayed is not None:
+                    yield sse_event("done", replayed)
+                    return
+                current_state, version = get_or_create_session(session_id)
+                base_view = state_view(current_state) if chat_message.base_version == version else None
+                async for kind, payload in astream_user_message(user_message, current_state, session_id,
+                                                                budget=budget_after_wait(waited),
+                                                                turn_id=chat_message.turn_id):
+                    if kind == "token":
+                        yield sse_event("token", {"text": payload})
+                    elif kind == "reset":
+                        yield sse_event("reset", {})
+                    else:
+                        response_text, updated_state = payload
+                        new_version = session_store.put(session_id, updated_state, expected_version=version)
+                        done = turn_response(
+                            response_text, session_id, updated_state, new_version, base_view
+                        ).model_dump(mode="json", exclude_none=True)
+                        remember_turn(replay_key, user_message, done)
+                        yield sse_event("done", done)
+        except TurnMismatch:
+            yield sse_event("error", {"detail": turn_mismatch_error().detail})
+        except VersionConflict:
+            yield sse_event("error", {"detail": "Session was updated by another request, please retry"})
+        except OutboxFull:
+            yield sse_event("error", {"detail": "Complaint submissions are backed up, please retry shortly"})
+        except Exception as e:
+            yield sse_event("error", {"detail": str(e)})
+    
+    try:
+        return AdmittedStreamingResponse(
+            event_stream(),
+            started,
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    except BaseException:
+        admission.release(time.monotonic() - started)
+        raise
+
+
 @app.post("/api/session/clear")
 async def clear_session(session_id: str):
     """Clear a session"""
-    if session_id in sessions:
-        del sessions[session_id]
+    session_store.delete(session_id)
+    discard_speculation(session_id)
     return {"status": "success", "message": "Session cleared"}
 
 
 @app.get("/api/session/{session_id}")
-async def get_session(session_id: str):
-    """Get session state"""
-    if session_id not in sessions:
+async def get_session(session_id: str, response: Response, if_none_match: Optional[str] = Header(None)):
+    """Get session state (ETag is the version; If-None-Match answers 304 without loading it)"""
+    if if_none_match is not None:
+        etag = f'"{session_store.version(session_id)}"'
+        if etag != '"0"' and etag in (tag.strip() for tag in if_none_match.split(",")):
+            return Response(status_code=304, headers={"ETag": etag})
+    stored = session_store.get(session_id)
+    if stored is None:
         raise HTTPException(status_code=404, detail="Session not found")
-    return {"session_id": session_id, "state": sessions[session_id]}
+    response.headers["ETag"] = f'"{stored.version}"'
+    return {"session_id": session_id, "state": stored.state.to_dict(), "version": stored.version}
+
+
+@app.get("/api/admin/traces/{session_id}")
+async def get_traces(session_id: str, include_files: bool = False, x_admin_token: Optional[str] = Header(None)):
+    """Recorded turn traces for a session (see CALLTAKER_TRACE_SAMPLE); needs CALLTAKER_ADMIN_TOKEN"""
+    admin_token = os.getenv("CALLTAKER_ADMIN_TOKEN")
+    if not admin_token:
+        # Traces hold prompts and caller details: never served without a configured token
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (CALLTAKER_ADMIN_TOKEN is not set)")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token.encode(), admin_token.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    if include_files:
+        # Scans the rotated trace files: kept off the event loop
+        traces = await asyncio.to_thread(trace_recorder.for_session, session_id, include_files=True)
+    else:
+        traces = trace_recorder.for_session(session_id)
+    return {"session_id": session_id, "traces": traces}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/submissions/stats")
+async def submission_stats():
+    """Complaint outbox depth and submission throughput"""
+    return get_submission_pipeline().stats()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,237 @@
+"""
+Session storage for the Alora Call Taker API
+Pluggable stores with TTL expiry and optimistic versioning, so several workers can share sessions.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, NamedTuple, Optional
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from src.agent.state import SessionState
+
+# Compact role tags used when serializing LangChain messages
+_ROLE_TAGS = {HumanMessage: "h", AIMessage: "a"}
+_TAG_TYPES = {tag: cls for cls, tag in _ROLE_TAGS.items()}
+
+
+class VersionConflict(Exception):
+    """Raised when a session was modified by another request since it was read"""
+
+
+class StoredSession(NamedTuple):
+    """A session state and the version it was stored under"""
+    state: SessionState
+    version: int
+
+
+def serialize_state(state: SessionState) -> str:
+    """Serialize a session state, storing messages as compact [role, content] pairs"""
+    payload = state.to_dict(include_messages=False)
+    payload["messages"] = [[_ROLE_TAGS.get(type(msg), "a"), msg.content] for msg in state.messages]
+    return json.dumps(payload, separators=(",", ":"))
+
+
+def deserialize_state(data: str) -> SessionState:
+    """Inverse of serialize_state"""
+    payload = json.loads(data)
+    payload["messages"] = [_TAG_TYPES[tag](content=content) for tag, content in payload.get("messages", [])]
+    return SessionState.from_dict(payload)
+
+
+class SessionStore:
+    """Interface for session stores"""
+
+    def __init__(self, ttl_seconds: float = 3600.0):
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, session_id: str) -> Optional[StoredSession]:
+        """Return the stored session, or None if missing or expired"""
+        raise NotImplementedError
+
+    def version(self, session_id: str) -> int:
+        """Current version of a session without loading it (0 if missing or expired)"""
+        raise NotImplementedError
+
+    def put(self, session_id: str, state: SessionState, expected_version: int = 0) -> int:
+        """
+        Store a session state and return its new version.
+
+        expected_version is the version the caller read (0 for a new session);
+        VersionConflict is raised if the stored version has moved on since.
+        """
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> None:
+        """Remove a session"""
+        raise NotImplementedError
+
+    def count(self) -> int:
+        """Number of live sessions"""
+        raise NotImplementedError
+
+    def stored_bytes(self) -> int:
+        """Total serialized size of live sessions"""
+        raise NotImplementedError
+
+    def purge_expired(self) -> int:
+        """Drop expired sessions and return how many were removed"""
+        raise NotImplementedError
+
+
+class InMemorySessionStore(SessionStore):
+    """Process-local store (single worker only), holding session objects without serializing them"""
+
+    def __init__(self, ttl_seconds: float = 3600.0):
+        super().__init__(ttl_seconds)
+        self._sessions: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[StoredSession]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            state, version, expires_at = entry
+            if expires_at <= time.time():
+                del self._sessions[session_id]
+                return None
+        # Callers update their copy in place; the stored one only changes through put
+        return StoredSession(state.copy(), version)
+
+    def version(self, session_id: str) -> int:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            return entry[1] if entry is not None and entry[2] > time.time() else 0
+
+    def put(self, session_id: str, state: SessionState, expected_version: int = 0) -> int:
+        state = state.copy()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            current_version = entry[1] if entry is not None and entry[2] > time.time() else 0
+            if current_version != expected_version:
+                raise VersionConflict(session_id)
+            new_version = current_version + 1
+            self._sessions[session_id] = (state, new_version, time.time() + self.ttl_seconds)
+        return new_version
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def count(self) -> int:
+        now = time.time()
+        with self._lock:
+            return sum(1 for _, _, expires_at in self._sessions.values() if expires_at > now)
+
+    def stored_bytes(self) -> int:
+        now = time.time()
+        with self._lock:
+            live = [state for state, _, expires_at in self._sessions.values() if expires_at > now]
+        # Sessions aren't kept serialized here: measured at scrape time, outside the lock
+        return sum(len(serialize_state(state)) for state in live)
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [sid for sid, (_, _, expires_at) in self._sessions.items() if expires_at <= now]
+            for sid in expired:
+                del self._sessions[sid]
+        return len(expired)
+
+
+class SqliteSessionStore(SessionStore):
+    """Store backed by a local sqlite database in WAL mode, shared by all workers on a host"""
+
+    def __init__(self, db_path: str, ttl_seconds: float = 3600.0):
+        super().__init__(ttl_seconds)
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, data TEXT NOT NULL, "
+                "version INTEGER NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread"""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=5.0)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def get(self, session_id: str) -> Optional[StoredSession]:
+        row = self._connect().execute(
+            "SELECT data, version FROM sessions WHERE session_id = ? AND expires_at > ?",
+            (session_id, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        return StoredSession(deserialize_state(row[0]), row[1])
+
+    def version(self, session_id: str) -> int:
+        row = self._connect().execute(
+            "SELECT version FROM sessions WHERE session_id = ? AND expires_at > ?",
+            (session_id, time.time())
+        ).fetchone()
+        return row[0] if row is not None else 0
+
+    def put(self, session_id: str, state: SessionState, expected_version: int = 0) -> int:
+        data = serialize_state(state)
+        now = time.time()
+        new_version = expected_version + 1
+        with self._connect() as db:
+            if expected_version == 0:
+                # New session, or replacing an expired one
+                cursor = db.execute(
+                    "INSERT INTO sessions (session_id, data, version, expires_at) VALUES (?, ?, 1, ?) "
+                    "ON CONFLICT(session_id) DO UPDATE SET data = excluded.data, version = 1, "
+                    "expires_at = excluded.expires_at WHERE sessions.expires_at <= ?",
+                    (session_id, data, now + self.ttl_seconds, now)
+                )
+            else:
+                cursor = db.execute(
+                    "UPDATE sessions SET data = ?, version = ?, expires_at = ? "
+                    "WHERE session_id = ? AND version = ? AND expires_at > ?",
+                    (data, new_version, now + self.ttl_seconds, session_id, expected_version, now)
+                )
+            if cursor.rowcount != 1:
+                raise VersionConflict(session_id)
+        return new_version
+
+    def delete(self, session_id: str) -> None:
+        with self._connect() as db:
+            db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def count(self) -> int:
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM sessions WHERE expires_at > ?", (time.time(),)
+        ).fetchone()[0]
+
+    def stored_bytes(self) -> int:
+        return self._connect().execute(
+            "SELECT COALESCE(SUM(LENGTH(data)), 0) FROM sessions WHERE expires_at > ?", (time.time(),)
+        ).fetchone()[0]
+
+    def purge_expired(self) -> int:
+        with self._connect() as db:
+            return db.execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),)).rowcount
+
+
+def create_session_store() -> SessionStore:
+    """Build the session store selected by CALLTAKER_SESSION_STORE (memory or sqlite)"""
+    ttl_seconds = float(os.getenv("CALLTAKER_SESSION_TTL", "3600"))
+    kind = os.getenv("CALLTAKER_SESSION_STORE", "memory").lower()
+    if kind == "sqlite":
+        return SqliteSessionStore(os.getenv("CALLTAKER_SESSION_DB", "sessions.db"), ttl_seconds)
+    if kind == "memory":
+        return InMemorySessionStore(ttl_seconds)
+    raise ValueError(f"Unknown session store: {kind}")
@@ -0,0 +1,44 @@
+"""
+State deltas for API responses
+The backend owns session state under a version number. Turn responses carry JSON Patch (RFC 6902)
+operations from the version the client last saw to the new one instead of the whole state;
+clients that don't say which version they hold (or hold an older one) get the full state.
+"""
+
+from typing import Any, Dict, List
+
+from src.agent.state import SessionState
+
+# Transcript fields the clients don't show (they keep their own copy of the conversation)
+_HIDDEN_FIELDS = ("unsummarized",)
+
+
+def state_view(state: SessionState) -> Dict[str, Any]:
+    """The part of a session state sent to clients"""
+    view = state.to_dict(include_messages=False)
+    for name in _HIDDEN_FIELDS:
+        del view[name]
+    return view
+
+
+def _escape(key: str) -> str:
+    # JSON Pointer escaping (RFC 6901)
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+
+def json_patch(old: Any, new: Any, path: str = "") -> List[Dict[str, Any]]:
+    """JSON Patch operations turning old into new; objects are diffed per key, other values replaced"""
+    if isinstance(old, dict) and isinstance(new, dict):
+        operations = []
+        for key, value in new.items():
+            child = f"{path}/{_escape(key)}"
+            if key not in old:
+                operations.append({"op": "add", "path": child, "value": value})
+            elif old[key] != value:
+                operations.extend(json_patch(old[key], value, child))
+        for key in old.keys() - new.keys():
+            operations.append({"op": "remove", "path": f"{path}/{_escape(key)}"})
+        return operations
+    if old == new:
+        return []
+    return [{"op": "replace", "path": path, "value": new}]
@@ -0,0 +1,86 @@
+"""
+Idempotent, ordered turns
+Clients tag each message with a turn_id. Turns on one session run one at a time (per worker), and
+the response to each completed turn is kept for a short while, so a retried or double-submitted
+turn gets the stored response instead of running the agent (and its model calls) again. A turn_id
+reused with a different message is refused (TurnMismatch) rather than answered with another turn's
+response.
+
+    CALLTAKER_TURN_REPLAY_TTL=300   seconds a completed turn's response is kept
+    CALLTAKER_TURN_REPLAY_DB=       optional sqlite file, to replay turns across workers
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+from src.agent.cache import ResponseCache
+
+turn_replay = ResponseCache(
+    max_entries=int(os.getenv("CALLTAKER_TURN_REPLAY_SIZE", "10000")),
+    ttl_seconds=float(os.getenv("CALLTAKER_TURN_REPLAY_TTL", "300")),
+    db_path=os.getenv("CALLTAKER_TURN_REPLAY_DB") or None,
+)
+
+
+def turn_key(session_id: str, turn_id: Optional[str]) -> Optional[str]:
+    """Replay cache key of a turn (None for untagged turns, which are never replayed)"""
+    return f"{session_id}\x00{turn_id}" if turn_id else None
+
+
+class TurnMismatch(Exception):
+    """A turn_id was reused for a different message"""
+
+
+def _fingerprint(message: str) -> str:
+    return hashlib.sha256(message.encode("utf-8")).hexdigest()
+
+
+def replayed_turn(key: Optional[str], message: str) -> Optional[Dict[str, Any]]:
+    """
+    Stored response of a completed turn, if this turn already ran.
+
+    Raises TurnMismatch if the stored turn was for a different message.
+    """
+    value = turn_replay.get(key) if key is not None else None
+    if value is None:
+        return None
+    stored = json.loads(value)
+    if stored["message"] != _fingerprint(message):
+        raise TurnMismatch(key)
+    return stored["response"]
+
+
+def remember_turn(key: Optional[str], message: str, payload: Dict[str, Any]) -> None:
+    """Store a completed turn's response for replay, with a fingerprint of its message"""
+    if key is not None:
+        turn_replay.set(key, json.dumps({"message": _fingerprint(message), "response": payload}, default=str))
+
+
+class SessionLocks:
+    """One asyncio lock per session id, dropped once nobody holds or waits for it"""
+
+    def __init__(self):
+        # session id -> [lock, requests holding or waiting for it]
+        self._locks: Dict[str, list] = {}
+
+    @asynccontextmanager
+    async def hold(self, session_id: str) -> AsyncIterator[None]:
+        """Run the body of the block while no other turn of this session runs in this worker"""
+        entry = self._locks.get(session_id)
+        if entry is None:
+            entry = self._locks[session_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[session_id]
+
+    def __len__(self) -> int:
+        return len(self._locks)
@@ -0,0 +1,14 @@
+"""
+In-process benchmarks, load tests and trace replay for the complaint agent
+Run with: python -m benchmarks.run --help (also benchmarks.load, benchmarks.replay)
+
+Importing the package keeps benchmark runs away from real credentials, the disk cache and the
+complaint outbox.
+"""
+
+import os
+import tempfile
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ["CALLTAKER_CACHE_DB"] = ""
+os.environ["CALLTAKER_OUTBOX_DB"] = os.path.join(tempfile.mkdtemp(prefix="calltaker-bench-"), "outbox.db")
@@ -0,0 +1,112 @@
+"""
+Deterministic fake chat model for benchmarks
+Stands in for the OpenAI models with a fixed latency and scripted outputs, and records every call
+so a benchmark can count model calls and prompt sizes per turn.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+from src.agent.extraction import TurnExtraction
+from src.agent.memory import count_tokens
+from src.agent.metrics import SPECULATE_TAG, SUMMARY_TAG
+
+
+@dataclass
+class CallRecord:
+    """One model call made during a turn"""
+    purpose: str  # "reply", "extract" or "summary"
+    model: str
+    prompt_chars: int
+    prompt_tokens: int
+    # Tokens in the leading system message (the part a provider could serve from its prefix cache)
+    prefix_tokens: int = 0
+
+
+@dataclass
+class FakeScript:
+    """Outputs and latency shared by the fake models of one benchmark run"""
+    latency_seconds: float = 0.0
+    reply_text: str = "Thank you, I've noted that."
+    # Structured extraction results keyed by the user message being extracted
+    extractions: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    calls: List[CallRecord] = field(default_factory=list)
+
+
+def _prompt_text(messages) -> str:
+    return "\n".join(str(message.content) for message in messages)
+
+
+def _prefix_text(messages) -> str:
+    return str(messages[0].content) if messages and messages[0].type == "system" else ""
+
+
+def _purpose(run_manager) -> str:
+    tags = (run_manager.tags or ()) if run_manager is not None else ()
+    if SUMMARY_TAG in tags:
+        return "summary"
+    return "speculate" if SPECULATE_TAG in tags else "reply"
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that sleeps for the scripted latency and returns scripted outputs"""
+    model_name: str
+    script: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _record(self, purpose: str, prompt: str, prefix: str = "") -> None:
+        self.script.calls.append(CallRecord(purpose, self.model_name, len(prompt), count_tokens(prompt),
+                                            count_tokens(prefix) if prefix else 0))
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self._record(_purpose(run_manager), _prompt_text(messages), _prefix_text(messages))
+        time.sleep(self.script.latency_seconds)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.script.reply_text))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self._record(_purpose(run_manager), _prompt_text(messages), _prefix_text(messages))
+        await asyncio.sleep(self.script.latency_seconds)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.script.reply_text))])
+
+    def with_structured_output(self, schema, **kwargs):
+        def extract(prompt) -> TurnExtraction:
+            prompt = prompt if isinstance(prompt, str) else str(prompt)
+            self._record("extract", prompt)
+            message = prompt.rsplit("Message:", 1)[-1].strip()
+            return TurnExtraction(**self.script.extractions.get(message, {}))
+
+        def sync_extract(prompt):
+            result = extract(prompt)
+            time.sleep(self.script.latency_seconds)
+            return result
+
+        async def async_extract(prompt):
+            result = extract(prompt)
+            await asyncio.sleep(self.script.latency_seconds)
+            return result
+
+        return RunnableLambda(sync_extract, afunc=async_extract)
+
+
+def install_fake_models(script: FakeScript) -> Callable[[], None]:
+    """Swap the agent's llm/llm_mini for fakes; returns a function that restores the originals"""
+    from src.agent.clients import set_models
+    original = set_models((
+        FakeChatModel(model_name="gpt-4o", script=script),
+        FakeChatModel(model_name="gpt-4o-mini", script=script),
+    ))
+
+    def restore() -> None:
+        set_models(original)
+
+    return restore
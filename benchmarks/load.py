@@ -0,0 +1,264 @@
+"""
+End-to-end HTTP load test
+Starts the OpenAI stub and the FastAPI backend (backend/main.py) pointed at it, then simulates N
+concurrent callers, each running scripted multi-turn dialogues against /api/chat (or the streaming
+endpoint), at each requested concurrency level. Reports throughput, turn latency percentiles,
+response size and error rates per level. Turns shed by admission control are retried after their
+Retry-After hint and counted separately.
+
+    python -m benchmarks.load --concurrency 1,8,32 --workers 2 --latency lognormal:0.4,0.5
+    python -m benchmarks.load --target http://localhost:8000   # against a backend that is already running
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from .scenarios import SCENARIOS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Times a turn shed by admission control (429/503 with Retry-After) is retried before it counts as an error
+MAX_SHED_RETRIES = 3
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile (q in 0..100)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), round(q / 100 * len(ordered) + 0.5)))
+    return ordered[rank - 1]
+
+
+def _wait_until_up(url: str, process: Optional[subprocess.Popen], timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Process serving {url} exited with code {process.returncode}")
+        try:
+            # 503 = still warming up (see /ready)
+            if httpx.get(url, timeout=1.0).status_code != 503:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+def start_stub(args) -> subprocess.Popen:
+    command = [sys.executable, "-m", "benchmarks.stub_openai", "--port", str(args.stub_port),
+               "--latency", args.latency, "--token-delay", str(args.token_delay),
+               "--error-rate", str(args.error_rate), "--error-status", str(args.error_status)]
+    process = subprocess.Popen(command, cwd=ROOT)
+    _wait_until_up(f"http://127.0.0.1:{args.stub_port}/stats", process)
+    return process
+
+
+def start_backend(args, stub_url: str, workdir: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "stub",
+        "OPENAI_BASE_URL": stub_url,
+        "OPENAI_API_BASE": stub_url,
+        "CALLTAKER_OUTBOX_DB": os.path.join(workdir, "outbox.db"),
+        "CALLTAKER_SUBMISSION_SINK": os.path.join(workdir, "submitted.jsonl"),
+        "CALLTAKER_CACHE_DB": "",
+    }
+    if args.workers > 1:
+        # In-memory sessions are per worker, so share them through sqlite
+        env["CALLTAKER_SESSION_STORE"] = "sqlite"
+        env["CALLTAKER_SESSION_DB"] = os.path.join(workdir, "sessions.db")
+    if args.no_cache:
+        env["CALLTAKER_CACHE_EXTRACTION"] = "0"
+    command = [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(args.port),
+               "--workers", str(args.workers), "--log-level", "warning"]
+    process = subprocess.Popen(command, cwd=ROOT, env=env)
+    # Only the worker that answers is known to be warm, but the rest start the same way
+    _wait_until_up(f"http://127.0.0.1:{args.port}/ready", process)
+    return process
+
+
+def _turn_body(session_id: str, message: str, version: Optional[int], turn_id: str) -> Dict[str, Any]:
+    # Like the React client: after the first turn, ask for state deltas against the version held
+    return {"session_id": session_id, "message": message, "base_version": version, "turn_id": turn_id}
+
+
+async def _chat_turn(client: httpx.AsyncClient, session_id: str, message: str, version: Optional[int],
+                     turn_id: str) -> Dict[str, Any]:
+    response = await client.post("/api/chat", json=_turn_body(session_id, message, version, turn_id))
+    outcome = {"ok": response.status_code == 200, "status": response.status_code,
+               "retry_after": response.headers.get("Retry-After"), "bytes": len(response.content)}
+    if outcome["ok"]:
+        outcome["version"] = response.json()["version"]
+    return outcome
+
+
+async def _stream_turn(client: httpx.AsyncClient, session_id: str, message: str, version: Optional[int],
+                       turn_id: str, started: float) -> Dict[str, Any]:
+    outcome = {"ok": False, "status": None, "ttft": None, "bytes": 0}
+    body = _turn_body(session_id, message, version, turn_id)
+    async with client.stream("POST", "/api/chat/stream", json=body) as response:
+        outcome["status"] = response.status_code
+        outcome["retry_after"] = response.headers.get("Retry-After")
+        event = None
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+                if event == "token" and outcome["ttft"] is None:
+                    outcome["ttft"] = time.perf_counter() - started
+                elif event == "done":
+                    outcome["ok"] = True
+                elif event == "error":
+                    outcome["status"] = "sse-error"
+            elif line.startswith("data: ") and event == "done":
+                outcome["bytes"] = len(line) - len("data: ")
+                outcome["version"] = json.loads(line[len("data: "):])["version"]
+    return outcome
+
+
+async def caller(client: httpx.AsyncClient, caller_id: int, conversations: int, endpoint: str,
+                 results: List[Dict[str, Any]], shed: List[Dict[str, Any]]) -> None:
+    """One simulated caller running scripted dialogues back to back"""
+    for index in range(conversations):
+        scenario = SCENARIOS[(caller_id + index) % len(SCENARIOS)]
+        session_id = str(uuid.uuid4())
+        version = None
+        for turn in scenario.turns:
+            # Retries resend the same turn id
+            turn_id = str(uuid.uuid4())
+            for attempt in range(MAX_SHED_RETRIES + 1):
+                started = time.perf_counter()
+                try:
+                    if endpoint == "stream":
+                        outcome = await _stream_turn(client, session_id, turn.message, version, turn_id, started)
+                    else:
+                        outcome = await _chat_turn(client, session_id, turn.message, version, turn_id)
+                except httpx.HTTPError as e:
+                    outcome = {"ok": False, "status": type(e).__name__}
+                outcome["latency"] = time.perf_counter() - started
+                if not outcome.get("retry_after") or attempt == MAX_SHED_RETRIES:
+                    break
+                # Shed by admission control: back off as told, like a well-behaved client
+                shed.append(outcome)
+                await asyncio.sleep(float(outcome["retry_after"]))
+            results.append(outcome)
+            version = outcome.get("version")
+            if not outcome["ok"]:
+                break  # the rest of this dialogue would run against a broken session
+        try:
+            await client.post("/api/session/clear", params={"session_id": session_id})
+        except httpx.HTTPError:
+            pass
+
+
+async def run_level(base_url: str, concurrency: int, conversations: int, endpoint: str) -> Dict[str, Any]:
+    """Run `concurrency` callers at once and summarize their turns"""
+    results: List[Dict[str, Any]] = []
+    shed: List[Dict[str, Any]] = []
+    limits = httpx.Limits(max_connections=concurrency * 2, max_keepalive_connections=concurrency * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(caller(client, i, conversations, endpoint, results, shed) for i in range(concurrency)))
+        duration = time.perf_counter() - started
+
+    latencies = [r["latency"] * 1000 for r in results if r["ok"]]
+    errors = [r for r in results if not r["ok"]]
+    summary = {
+        "concurrency": concurrency,
+        "turns": len(results),
+        "errors": len(errors),
+        "shed_retries": len(shed),
+        "error_rate": round(len(errors) / len(results), 4) if results else 0.0,
+        "error_statuses": sorted({str(r["status"]) for r in errors}),
+        "duration_s": round(duration, 3),
+        "throughput_turns_per_s": round(len(latencies) / duration, 2) if duration else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        # Size of the final response body (the "done" event when streaming)
+        "response_bytes": round(sum(r["bytes"] for r in results if r["ok"]) / len(latencies)) if latencies else 0,
+    }
+    if endpoint == "stream":
+        ttfts = [r["ttft"] * 1000 for r in results if r.get("ttft") is not None]
+        summary["ttft_p50_ms"] = round(percentile(ttfts, 50), 1)
+        summary["ttft_p95_ms"] = round(percentile(ttfts, 95), 1)
+    return summary
+
+
+def print_report(levels: List[Dict[str, Any]], endpoint: str) -> None:
+    header = f"{'callers':>8}{'turns':>7}{'shed':>6}{'errors':>8}{'err %':>8}{'turns/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'bytes':>8}"
+    if endpoint == "stream":
+        header += f"{'ttft p50':>10}{'ttft p95':>10}"
+    print(header)
+    print("-" * len(header))
+    for level in levels:
+        line = (f"{level['concurrency']:>8}{level['turns']:>7}{level['shed_retries']:>6}{level['errors']:>8}{level['error_rate'] * 100:>8.1f}"
+                f"{level['throughput_turns_per_s']:>9.1f}{level['p50_ms']:>9.0f}{level['p95_ms']:>9.0f}{level['p99_ms']:>9.0f}"
+                f"{level['response_bytes']:>8}")
+        if endpoint == "stream":
+            line += f"{level['ttft_p50_ms']:>10.0f}{level['ttft_p95_ms']:>10.0f}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Call Taker API against a stub model server")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrent caller counts")
+    parser.add_argument("--conversations", type=int, default=2, help="Dialogues per caller at each level")
+    parser.add_argument("--endpoint", choices=("chat", "stream"), default="chat")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the backend")
+    parser.add_argument("--port", type=int, default=8901, help="Backend port")
+    parser.add_argument("--target", help="Load an already running backend at this URL (no stub or backend is started)")
+    parser.add_argument("--stub-port", type=int, default=8900)
+    parser.add_argument("--stub-url", help="Point the backend at an already running stub instead of starting one")
+    parser.add_argument("--latency", default="lognormal:0.4,0.5", help="Stub latency distribution (see stub_openai)")
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of stub requests that fail")
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--no-cache", action="store_true", help="Disable the backend's extraction cache")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    processes = []
+    workdir = tempfile.mkdtemp(prefix="calltaker-load-")
+    try:
+        base_url = args.target
+        if base_url is None:
+            stub_url = args.stub_url
+            if stub_url is None:
+                processes.append(start_stub(args))
+                stub_url = f"http://127.0.0.1:{args.stub_port}/v1"
+            processes.append(start_backend(args, stub_url, workdir))
+            base_url = f"http://127.0.0.1:{args.port}"
+
+        # One warm-up dialogue so lazily loaded data isn't billed to the first level
+        asyncio.run(run_level(base_url, 1, 1, args.endpoint))
+
+        levels = []
+        for concurrency in (int(value) for value in args.concurrency.split(",")):
+            levels.append(asyncio.run(run_level(base_url, concurrency, args.conversations, args.endpoint)))
+            print(f"  {concurrency} callers done", file=sys.stderr)
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            process.wait(timeout=10)
+
+    print(f"endpoint={args.endpoint} workers={args.workers} latency={args.latency} error_rate={args.error_rate}")
+    print_report(levels, args.endpoint)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "levels": levels}, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Replay recorded turns offline
+Re-runs turns captured by the trace flight recorder (src/agent/tracing.py) against fake models that
+return the recorded extractions and reply, starting from the recorded session state. Reports how
+the replay compares with the recording and, optionally, profiles it.
+
+    python -m benchmarks.replay traces.jsonl --session SESSION_ID
+    python -m benchmarks.replay traces.jsonl --trace-id TRACE_ID --repeat 50 --profile
+"""
+
+import argparse
+import cProfile
+import json
+import pstats
+import statistics
+import sys
+import time
+from typing import Any, Dict, Iterator, List
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from src.agent.cache import extraction_cache, reply_cache
+from src.agent.state import SessionState
+from src.agent.tracing import read_traces, recorder, session_snapshot
+from src.agent.utils import process_user_message
+
+from .fake_llm import FakeScript, install_fake_models
+
+_MESSAGE_TYPES = {"human": HumanMessage, "ai": AIMessage}
+
+
+def restore_session(snapshot: Dict[str, Any]) -> SessionState:
+    """SessionState from a recorded state_before"""
+    data = dict(snapshot)
+    data["messages"] = [_MESSAGE_TYPES.get(kind, AIMessage)(content=content) for kind, content in data.get("messages", [])]
+    return SessionState.from_dict(data)
+
+
+def _llm_spans(spans: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    for span in spans:
+        if span["kind"] == "llm":
+            yield span
+        yield from _llm_spans(span.get("children", []))
+
+
+def script_for(trace: Dict[str, Any], latency_ms: float) -> FakeScript:
+    """Fake model outputs reproducing the recorded turn"""
+    extractions = {event["message"]: json.loads(event["result"])
+                   for event in trace["events"] if event["kind"] == "extraction"}
+    return FakeScript(latency_seconds=latency_ms / 1000, reply_text=trace["reply"] or "", extractions=extractions)
+
+
+def replay_once(trace: Dict[str, Any], script: FakeScript) -> Dict[str, Any]:
+    extraction_cache.clear()
+    reply_cache.clear()
+    session = restore_session(trace["state_before"])
+    first_call = len(script.calls)
+    started = time.perf_counter()
+    reply, session = process_user_message(trace["user_message"], session)
+    wall_ms = (time.perf_counter() - started) * 1000
+    after = session_snapshot(session)
+    before = trace["state_before"]
+    diff = {key: [before.get(key), after.get(key)]
+            for key in after if key != "messages" and before.get(key) != after.get(key)}
+    return {"wall_ms": wall_ms, "reply": reply, "llm_calls": len(script.calls) - first_call, "state_diff": diff}
+
+
+def replay(trace: Dict[str, Any], repeat: int, latency_ms: float, profile: bool) -> Dict[str, Any]:
+    script = script_for(trace, latency_ms)
+    restore = install_fake_models(script)
+    try:
+        runs = [replay_once(trace, script) for _ in range(repeat)]
+        if profile:
+            profiler = cProfile.Profile()
+            profiler.runcall(replay_once, trace, script)
+            pstats.Stats(profiler, stream=sys.stdout).sort_stats("cumulative").print_stats(25)
+    finally:
+        restore()
+    last = runs[-1]
+    return {
+        "trace_id": trace["trace_id"],
+        "session_id": trace["session_id"],
+        "user_message": trace["user_message"],
+        "recorded_ms": trace["duration_ms"],
+        "replay_ms_p50": round(statistics.median(run["wall_ms"] for run in runs), 3),
+        "recorded_llm_calls": trace["llm_calls"],
+        "replay_llm_calls": last["llm_calls"],
+        "reply_matches": last["reply"] == trace["reply"],
+        # Compare after JSON round-tripping, as the recording was
+        "state_matches": json.loads(json.dumps(last["state_diff"])) == trace["state_diff"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded turn traces offline")
+    parser.add_argument("traces", help="Trace JSONL file (CALLTAKER_TRACE_FILE); rotated backups are read too")
+    parser.add_argument("--session", help="Only traces of this session")
+    parser.add_argument("--trace-id", help="Only this trace")
+    parser.add_argument("--repeat", type=int, default=5, help="Replays per trace; wall time is the median")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Fake model latency (0 = CPU cost only)")
+    parser.add_argument("--recorded-latency", action="store_true",
+                        help="Use the mean recorded model latency of each trace instead of --latency-ms")
+    parser.add_argument("--profile", action="store_true", help="Print a cProfile of one replay per trace")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    recorder.sample_rate = 0.0  # don't record the replays themselves
+    traces = [trace for trace in read_traces(args.traces, include_rotated=True)
+              if (args.session is None or trace["session_id"] == args.session)
+              and (args.trace_id is None or trace["trace_id"] == args.trace_id)
+              and not trace.get("error")]
+    if not traces:
+        sys.exit("No matching traces")
+
+    results = []
+    for trace in traces:
+        latency_ms = args.latency_ms
+        if args.recorded_latency:
+            durations = [span["duration_ms"] for span in _llm_spans(trace["spans"]) if "duration_ms" in span]
+            latency_ms = statistics.mean(durations) if durations else 0.0
+        results.append(replay(trace, args.repeat, latency_ms, args.profile))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'trace':<34}{'recorded ms':>12}{'replay ms':>11}{'calls':>8}{'reply':>7}{'state':>7}  message")
+    for result in results:
+        calls = f"{result['recorded_llm_calls']}/{result['replay_llm_calls']}"
+        print(f"{result['trace_id']:<34}{result['recorded_ms']:>12.1f}{result['replay_ms_p50']:>11.1f}{calls:>8}"
+              f"{'ok' if result['reply_matches'] else 'DIFF':>7}{'ok' if result['state_matches'] else 'DIFF':>7}"
+              f"  {result['user_message'][:40]}")
+
+
+if __name__ == "__main__":
+    main()
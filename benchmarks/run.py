@@ -0,0 +1,323 @@
+"""
+Agent benchmark runner
+Drives the scripted conversations through the agent with fake models and reports, per turn, the
+model calls made, prompt size (and how much of it is the shared, cacheable prefix), wall time and
+allocations, plus the CPU cost of assembling each dialogue state's reply prompt. A run fails if a scenario doesn't
+queue the complaints it should. Results can be saved as a JSON baseline and later runs compared against it: more model
+calls or prompt tokens than the baseline fail, slower turns or more allocations only warn.
+
+    python -m benchmarks.run                                         # print results
+    python -m benchmarks.run --save benchmarks/baselines/default.json
+    python -m benchmarks.run --compare benchmarks/baselines/default.json
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from src.agent import submission
+from src.agent.cache import extraction_cache, reply_cache
+from src.agent.complaint_agent import get_agent
+from src.agent.memory import count_tokens, tokenizer_name
+from src.agent.prompts import STATE_GUIDES, build_reply_messages
+from src.agent.state import SessionState
+from src.agent.utils import _reply_message, process_user_message
+
+from .fake_llm import FakeScript, install_fake_models
+from .scenarios import SCENARIOS, Scenario
+
+MODES = ("process", "graph")
+
+
+def _run_turn(session: SessionState, message: str, mode: str) -> None:
+    if mode == "process":
+        process_user_message(message, session)
+    else:
+        # Straight through the compiled graph (nodes are async, so ainvoke rather than invoke)
+        user_message = HumanMessage(content=message)
+        result = asyncio.run(get_agent().ainvoke(session.graph_input(user_message), {"recursion_limit": 20}))
+        session.apply_turn(result, user_message, _reply_message(result))
+
+
+def run_scenario(scenario: Scenario, script: FakeScript, mode: str,
+                 trace_allocations: bool) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    Run one conversation from a fresh session, cold caches and an empty outbox; returns per-turn
+    measurements and the complaints the conversation queued
+    """
+    extraction_cache.clear()
+    reply_cache.clear()
+    script.extractions = {turn.message: turn.extraction for turn in scenario.turns}
+    with tempfile.TemporaryDirectory(prefix="calltaker-bench-") as workdir:
+        # Not started, so the outbox keeps what the conversation queued
+        pipeline = submission.SubmissionPipeline(
+            submission.ComplaintOutbox(os.path.join(workdir, "outbox.db")),
+            submission.FileSink(os.path.join(workdir, "submitted.jsonl")),
+        )
+        previous, submission._pipeline = submission._pipeline, pipeline
+        try:
+            turns = _run_turns(scenario, script, mode, trace_allocations)
+            batch = pipeline.outbox.claim_batch(len(scenario.turns) + 1)
+            queued = [json.loads(payload)["complaint"] for _, payload in batch]
+        finally:
+            submission._pipeline = previous
+    return turns, queued
+
+
+def _run_turns(scenario: Scenario, script: FakeScript, mode: str, trace_allocations: bool) -> List[Dict[str, Any]]:
+    session = SessionState()
+    turns = []
+    for turn in scenario.turns:
+        first_call = len(script.calls)
+        if trace_allocations:
+            # Collect first so garbage left by earlier turns isn't counted against this one
+            gc.collect()
+            tracemalloc.start()
+            before, _ = tracemalloc.get_traced_memory()
+        started = time.perf_counter()
+        _run_turn(session, turn.message, mode)
+        wall_ms = (time.perf_counter() - started) * 1000
+        measured = {"wall_ms": wall_ms}
+        if trace_allocations:
+            _, peak = tracemalloc.get_traced_memory()
+            gc.collect()
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            measured["alloc_peak_kb"] = (peak - before) / 1024
+            measured["alloc_net_kb"] = (current - before) / 1024
+        calls = script.calls[first_call:]
+        turns.append({
+            "message": turn.message,
+            "llm_calls": len(calls),
+            "calls": [f"{call.purpose}:{call.model}" for call in calls],
+            "prompt_chars": sum(call.prompt_chars for call in calls),
+            "prompt_tokens": sum(call.prompt_tokens for call in calls),
+            "prefix_tokens": sum(call.prefix_tokens for call in calls),
+            **measured,
+        })
+    return turns
+
+
+def benchmark(latency_ms: float, mode: str, repeat: int, trace_allocations: bool = True) -> Dict[str, Any]:
+    """Run every scenario and summarize it"""
+    script = FakeScript(latency_seconds=latency_ms / 1000)
+    restore = install_fake_models(script)
+    try:
+        # Warm-up pass: imports, gazetteer index, directory connection
+        for scenario in SCENARIOS:
+            run_scenario(scenario, script, mode, trace_allocations=False)
+
+        results = {}
+        for scenario in SCENARIOS:
+            # Timings are the median over repeats; allocations come from a separate traced run
+            runs = [run_scenario(scenario, script, mode, trace_allocations=False) for _ in range(repeat)]
+            traced = run_scenario(scenario, script, mode, trace_allocations=True)[0] if trace_allocations else None
+            results[scenario.name] = _summarize(scenario, [turns for turns, _ in runs], traced,
+                                                [queued for _, queued in runs])
+    finally:
+        restore()
+
+    return {
+        "meta": {
+            "mode": mode,
+            "latency_ms": latency_ms,
+            "repeat": repeat,
+            "tokenizer": tokenizer_name(),
+            "python": platform.python_version(),
+        },
+        "scenarios": results,
+        "prompt_assembly": prompt_assembly(),
+    }
+
+
+def prompt_assembly(iterations: int = 2000) -> Dict[str, Dict[str, float]]:
+    """Per dialogue state: time to assemble the reply prompt, and its prefix and per-turn tokens"""
+    history = [
+        HumanMessage(content="Hi, my internet has been dropping every evening since Monday"),
+        AIMessage(content="Oh no, I'm really sorry you're dealing with that. Can we start with your phone number, please?"),
+        HumanMessage(content="Sure, it's 0123456789"),
+        AIMessage(content="Thank you. Let me check... Should I file the complaint for this location?"),
+        HumanMessage(content="Yes please"),
+    ]
+    slots = {
+        "complaint": "Internet drops every evening since Monday",
+        "mobile": "0123456789",
+        "address": "28 Mohyee Al Din Abd Al Hamid, Nasr City, Cairo",
+        "summary": "Customer reported an internet outage and gave their phone number.",
+        "messages": history,
+    }
+    results = {}
+    for state in STATE_GUIDES:
+        build = lambda: build_reply_messages(state, **slots)
+        seconds = min(timeit.repeat(build, number=iterations, repeat=3)) / iterations
+        prefix, turn = build()
+        results[state] = {
+            "build_us": round(seconds * 1e6, 2),
+            "prefix_tokens": count_tokens(prefix.content),
+            "turn_tokens": count_tokens(turn.content),
+        }
+    return results
+
+
+def _summarize(scenario: Scenario, runs: List[List[Dict[str, Any]]], traced: Optional[List[Dict[str, Any]]],
+               outcomes: List[List[str]]) -> Dict[str, Any]:
+    per_turn = []
+    for index, turn in enumerate(runs[0]):
+        entry = {key: value for key, value in turn.items() if key != "wall_ms"}
+        entry["wall_ms"] = round(statistics.median(run[index]["wall_ms"] for run in runs), 3)
+        if traced is not None:
+            entry["alloc_peak_kb"] = round(traced[index]["alloc_peak_kb"], 1)
+            entry["alloc_net_kb"] = round(traced[index]["alloc_net_kb"], 1)
+        per_turn.append(entry)
+
+    llm_calls = sum(turn["llm_calls"] for turn in per_turn)
+    summary = {
+        "description": scenario.description,
+        "turns": len(per_turn),
+        "llm_calls": llm_calls,
+        "llm_calls_per_turn": round(llm_calls / len(per_turn), 3),
+        "calls_by_purpose": dict(Counter(call.split(":")[0] for turn in per_turn for call in turn["calls"])),
+        "prompt_chars": sum(turn["prompt_chars"] for turn in per_turn),
+        "prompt_tokens": sum(turn["prompt_tokens"] for turn in per_turn),
+        "prefix_tokens": sum(turn.get("prefix_tokens", 0) for turn in per_turn),
+        "wall_ms": round(statistics.median(sum(turn["wall_ms"] for turn in run) for run in runs), 3),
+        "turn_wall_ms_p50": round(statistics.median(turn["wall_ms"] for turn in per_turn), 3),
+        # A run that queued something other than expected is the one reported
+        "queued": next((queued for queued in outcomes if queued != scenario.queued), outcomes[0]),
+    }
+    if traced is not None:
+        summary["alloc_peak_kb"] = max(turn["alloc_peak_kb"] for turn in per_turn)
+        summary["alloc_net_kb"] = round(sum(turn["alloc_net_kb"] for turn in per_turn), 1)
+    summary["per_turn"] = per_turn
+    return summary
+
+
+def check_outcomes(results: Dict[str, Any]) -> List[str]:
+    """Scenarios whose conversation didn't queue the complaints it should have"""
+    failures = []
+    for scenario in SCENARIOS:
+        queued = results["scenarios"][scenario.name]["queued"]
+        if queued != scenario.queued:
+            failures.append(f"{scenario.name}: queued {queued} (expected {scenario.queued})")
+    return failures
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float, slack_ms: float):
+    """
+    Return (failures, warnings) of results against a baseline.
+
+    Model calls and prompt tokens are deterministic with the fake models, so any increase fails;
+    wall time and allocations depend on the machine and its load, so they only warn.
+    """
+    failures, warnings = [], []
+    same_tokenizer = results["meta"]["tokenizer"] == baseline["meta"].get("tokenizer")
+    if not same_tokenizer:
+        warnings.append(f"prompt tokens not compared: tokenizer {results['meta']['tokenizer']} "
+                        f"(baseline {baseline['meta'].get('tokenizer')})")
+    for name, base in baseline["scenarios"].items():
+        current = results["scenarios"].get(name)
+        if current is None:
+            failures.append(f"{name}: scenario missing")
+            continue
+        if current["llm_calls"] > base["llm_calls"]:
+            failures.append(f"{name}: {current['llm_calls']} model calls (baseline {base['llm_calls']})")
+        if same_tokenizer and current["prompt_tokens"] > base["prompt_tokens"]:
+            failures.append(f"{name}: {current['prompt_tokens']} prompt tokens (baseline {base['prompt_tokens']})")
+        wall_limit = base["wall_ms"] * (1 + tolerance) + slack_ms
+        if current["wall_ms"] > wall_limit:
+            warnings.append(f"{name}: {current['wall_ms']:.1f} ms (baseline {base['wall_ms']:.1f} ms, limit {wall_limit:.1f} ms)")
+        if "alloc_peak_kb" in current and "alloc_peak_kb" in base and current["alloc_peak_kb"] > base["alloc_peak_kb"] * (1 + tolerance):
+            warnings.append(f"{name}: {current['alloc_peak_kb']} KB peak allocations (baseline {base['alloc_peak_kb']} KB)")
+    return failures, warnings
+
+
+def print_report(results: Dict[str, Any]) -> None:
+    meta = results["meta"]
+    print(f"mode={meta['mode']} latency={meta['latency_ms']}ms repeat={meta['repeat']} tokenizer={meta['tokenizer']}")
+    header = (f"{'scenario':<22}{'turns':>6}{'calls':>7}{'calls/turn':>12}{'prompt tok':>12}{'prefix tok':>12}"
+              f"{'wall ms':>10}{'p50 turn':>10}{'peak KB':>10}")
+    print(header)
+    print("-" * len(header))
+    for name, summary in results["scenarios"].items():
+        print(f"{name:<22}{summary['turns']:>6}{summary['llm_calls']:>7}{summary['llm_calls_per_turn']:>12.2f}"
+              f"{summary['prompt_tokens']:>12}{summary.get('prefix_tokens', 0):>12}{summary['wall_ms']:>10.1f}"
+              f"{summary['turn_wall_ms_p50']:>10.1f}{summary['alloc_peak_kb'] if 'alloc_peak_kb' in summary else '-':>10}")
+    if "prompt_assembly" in results:
+        print()
+        header = f"{'reply prompt':<28}{'build us':>10}{'prefix tok':>12}{'turn tok':>10}"
+        print(header)
+        print("-" * len(header))
+        for state, measured in results["prompt_assembly"].items():
+            print(f"{state:<28}{measured['build_us']:>10.1f}{measured['prefix_tokens']:>12}{measured['turn_tokens']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the complaint agent with fake models")
+    parser.add_argument("--latency-ms", type=float, default=None, help="Fake model latency per call (default 50)")
+    parser.add_argument("--mode", choices=MODES, default=None,
+                        help="process = process_user_message, graph = agent.ainvoke (default process)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per scenario; wall times are the median")
+    parser.add_argument("--no-alloc", action="store_true", help="Skip the tracemalloc pass")
+    parser.add_argument("--save", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON to compare against; exits 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Relative slowdown or allocation growth before warning (default 0.25)")
+    parser.add_argument("--slack-ms", type=float, default=10.0, help="Absolute slowdown per scenario before warning")
+    parser.add_argument("--json", action="store_true", help="Print the full results as JSON")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    # Compare like with like: latency and mode default to the baseline's
+    base_meta = baseline["meta"] if baseline else {}
+    latency_ms = args.latency_ms if args.latency_ms is not None else base_meta.get("latency_ms", 50.0)
+    mode = args.mode or base_meta.get("mode", "process")
+
+    results = benchmark(latency_ms, mode, args.repeat, trace_allocations=not args.no_alloc)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+
+    # Never record a baseline from a run that got the conversations wrong
+    outcome_failures = check_outcomes(results)
+    for failure in outcome_failures:
+        print(f"FAILED {failure}")
+    if outcome_failures:
+        sys.exit(1)
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"Saved results to {args.save}")
+
+    if baseline is not None:
+        failures, warnings = compare(results, baseline, args.tolerance, args.slack_ms)
+        for warning in warnings:
+            print(f"WARNING {warning}")
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        if failures:
+            sys.exit(1)
+        print(f"No regressions against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Scripted conversations for the agent benchmarks
+Each turn carries the structured extraction the fake model returns if the agent asks it about that message;
+each scenario lists the complaints the conversation must leave queued for submission, so a run that loses
+or duplicates one fails rather than being recorded.
+"""
+
+from typing import Any, Dict, List, NamedTuple
+
+
+class Turn(NamedTuple):
+    message: str
+    extraction: Dict[str, Any] = {}
+
+
+class Scenario(NamedTuple):
+    name: str
+    description: str
+    turns: List[Turn]
+    queued: List[str]  # Complaints queued by the end of the conversation, in order
+
+
+REGISTERED_PHONE = "0123456789"
+UNREGISTERED_PHONE = "01001234567"
+
+SCENARIOS = [
+    Scenario(
+        "registered_caller",
+        "Registered caller confirms the address on file",
+        [
+            Turn("Hi, my internet has been down since this morning",
+                 {"complaint": "Internet has been down since this morning"}),
+            Turn(f"My number is {REGISTERED_PHONE}", {"phone_number": REGISTERED_PHONE}),
+            Turn("Yes, that's correct", {"intent": "confirm"}),
+        ],
+        ["Internet has been down since this morning"],
+    ),
+    Scenario(
+        "unregistered_caller",
+        "Unknown number, caller dictates the address",
+        [
+            Turn("The power keeps cutting out in my apartment",
+                 {"complaint": "Power keeps cutting out in the apartment"}),
+            Turn(UNREGISTERED_PHONE, {"phone_number": UNREGISTERED_PHONE}),
+            Turn("15 Abbas El Akkad, Nasr City", {"address": "15 Abbas El Akkad, Nasr City"}),
+            Turn("Yes", {"intent": "confirm"}),
+        ],
+        ["Power keeps cutting out in the apartment"],
+    ),
+    Scenario(
+        "address_change",
+        "Registered caller reports the issue at a different address",
+        [
+            Turn("There is no water pressure in my building", {"complaint": "No water pressure in the building"}),
+            Turn(f"You can reach me on {REGISTERED_PHONE}", {"phone_number": REGISTERED_PHONE}),
+            Turn("No, I want to use a different address", {"intent": "change_address"}),
+            Turn("5 Tahrir Street, Dokki", {"address": "5 Tahrir Street, Dokki"}),
+            Turn("Yes please submit it", {"intent": "confirm"}),
+        ],
+        ["No water pressure in the building"],
+    ),
+    Scenario(
+        "decline",
+        "Unregistered caller declines the summary, corrects the address, then confirms",
+        [
+            Turn(f"My electricity meter is broken, call me on {UNREGISTERED_PHONE}",
+                 {"complaint": "Electricity meter is broken", "phone_number": UNREGISTERED_PHONE}),
+            Turn("12 Makram Ebeid, Nasr City", {"address": "12 Makram Ebeid, Nasr City"}),
+            Turn("No", {"intent": "decline"}),
+            Turn("It's actually at 20 Makram Ebeid, Nasr City",
+                 {"address": "20 Makram Ebeid, Nasr City", "intent": "change_address"}),
+            Turn("Yes, correct", {"intent": "confirm"}),
+        ],
+        ["Electricity meter is broken"],
+    ),
+    Scenario(
+        "multi_complaint",
+        "Registered caller files two complaints in one conversation",
+        [
+            Turn("My internet connection drops every few minutes",
+                 {"complaint": "Internet connection drops every few minutes"}),
+            Turn(REGISTERED_PHONE, {"phone_number": REGISTERED_PHONE}),
+            Turn("Yes", {"intent": "confirm"}),
+            Turn("Actually there's also a gas smell near the meter", {"complaint": "Gas smell near the meter"}),
+            Turn("Yes, same address", {"intent": "confirm"}),
+            Turn("Yes", {"intent": "confirm"}),
+        ],
+        ["Internet connection drops every few minutes", "Gas smell near the meter"],
+    ),
+]
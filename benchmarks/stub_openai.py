@@ -0,0 +1,192 @@
+"""
+Local stub of the OpenAI chat-completions API for load tests
+Answers /v1/chat/completions (plain, structured and streamed) and /v1/models after a latency drawn from a
+configurable distribution, and can inject errors. Structured extraction requests are answered from
+the benchmark scenarios, so scripted dialogues follow the same path as with the real models.
+
+    python -m benchmarks.stub_openai --port 8900 --latency lognormal:0.4,0.5 --error-rate 0.02
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from .scenarios import SCENARIOS
+
+REPLY_TEXT = "Thank you for letting me know. Could you tell me a little more so I can help you with this?"
+
+# Extraction results for every scripted message
+EXTRACTIONS = {turn.message: turn.extraction for scenario in SCENARIOS for turn in scenario.turns}
+
+
+class LatencyDistribution:
+    """
+    Latency in seconds from a spec string:
+    "0.3" or "fixed:0.3", "uniform:LOW,HIGH", "lognormal:MEDIAN,SIGMA"
+    """
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        kind, _, params = spec.partition(":") if ":" in spec else ("fixed", "", spec)
+        values = [float(value) for value in params.split(",") if value]
+        if kind == "fixed" and len(values) == 1:
+            self._sample = lambda: values[0]
+        elif kind == "uniform" and len(values) == 2:
+            self._sample = lambda: random.uniform(values[0], values[1])
+        elif kind == "lognormal" and len(values) == 2:
+            median, sigma = values
+            self._sample = lambda: median * random.lognormvariate(0.0, sigma)
+        else:
+            raise ValueError(f"Invalid latency spec: {spec}")
+
+    def sample(self) -> float:
+        return max(0.0, self._sample())
+
+
+class StubConfig:
+    latency = LatencyDistribution("fixed:0.3")
+    token_delay = 0.01  # seconds between streamed tokens
+    error_rate = 0.0
+    error_status = 500
+
+
+config = StubConfig()
+app = FastAPI(title="OpenAI chat-completions stub")
+stats = {"requests": 0, "streamed": 0, "structured": 0, "injected_errors": 0}
+
+
+def _last_user_text(body: Dict[str, Any]) -> str:
+    messages = body.get("messages") or [{}]
+    content = messages[-1].get("content") or ""
+    if isinstance(content, list):
+        content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
+
+
+def _extraction(prompt: str) -> Dict[str, Any]:
+    message = prompt.rsplit("Message:", 1)[-1].strip()
+    return EXTRACTIONS.get(message, {})
+
+
+def _usage(prompt: str, completion: str) -> Dict[str, int]:
+    prompt_tokens, completion_tokens = len(prompt) // 4 + 1, len(completion) // 4 + 1
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+
+def _build_message(body: Dict[str, Any], prompt: str) -> Dict[str, Any]:
+    """Assistant message: JSON content for response_format, a tool call for tools, else text"""
+    if body.get("tools"):
+        stats["structured"] += 1
+        tool = body["tools"][0]["function"]["name"]
+        return {"role": "assistant", "content": None, "tool_calls": [{
+            "id": f"call_{uuid.uuid4().hex[:12]}", "type": "function",
+            "function": {"name": tool, "arguments": json.dumps(_extraction(prompt))},
+        }]}
+    if body.get("response_format", {}).get("type") in ("json_schema", "json_object"):
+        stats["structured"] += 1
+        fields = {"complaint": None, "phone_number": None, "address": None, "intent": "none"}
+        return {"role": "assistant", "content": json.dumps({**fields, **_extraction(prompt)}), "refusal": None}
+    return {"role": "assistant", "content": REPLY_TEXT, "refusal": None}
+
+
+def _chunk(completion_id: str, model: str, delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+    payload = {
+        "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+async def _stream(completion_id: str, model: str, message: Dict[str, Any], latency: float, include_usage: bool,
+                  prompt: str):
+    await asyncio.sleep(latency)  # time to first token
+    yield _chunk(completion_id, model, {"role": "assistant", "content": ""})
+    text = message.get("content") or ""
+    for index, word in enumerate(text.split(" ")):
+        yield _chunk(completion_id, model, {"content": word if index == 0 else f" {word}"})
+        await asyncio.sleep(config.token_delay)
+    yield _chunk(completion_id, model, {}, finish_reason="stop")
+    if include_usage:
+        usage = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                 "model": model, "choices": [], "usage": _usage(prompt, text)}
+        yield f"data: {json.dumps(usage)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+    latency = config.latency.sample()
+
+    if random.random() < config.error_rate:
+        stats["injected_errors"] += 1
+        await asyncio.sleep(latency / 2)
+        return JSONResponse(status_code=config.error_status,
+                            content={"error": {"message": "Injected error", "type": "server_error"}})
+
+    model = body.get("model", "gpt-4o")
+    prompt = _last_user_text(body)
+    message = _build_message(body, prompt)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+
+    if body.get("stream") and not message.get("tool_calls"):
+        stats["streamed"] += 1
+        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+        return StreamingResponse(_stream(completion_id, model, message, latency, include_usage, prompt),
+                                 media_type="text/event-stream")
+
+    await asyncio.sleep(latency)
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": message,
+                     "finish_reason": "tool_calls" if message.get("tool_calls") else "stop"}],
+        "usage": _usage(prompt, message.get("content") or ""),
+    }
+
+
+@app.get("/v1/models")
+async def list_models():
+    # Hit by the backend's startup warm-up to open connections
+    return {"object": "list", "data": [{"id": name, "object": "model", "owned_by": "stub"}
+                                       for name in ("gpt-4o", "gpt-4o-mini")]}
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Local OpenAI chat-completions stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", default="fixed:0.3",
+                        help='Per-call latency: "fixed:S", "uniform:LOW,HIGH" or "lognormal:MEDIAN,SIGMA" (seconds)')
+    parser.add_argument("--token-delay", type=float, default=0.01, help="Seconds between streamed tokens")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with an error")
+    parser.add_argument("--error-status", type=int, default=500, help="HTTP status of injected errors (e.g. 429)")
+    args = parser.parse_args()
+
+    config.latency = LatencyDistribution(args.latency)
+    config.token_delay = args.token_delay
+    config.error_rate = args.error_rate
+    config.error_status = args.error_status
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,17 +3,28 @@ import axios from 'axios'
 import { v4 as uuidv4 } from 'uuid'
 import AvatarPanel from './components/AvatarPanel'
 import StatePanel from './components/StatePanel'
+import { applyStatePatch, changedFields } from './statePatch'
 
 // Configure axios base URL
 const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000'
 
+// Automatic resends of a turn that failed before its reply started (network error, 429/503)
+const MAX_TURN_RETRIES = 2
+const RETRY_DELAY_MS = 1000
+
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms))
+
 function App() {
   const [messages, setMessages] = useState([])
   const [inputValue, setInputValue] = useState('')
   const [isLoading, setIsLoading] = useState(false)
   const [sessionId, setSessionId] = useState('')
   const [agentState, setAgentState] = useState(null)
-  const [lastAIMessage, setLastAIMessage] = useState(null)
+  // Fields changed by the last turn's state patch (null when the full state was sent)
+  const [stateChanges, setStateChanges] = useState(null)
+  // Session version of the state held in agentState; the backend sends deltas against it
+  const stateVersionRef = useRef(null)
+  const [speechSegments, setSpeechSegments] = useState([])
   const chatContainerRef = useRef(null)
   const textareaRef = useRef(null)
 
@@ -44,46 +55,158 @@ function App() {
     const userMessage = inputValue.trim()
     setInputValue('')
 
-    // Add user message to chat
-    setMessages(prev => [...prev, { role: 'user', content: userMessage }])
+    // Add user message to chat; its turn_id is fixed here and reused by every resend of it
+    const turnId = uuidv4()
+    setMessages(prev => [...prev, { role: 'user', content: userMessage, turnId }])
+    await sendTurn(userMessage, turnId)
+  }
+
+  // Resend a failed turn with its original turn_id: the backend replays it if it already ran
+  const retryTurn = async (turnId) => {
+    const userMessage = messages.find(msg => msg.turnId === turnId)
+    if (!userMessage || isLoading) return
+    // Drop the error (and any partial reply) that followed the message
+    setMessages(prev => prev.slice(0, prev.findIndex(msg => msg.turnId === turnId) + 1))
+    await sendTurn(userMessage.content, turnId)
+  }
+
+  const postTurn = async (userMessage, turnId) => {
+    for (let attempt = 0; ; attempt++) {
+      let response
+      try {
+        response = await fetch(`${API_URL}/api/chat/stream`, {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({
+            session_id: sessionId,
+            message: userMessage,
+            base_version: stateVersionRef.current,
+            // Same id on every resend, so the backend runs the turn once and replays it after that
+            turn_id: turnId
+          })
+        })
+      } catch (error) {
+        // The request may or may not have reached the backend; resending the same turn_id is safe
+        if (attempt >= MAX_TURN_RETRIES) throw error
+        await sleep(RETRY_DELAY_MS * 2 ** attempt)
+        continue
+      }
+      if ((response.status === 429 || response.status === 503) && attempt < MAX_TURN_RETRIES) {
+        // Shed by admission control before the turn ran
+        const retryAfter = Number(response.headers.get('Retry-After')) || RETRY_DELAY_MS / 1000
+        await sleep(Math.min(retryAfter * 1000, 5000))
+        continue
+      }
+      return response
+    }
+  }
+
+  const sendTurn = async (userMessage, turnId) => {
     setIsLoading(true)
 
+    let replyStarted = false
+    const showReply = (text) => {
+      const replaceLast = replyStarted
+      replyStarted = true
+      setMessages(prev => replaceLast
+        ? [...prev.slice(0, -1), { role: 'assistant', content: text }]
+        : [...prev, { role: 'assistant', content: text }])
+    }
+    const clearReply = () => {
+      if (!replyStarted) return
+      replyStarted = false
+      setMessages(prev => prev.slice(0, -1))
+    }
+
     try {
-      console.log('Sending message to backend:', { session_id: sessionId, message: userMessage })
-      console.log('API URL:', `${API_URL}/api/chat`)
-      
-      const response = await axios.post(`${API_URL}/api/chat`, {
-        session_id: sessionId,
-        message: userMessage
-      })
+      console.log('Streaming message to backend:', { session_id: sessionId, message: userMessage })
+      console.log('API URL:', `${API_URL}/api/chat/stream`)
 
-      console.log('Backend response:', response.data)
+      const response = await postTurn(userMessage, turnId)
+      if (!response.ok) {
+        throw new Error(`HTTP ${response.status}`)
+      }
 
-      const aiResponse = response.data.response
+      const reader = response.body.getReader()
+      const decoder = new TextDecoder()
+      let buffer = ''
+      let replyText = ''
+      let spokenUpTo = 0
 
-      // Add AI response to chat
-      setMessages(prev => [...prev, { 
-        role: 'assistant', 
-        content: aiResponse 
-      }])
-      
-      // Set the AI message for avatar to speak
-      setLastAIMessage(aiResponse)
-      console.log('Avatar should speak:', aiResponse)
-      
-      setAgentState(response.data.agent_state)
+      // Hand complete sentences to the avatar while the rest is still generating
+      const flushSpeech = (final) => {
+        const pending = replyText.slice(spokenUpTo)
+        const match = final ? null : pending.match(/^[\s\S]*[.!?]\s/)
+        const segment = final ? pending : match?.[0]
+        if (segment && segment.trim()) {
+          setSpeechSegments(prev => [...prev, { text: segment.trim() }])
+          spokenUpTo += segment.length
+        }
+      }
+
+      // The streamed text isn't the reply after all: stop the avatar and take it off the screen
+      const discardStreamed = () => {
+        if (spokenUpTo > 0) setSpeechSegments(prev => [...prev, { interrupt: true }])
+        replyText = ''
+        spokenUpTo = 0
+        clearReply()
+      }
+
+      while (true) {
+        const { done, value } = await reader.read()
+        if (done) break
+        buffer += decoder.decode(value, { stream: true })
+
+        // Server-Sent Events are separated by a blank line
+        const events = buffer.split('\n\n')
+        buffer = events.pop()
+        for (const rawEvent of events) {
+          let eventType = 'message'
+          let data = ''
+          for (const line of rawEvent.split('\n')) {
+            if (line.startsWith('event: ')) eventType = line.slice(7)
+            else if (line.startsWith('data: ')) data += line.slice(6)
+          }
+          const payload = data ? JSON.parse(data) : {}
+
+          if (eventType === 'token') {
+            replyText += payload.text
+            showReply(replyText)
+            flushSpeech(false)
+          } else if (eventType === 'reset') {
+            // The model call streaming the reply failed or was outrun; "done" or new tokens follow
+            discardStreamed()
+          } else if (eventType === 'done') {
+            console.log('Backend response:', payload)
+            // Whatever was streamed, the avatar ends up saying the final response
+            if (replyText.trim() !== payload.response.trim()) discardStreamed()
+            if (!replyText) replyText = payload.response
+            showReply(payload.response)
+            flushSpeech(true)
+            if (payload.state_patch) {
+              setAgentState(prev => applyStatePatch(prev, payload.state_patch))
+              setStateChanges(changedFields(payload.state_patch))
+            } else {
+              setAgentState(payload.agent_state)
+              setStateChanges(null)
+            }
+            stateVersionRef.current = payload.version
+          } else if (eventType === 'error') {
+            throw new Error(payload.detail)
+          }
+        }
+      }
 
     } catch (error) {
       console.error('Error sending message:', error)
-      console.error('Error details:', error.response?.data || error.message)
       
-      const errorMessage = error.response?.data?.detail 
-        || error.message 
+      const errorMessage = error.message 
         || 'Sorry, I encountered an error. Please try again.'
       
       setMessages(prev => [...prev, { 
         role: 'assistant', 
-        content: `Error: ${errorMessage}. Please check if the backend is running.` 
+        content: `Error: ${errorMessage}. Please check if the backend is running.`,
+        retryTurnId: turnId
       }])
     } finally {
       setIsLoading(false)
@@ -99,9 +222,11 @@ function App() {
 
   const clearChat = () => {
     setMessages([])
-    setLastAIMessage(null)
+    setSpeechSegments([])
     const newSessionId = uuidv4()
     setSessionId(newSessionId)
+    // The new session starts from scratch: ask for its full state
+    stateVersionRef.current = null
     axios.post(`${API_URL}/api/session/clear`, null, { params: { session_id: sessionId } })
       .catch(err => console.log('Clear session error:', err))
   }
@@ -109,7 +234,7 @@ function App() {
   return (
     <div style={{ display: 'flex', height: '100vh', background: '#F9FAFB' }}>
       {/* State Panel - Left Side */}
-      <StatePanel agentState={agentState} />
+      <StatePanel agentState={agentState} changedFields={stateChanges} />
       
       {/* Chat Section - Center */}
       <div style={{ flex: 1, display: 'flex', flexDirection: 'column' }}>
@@ -214,11 +339,25 @@ function App() {
                 whiteSpace: 'pre-wrap'
               }}>
                 {msg.content}
+                {msg.retryTurnId && idx === messages.length - 1 && !isLoading && (
+                  <div
+                    onClick={() => retryTurn(msg.retryTurnId)}
+                    style={{
+                      marginTop: '8px',
+                      color: '#6366F1',
+                      cursor: 'pointer',
+                      fontSize: '14px',
+                      fontWeight: 500
+                    }}
+                  >
+                    Retry
+                  </div>
+                )}
               </div>
             </div>
           ))}
 
-          {isLoading && (
+          {isLoading && messages[messages.length - 1]?.role === 'user' && (
             <div style={{ display: 'flex', gap: '16px', alignItems: 'flex-start' }}>
               <div style={{
                 width: '32px',
@@ -316,7 +455,7 @@ function App() {
 
       {/* Avatar Panel - Right Side */}
       <AvatarPanel 
-        currentMessage={lastAIMessage}
+        speechSegments={speechSegments}
       />
     </div>
   )
@@ -1,21 +1,36 @@
 import { useState, useEffect, useRef } from 'react'
 
-function AvatarPanel({ currentMessage }) {
+function AvatarPanel({ speechSegments }) {
   const [isLoading, setIsLoading] = useState(false)
   const [debug, setDebug] = useState('')
   const [sessionData, setSessionData] = useState(null)
-  const [lastSpokenMessage, setLastSpokenMessage] = useState(null)
+  const spokenCountRef = useRef(0)
+  // Speech requests run one after another, so an interrupt never cuts off the text sent after it
+  const speechQueueRef = useRef(Promise.resolve())
   const videoRef = useRef(null)
   const peerConnectionRef = useRef(null)
 
-  // Speak when new AI message arrives (only if different from last spoken)
+  // Speak reply segments as they stream in (each segment is spoken once); an { interrupt } entry
+  // stops what the avatar is still saying from a streamed reply that was abandoned
   useEffect(() => {
-    if (currentMessage && sessionData && currentMessage.trim() && currentMessage !== lastSpokenMessage) {
-      console.log('Avatar speaking:', currentMessage.substring(0, 50) + '...')
-      speakText(currentMessage)
-      setLastSpokenMessage(currentMessage)
+    if (speechSegments.length < spokenCountRef.current) {
+      // Chat was cleared
+      spokenCountRef.current = 0
     }
-  }, [currentMessage, sessionData])
+    const pending = speechSegments.slice(spokenCountRef.current)
+    spokenCountRef.current = speechSegments.length
+    if (!sessionData) return
+    // Text before the last interrupt in this batch was never sent, so it is skipped
+    const lastInterrupt = pending.map(segment => Boolean(segment.interrupt)).lastIndexOf(true)
+    const text = pending.slice(lastInterrupt + 1).map(segment => segment.text).join(' ')
+    if (lastInterrupt >= 0) {
+      speechQueueRef.current = speechQueueRef.current.then(() => interruptSpeech())
+    }
+    if (text.trim()) {
+      console.log('Avatar speaking:', text.substring(0, 50) + '...')
+      speechQueueRef.current = speechQueueRef.current.then(() => speakText(text))
+    }
+  }, [speechSegments, sessionData])
 
   const startAvatar = async () => {
     setIsLoading(true)
@@ -229,6 +244,23 @@ function AvatarPanel({ currentMessage }) {
     }
   }
 
+  const interruptSpeech = async () => {
+    if (!sessionData) return
+    try {
+      console.log('Interrupting avatar speech')
+      await fetch('https://api.heygen.com/v1/streaming.interrupt', {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+          'Authorization': `Bearer ${sessionData.token}`
+        },
+        body: JSON.stringify({ session_id: sessionData.session_id })
+      })
+    } catch (error) {
+      console.error('Interrupt error:', error)
+    }
+  }
+
   const stopAvatar = async () => {
     if (sessionData) {
       try {
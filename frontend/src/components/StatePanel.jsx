@@ -1,6 +1,6 @@
 import { useState, useEffect, useRef } from 'react'
 
-function StatePanel({ agentState }) {
+function StatePanel({ agentState, changedFields }) {
   const [isExpanded, setIsExpanded] = useState(true)
   const [updatedFields, setUpdatedFields] = useState(new Set())
   const prevStateRef = useRef(null)
@@ -8,10 +8,12 @@ function StatePanel({ agentState }) {
   useEffect(() => {
     if (!agentState) return
 
-    // Track which fields changed
-    const newUpdatedFields = new Set()
+    // Track which fields changed: known from the turn's state patch, otherwise found by comparison
+    let newUpdatedFields = new Set()
     
-    if (prevStateRef.current) {
+    if (changedFields) {
+      newUpdatedFields = new Set(changedFields)
+    } else if (prevStateRef.current) {
       const prev = prevStateRef.current
       const current = agentState
 
@@ -120,7 +122,8 @@ function StatePanel({ agentState }) {
       areaId: null,
       labId: null,
       commercialBranchCode: null,
-      clientAddress: null
+      clientAddress: null,
+      resolvedAddress: null
     },
     address_loaded_from_system: null,
     address_updated_by_user: null,
@@ -0,0 +1,35 @@
+// Apply the JSON Patch operations sent with each turn (add / replace / remove on object paths).
+// Returns a new state object, copying only the objects along changed paths.
+const unescapeToken = (token) => token.replace(/~1/g, '/').replace(/~0/g, '~')
+
+function setIn(target, keys, op, value) {
+  const [key, ...rest] = keys
+  const copy = { ...target }
+  if (rest.length > 0) {
+    copy[key] = setIn(copy[key] ?? {}, rest, op, value)
+  } else if (op === 'remove') {
+    delete copy[key]
+  } else {
+    copy[key] = value
+  }
+  return copy
+}
+
+export function applyStatePatch(state, operations) {
+  return operations.reduce((current, { op, path, value }) => (
+    path === ''
+      ? value
+      : setIn(current ?? {}, path.slice(1).split('/').map(unescapeToken), op, value)
+  ), state)
+}
+
+// Changed fields in the "key" / "key.nested" form StatePanel highlights
+export function changedFields(operations) {
+  const fields = new Set()
+  for (const { path } of operations) {
+    const keys = path.slice(1).split('/').map(unescapeToken)
+    fields.add(keys[0])
+    if (keys.length > 1) fields.add(keys.join('.'))
+  }
+  return fields
+}
@@ -1,4 +1,12 @@
 # Agent module for LangGraph implementation
-from .complaint_agent import agent, AgentState
+from .complaint_agent import AgentState, get_agent
+from .state import SessionState
 
-__all__ = ["agent", "AgentState"]
+__all__ = ["agent", "get_agent", "AgentState", "SessionState"]
+
+
+def __getattr__(name: str):
+    # The compiled graph is built on first use (see complaint_agent.get_agent)
+    if name == "agent":
+        return get_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,50 @@
+"""
+Per-turn latency budget
+Each turn gets an absolute deadline (time.monotonic()) that is passed to the graph in
+config["configurable"]["turn_deadline"]. Extractions that can't finish before the reply reserve
+are deferred to the next turn, and the reply falls back to a pre-rendered utterance when the model
+misses the deadline, so a turn answers within budget and records that it degraded.
+
+    CALLTAKER_TURN_BUDGET=8       seconds per turn (<= 0 disables the budget)
+    CALLTAKER_REPLY_RESERVE=2.5   seconds of the budget kept for generating the reply
+"""
+
+import os
+import time
+from typing import Optional
+
+from langgraph.config import get_config
+
+DEFAULT_TURN_BUDGET = 8.0
+DEFAULT_REPLY_RESERVE = 2.5
+
+# Messages kept for extraction on later turns when their extraction keeps missing the budget
+MAX_DEFERRED_MESSAGES = 3
+
+
+def turn_budget() -> float:
+    return float(os.getenv("CALLTAKER_TURN_BUDGET", DEFAULT_TURN_BUDGET))
+
+
+def reply_reserve() -> float:
+    return float(os.getenv("CALLTAKER_REPLY_RESERVE", DEFAULT_REPLY_RESERVE))
+
+
+def new_deadline(budget: Optional[float] = None) -> Optional[float]:
+    """Deadline for a turn starting now, or None when the budget is disabled"""
+    budget = turn_budget() if budget is None else budget
+    return time.monotonic() + budget if budget > 0 else None
+
+
+def current_deadline() -> Optional[float]:
+    """Deadline of the turn the calling graph node belongs to (None outside a budgeted turn)"""
+    try:
+        return get_config().get("configurable", {}).get("turn_deadline")
+    except RuntimeError:
+        # Called outside a runnable context
+        return None
+
+
+def remaining(deadline: Optional[float]) -> Optional[float]:
+    """Seconds left until deadline (never negative), or None without a deadline"""
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
@@ -0,0 +1,146 @@
+"""
+Response cache for model calls
+Bounded LRU memory tier with TTL eviction, plus an optional sqlite tier that survives restarts.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Normalize a prompt so trivially different utterances share a cache key"""
+    return " ".join(prompt.lower().split())
+
+
+def make_key(model_name: str, purpose: str, prompt: str) -> str:
+    """Cache key for a model call"""
+    raw = f"{model_name}\x00{purpose}\x00{normalize_prompt(prompt)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """LRU + TTL cache of serialized model responses"""
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 3600.0,
+                 db_path: Optional[str] = None, enabled: bool = True):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached value for a key, or None on a miss"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.evictions += 1
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[1] > now:
+                    self._store(key, row[0], row[1])
+                    self.disk_hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: str) -> None:
+        """Store a value under a key"""
+        if not self.enabled:
+            return
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._store(key, value, expires_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO response_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, value, expires_at)
+                )
+
+    def _store(self, key: str, value: str, expires_at: float) -> None:
+        """Insert into the memory tier, evicting the least recently used entries"""
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def purge_expired(self) -> None:
+        """Drop expired entries from both tiers"""
+        now = time.time()
+        with self._lock:
+            expired = [key for key, (expires_at, _) in self._entries.items() if expires_at <= now]
+            for key in expired:
+                del self._entries[key]
+            self.evictions += len(expired)
+            if self._db is not None:
+                self._db.execute("DELETE FROM response_cache WHERE expires_at <= ?", (now,))
+
+    def clear(self) -> None:
+        """Remove all entries and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.disk_hits = self.misses = self.evictions = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM response_cache")
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current size"""
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+# Extraction is a pure function of the user message, so it is cached by default.
+# Reply generation is creative and history-dependent, so its cache is opt-in.
+extraction_cache = ResponseCache(
+    max_entries=int(os.getenv("CALLTAKER_CACHE_SIZE", "10000")),
+    ttl_seconds=float(os.getenv("CALLTAKER_CACHE_TTL", "3600")),
+    db_path=os.getenv("CALLTAKER_CACHE_DB") or None,
+    enabled=_env_flag("CALLTAKER_CACHE_EXTRACTION", "1"),
+)
+
+reply_cache = ResponseCache(
+    max_entries=int(os.getenv("CALLTAKER_CACHE_SIZE", "10000")),
+    ttl_seconds=float(os.getenv("CALLTAKER_CACHE_TTL", "3600")),
+    enabled=_env_flag("CALLTAKER_CACHE_REPLIES", "0"),
+)
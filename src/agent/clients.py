@@ -0,0 +1,136 @@
+"""
+Shared model clients
+The chat models are built on first use instead of at import, and every model sends its requests
+through pooled keep-alive HTTP clients, so connections and TLS sessions opened by one call or by the
+startup warm-up are reused by every later call. The sync client is process-wide; the async client,
+and the models built on it, are kept per event loop, because a pooled connection belongs to the
+loop that opened it (sync callers run each turn in its own asyncio.run, see utils.py).
+
+    CALLTAKER_HTTP_MAX_CONNECTIONS=100        connections to the model API per client
+    CALLTAKER_HTTP_KEEPALIVE_CONNECTIONS=20   idle connections kept open
+    CALLTAKER_HTTP_KEEPALIVE_EXPIRY=60        seconds an idle connection is kept
+"""
+
+import asyncio
+import os
+import threading
+import weakref
+from typing import Optional, Tuple
+
+import httpx
+import openai
+from langchain_openai import ChatOpenAI
+
+from .metrics import llm_metrics
+
+MODEL_NAME = "gpt-4o"
+# Mini model for simple follow-up questions
+MINI_MODEL_NAME = "gpt-4o-mini"
+
+
+class _NoLoop:
+    """Stands in for the event loop when clients are used outside one (e.g. warm-up threads)"""
+
+
+_NO_LOOP = _NoLoop()
+
+_http_client: Optional[httpx.Client] = None
+# loop -> async HTTP client, and loop -> (llm, llm_mini) built on that client
+_async_http_clients: "weakref.WeakKeyDictionary[object, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+_loop_models: "weakref.WeakKeyDictionary[object, Tuple]" = weakref.WeakKeyDictionary()
+_http_lock = threading.Lock()
+# Models set with set_models (e.g. fakes), used on every loop
+_models: Optional[Tuple] = None
+_models_lock = threading.Lock()
+
+
+def _loop_key() -> object:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return _NO_LOOP
+
+
+def _pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=int(os.getenv("CALLTAKER_HTTP_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("CALLTAKER_HTTP_KEEPALIVE_CONNECTIONS", "20")),
+        keepalive_expiry=float(os.getenv("CALLTAKER_HTTP_KEEPALIVE_EXPIRY", "60")),
+    )
+
+
+def get_http_clients() -> Tuple[httpx.Client, httpx.AsyncClient]:
+    """(sync, async) HTTP clients shared by the models: the sync one process-wide, the async one per event loop"""
+    global _http_client
+    loop = _loop_key()
+    with _http_lock:
+        # The openai defaults (timeouts, redirects) with our pool limits
+        if _http_client is None:
+            _http_client = openai.DefaultHttpxClient(limits=_pool_limits())
+        async_client = _async_http_clients.get(loop)
+        if async_client is None:
+            async_client = _async_http_clients[loop] = openai.DefaultAsyncHttpxClient(limits=_pool_limits())
+        return _http_client, async_client
+
+
+def _build_model(name: str) -> ChatOpenAI:
+    http_client, http_async_client = get_http_clients()
+    return ChatOpenAI(
+        model=name,
+        temperature=0.7,
+        api_key=os.getenv("OPENAI_API_KEY"),
+        callbacks=[llm_metrics],
+        http_client=http_client,
+        http_async_client=http_async_client,
+    )
+
+
+def get_models() -> Tuple:
+    """(llm, llm_mini) for the running event loop, built on first use there"""
+    with _models_lock:
+        if _models is not None:
+            return _models
+        loop = _loop_key()
+        models = _loop_models.get(loop)
+        if models is None:
+            models = _loop_models[loop] = (_build_model(MODEL_NAME), _build_model(MINI_MODEL_NAME))
+        return models
+
+
+def set_models(models: Optional[Tuple]) -> Optional[Tuple]:
+    """Use (llm, llm_mini), e.g. fakes, on every loop; None goes back to the built ones. Returns the previous pair"""
+    global _models
+    with _models_lock:
+        previous, _models = _models, models
+        return previous
+
+
+def api_base_url() -> str:
+    """Base URL the models send requests to"""
+    llm, _ = get_models()
+    # The openai client's resolved URL (it also reads OPENAI_BASE_URL)
+    client = getattr(llm, "root_async_client", None)
+    return str(client.base_url if client is not None else "https://api.openai.com/v1").rstrip("/")
+
+
+async def release_loop_clients() -> None:
+    """Close the running loop's async HTTP client and drop its models (call before the loop ends)"""
+    loop = _loop_key()
+    with _models_lock, _http_lock:
+        _loop_models.pop(loop, None)
+        client = _async_http_clients.pop(loop, None)
+    if client is not None:
+        await client.aclose()
+
+
+async def close_http_clients() -> None:
+    """Close the shared HTTP clients (at shutdown); models built afterwards get new ones"""
+    global _http_client
+    await release_loop_clients()
+    with _models_lock, _http_lock:
+        client, _http_client = _http_client, None
+        # Clients of other loops can't be closed from this one; their loops close their connections
+        _loop_models.clear()
+        _async_http_clients.clear()
+    if client is not None:
+        client.close()
@@ -3,32 +3,41 @@ LangGraph Agent for Customer Complaints
 Captures complaint and mobile number, summarizes, and submits on confirmation.
 """
 
+import asyncio
 import os
-from typing import TypedDict, Annotated, Literal, Optional
+import threading
+from typing import TypedDict, Annotated, Literal, Mapping, Optional
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, AIMessage
+from langgraph.config import get_config
 from langgraph.graph import StateGraph, END
 from langgraph.graph.message import add_messages
 
-# Load environment variables
+# Load environment variables (before the local modules below read their configuration)
 load_dotenv()
 
-# Initialize OpenAI models
-llm = ChatOpenAI(
-    model="gpt-4o",
-    temperature=0.7,
-    api_key=os.getenv("OPENAI_API_KEY")
-)
-
-# Mini model for simple follow-up questions
-llm_mini = ChatOpenAI(
-    model="gpt-4o-mini",
-    temperature=0.7,
-    api_key=os.getenv("OPENAI_API_KEY")
-)
-
-# In-memory dictionary for registered users
+from .budget import MAX_DEFERRED_MESSAGES, current_deadline, remaining, reply_reserve
+from .cache import reply_cache, make_key
+from .clients import get_models
+from .directory import CustomerDirectory
+from .extraction import TurnExtraction, aextract_turn
+from .gazetteer import ResolvedAddress, resolve_address
+from .intent import classify_intents, confirmation_reply, may_contain
+from .memory import summarize
+from .metrics import INTENT_GATE, REPLIES, TURN_DEGRADATIONS, time_node
+from .model_calls import call_model
+from .phone import parse_phone_number, needs_llm_fallback
+from .prompts import PREFIX_VERSION, build_reply_messages
+from .speculation import claim as claim_speculation
+from .state import EMPTY_CUSTOMER_DATA
+from .submission import build_complaint_record, submit_complaint_record
+from .templates import render_fallback, render_reply
+from .tracing import trace_event
+
+# Tag attached to the reply-generation model call, used to filter streamed tokens
+REPLY_TAG = "reply"
+
+# Demo registered users, used when no directory snapshot is configured
 REGISTERED_USERS = {
     "0123456789": {
         "priorityId": "****",
@@ -42,26 +51,94 @@ REGISTERED_USERS = {
 }
 
 
+# Registered-customer directory (snapshot built with `python -m src.agent.directory`)
+customer_directory = CustomerDirectory(os.getenv("CALLTAKER_DIRECTORY_DB"), seed=REGISTERED_USERS)
+
+
+def lookup_customer(mobile_number: str) -> dict:
+    """Build the state updates for a newly collected mobile number"""
+    record = customer_directory.lookup(mobile_number)
+    is_registered = record is not None
+    customer_data = record if is_registered else EMPTY_CUSTOMER_DATA
+    return {
+        "mobile_number": mobile_number,
+        "is_registered": is_registered,
+        "customer_data": customer_data,
+        "address_loaded_from_system": is_registered,  # Loaded from system, not updated by user
+    }
+
+
+def with_address(customer_data: Mapping, address: Optional[str], resolved: Optional[ResolvedAddress] = None) -> dict:
+    """
+    Copy of customer_data with a caller-provided address.
+
+    clientAddress keeps the caller's wording (apartment, floor, landmarks): the address the model
+    extracted, or else the part of the message the gazetteer matched. When the gazetteer can
+    place the address, its canonical form goes in resolvedAddress and its codes in areaId/sectorId.
+    """
+    if resolved is None and address:
+        resolved = resolve_address(address)
+    updated_customer_data = dict(customer_data)
+    updated_customer_data["clientAddress"] = address or resolved.text
+    updated_customer_data["resolvedAddress"] = resolved.canonical if resolved is not None else None
+    if resolved is not None:
+        updated_customer_data["areaId"], updated_customer_data["sectorId"] = resolved.candidates[0]
+    return updated_customer_data
+
+
 class AgentState(TypedDict):
     """State for the complaint agent"""
     messages: Annotated[list, add_messages]
     complaint: Optional[str]
     mobile_number: Optional[str]
     is_registered: Optional[bool]
-    customer_data: Optional[dict]
+    customer_data: Optional[Mapping]
     address_loaded_from_system: Optional[bool]
     address_updated_by_user: Optional[bool]
     confirmation: Optional[bool]
     submitted: bool
+    deferred_messages: tuple
+    degraded: list
+    summary: Optional[str]
+    unsummarized: tuple
+    summarized_lines: int
+
+
+async def extract_within(messages: list, awaiting_confirmation: bool, deadline: Optional[float]) -> list:
+    """
+    Extract each message concurrently, giving up on those not done by the deadline.
+
+    Returns one TurnExtraction per message, or None where the extraction missed the deadline
+    or failed (the caller defers those messages to the next turn).
+    """
+    llm, llm_mini = get_models()
+    tasks = [
+        asyncio.ensure_future(aextract_turn(llm, message, awaiting_confirmation and index == len(messages) - 1,
+                                            fallback=llm_mini))
+        for index, message in enumerate(messages)
+    ]
+    await asyncio.wait(tasks, timeout=remaining(deadline))
+    results = []
+    for task in tasks:
+        if not task.done():
+            task.cancel()
+            results.append(None)
+        elif task.cancelled() or task.exception() is not None:
+            if not task.cancelled():
+                print(f"Error extracting turn: {task.exception()}")
+            results.append(None)
+        else:
+            results.append(task.result())
+    return results
 
 
-def process_conversation(state: AgentState) -> AgentState:
+async def process_conversation(state: AgentState) -> AgentState:
     """Process conversation and extract information"""
     messages = state["messages"]
     complaint = state.get("complaint")
     mobile_number = state.get("mobile_number")
     is_registered = state.get("is_registered")
-    customer_data = state.get("customer_data", {})
+    customer_data = state.get("customer_data") or EMPTY_CUSTOMER_DATA
     confirmation = state.get("confirmation")
     
     # Get the last user message
@@ -73,314 +150,198 @@ def process_conversation(state: AgentState) -> AgentState:
     
     updates = {}
     
-    # Extract complaint from current message if not already collected
-    if not complaint and last_user_message:
-        extract_prompt = f"""Extract the customer complaint from this message. Return ONLY the complaint text, or "None" if no complaint is present.
-
-Message: {last_user_message}
-Complaint:"""
-        response = llm.invoke(extract_prompt)
-        extracted = response.content.strip()
-        if extracted.lower() != "none" and len(extracted) > 10:
-            updates["complaint"] = extracted
-    
-    # Extract mobile number from current message if not already collected
-    if not mobile_number and last_user_message:
-        # First, try to extract any sequence of digits from the message
-        digits_in_message = ''.join(filter(str.isdigit, last_user_message))
-        
-        # If we found digits and it looks like a phone number (5+ digits), use it
-        # Otherwise, ask the LLM to determine if there's a phone number
-        if digits_in_message and len(digits_in_message) >= 5:
-            # We found a reasonable number of digits, likely a phone number
-            updates["mobile_number"] = digits_in_message
-            # Check registration immediately after extraction
-            is_registered = digits_in_message in REGISTERED_USERS
-            updates["is_registered"] = is_registered
-            # Populate customer_data if registered
-            if is_registered:
-                updates["customer_data"] = REGISTERED_USERS[digits_in_message].copy()
-                updates["address_loaded_from_system"] = True  # Mark as loaded, not updated by user
-            else:
-                updates["customer_data"] = {
-                    "priorityId": None,
-                    "sectorId": None,
-                    "networkId": None,
-                    "areaId": None,
-                    "labId": None,
-                    "commercialBranchCode": None,
-                    "clientAddress": None
-                }
-                updates["address_loaded_from_system"] = False
-        else:
-            # Let LLM decide if a phone number was provided (in case it's in text format)
-            extract_prompt = f"""Analyze this message and determine if the user provided a phone/mobile number in words (e.g., "call me at...", "my number is..."). 
-If a phone number is mentioned in text, extract it and return ONLY the digits (no spaces, dashes, or words).
-If no phone number is present, return exactly "None".
-
-Message: {last_user_message}
-Phone number (digits only, or "None"):"""
-            response = llm.invoke(extract_prompt)
-            extracted = response.content.strip()
-            
-            # Check if LLM found a phone number in text
-            if extracted.lower() != "none" and extracted:
-                # Clean to get only digits
-                text_digits = ''.join(filter(str.isdigit, extracted))
-                # If we have digits, use them
-                if text_digits and len(text_digits) >= 5:
-                    updates["mobile_number"] = text_digits
-                    # Check registration immediately after extraction
-                    is_registered = text_digits in REGISTERED_USERS
-                    updates["is_registered"] = is_registered
-                    # Populate customer_data if registered
-                    if is_registered:
-                        updates["customer_data"] = REGISTERED_USERS[text_digits].copy()
-                        updates["address_loaded_from_system"] = True  # Mark as loaded, not updated by user
-                    else:
-                        updates["customer_data"] = {
-                            "priorityId": None,
-                            "sectorId": None,
-                            "networkId": None,
-                            "areaId": None,
-                            "labId": None,
-                            "commercialBranchCode": None,
-                            "clientAddress": None
-                        }
-                        updates["address_loaded_from_system"] = False
-    
-    # Immediately update state with any extractions
-    if updates:
-        state = {**state, **updates}
-        # Update local variables to reflect changes
-        complaint = state.get("complaint")
-        mobile_number = state.get("mobile_number")
-        is_registered = state.get("is_registered")
-        customer_data = state.get("customer_data", {})
-    
-    # Extract address for non-registered customers if not already collected
-    # OR for registered customers who want to provide a new address
-    should_extract_address = (
-        mobile_number and 
-        last_user_message and
-        (
-            (is_registered is False and customer_data.get("clientAddress") is None) or  # Non-registered, no address
-            (is_registered is True and confirmation is None and 
-             any(phrase in last_user_message.lower() for phrase in ["new address", "different address", "my address is", "the address is"]))  # Registered wants new address
-        )
+    has_address = customer_data.get("clientAddress") is not None
+    # Also after the caller declined the read-back: their next message corrects it or confirms after all
+    awaiting_confirmation = bool(
+        complaint and mobile_number and (is_registered or has_address) and confirmation is not True
     )
     
-    if should_extract_address:
-        # Ask LLM to extract address from the message
-        extract_prompt = f"""Analyze this message and determine if the user provided an address or location.
-If an address/location is mentioned, extract it and return it.
-If no address is present, return exactly "None".
-
-Message: {last_user_message}
-Address:"""
-        response = llm.invoke(extract_prompt)
-        extracted_address = response.content.strip()
-        
-        if extracted_address.lower() != "none" and len(extracted_address) > 5:
-            # Update customer_data with the provided address
-            updated_customer_data = customer_data.copy()
-            updated_customer_data["clientAddress"] = extracted_address
-            updates["customer_data"] = updated_customer_data
-            updates["address_updated_by_user"] = True  # Mark that user provided the address
-    
-    # Apply address updates if any
-    if updates:
-        state = {**state, **updates}
-        # Refresh local variables after applying updates
-        complaint = state.get("complaint")
-        mobile_number = state.get("mobile_number")
-        is_registered = state.get("is_registered")
-        customer_data = state.get("customer_data", {})
-    
-    # Check for confirmation if both complaint and mobile are collected AND address is collected (if needed)
-    current_complaint = complaint  # Use updated complaint from state
-    current_mobile = mobile_number  # Use updated mobile from state
-    current_is_registered = state.get("is_registered")
-    current_customer_data = state.get("customer_data", {})
-    current_has_address = current_customer_data.get("clientAddress") is not None
-    
-    # Check if we're ready for confirmation (address collected if needed)
-    ready_for_confirmation = (
-        current_complaint and 
-        current_mobile and 
-        (current_is_registered or current_has_address)  # Registered OR has address
+    # Last turn asked a caller who isn't on file for the address
+    answering_address_prompt = bool(
+        complaint and mobile_number and is_registered is False and not has_address
     )
     
-    if ready_for_confirmation and confirmation is None and last_user_message:
-        msg_lower = last_user_message.lower()
-        
-        # Check if user is providing/changing address (with "no" or "change")
-        wants_new_address = any(phrase in msg_lower for phrase in ["new address", "different address", "another address", "change address", "change the address", "change it to"])
-        
-        # If user says "no" or "change" but also provides an address, extract it
-        if (wants_new_address or "no" in msg_lower or "change" in msg_lower) and len(last_user_message) > 10:
-            # Try to extract address from the message
-            extract_prompt = f"""Analyze this message and determine if the user provided a new address or location.
-If an address/location is mentioned, extract it and return it.
-If no address is present, return exactly "None".
-
-Message: {last_user_message}
-Address:"""
-            response = llm.invoke(extract_prompt)
-            extracted_address = response.content.strip()
-            
-            if extracted_address.lower() != "none" and len(extracted_address) > 5:
-                # User provided a new address - update it
-                updated_customer_data = current_customer_data.copy()
-                updated_customer_data["clientAddress"] = extracted_address
-                updates["customer_data"] = updated_customer_data
-                updates["address_updated_by_user"] = True  # Mark that user updated the address
-                # Don't set confirmation yet - will show new confirmation with updated address
-            elif any(phrase in msg_lower for phrase in ["new address", "different address", "another address"]):
-                # User wants new address but hasn't provided it yet - don't confirm yet
-                pass
-            else:
-                # User said no without providing address - decline
-                updates["confirmation"] = False
-        elif any(word in msg_lower for word in ["yes", "confirm", "correct", "right", "submit", "this address"]):
+    # Phone number is parsed locally; the model only reads it when the parser can't
+    local_phone = None
+    phone_needs_model = False
+    if not mobile_number and last_user_message:
+        local_phone = parse_phone_number(last_user_message)
+        phone_needs_model = local_phone is None and needs_llm_fallback(last_user_message)
+        if local_phone is not None:
+            updates.update(lookup_customer(local_phone.national))
+            mobile_number = updates["mobile_number"]
+            is_registered = updates["is_registered"]
+            customer_data = updates["customer_data"]
+    
+    needs_address = is_registered is False and customer_data.get("clientAddress") is None
+    
+    # Addresses are resolved against the local gazetteer first; the model is only
+    # needed for addresses the gazetteer can't place. Unprompted, a place name only
+    # counts as the address when the message words it as one ("I am in Maadi")
+    local_address = None
+    if needs_address and last_user_message:
+        local_address = resolve_address(last_user_message, cued_only=not answering_address_prompt)
+        needs_address = local_address is None
+    
+    deadline = current_deadline()
+    # Keep the reply's share of the budget free
+    extraction_deadline = deadline - reply_reserve() if deadline is not None else None
+    degraded = []
+    
+    # Messages that aged out of the memory window are folded into the running summary
+    # while the extraction runs
+    summary = state.get("summary")
+    unsummarized = list(state.get("unsummarized") or ())
+    summary_task = None
+    llm, llm_mini = get_models()
+    if unsummarized:
+        summary_task = asyncio.ensure_future(summarize(llm_mini, llm, summary, unsummarized, extraction_deadline))
+    
+    # Single structured extraction call covering complaint, phone, address and intent,
+    # skipped when the turn has nothing left for the model to extract. Messages whose
+    # extraction missed an earlier turn's budget are extracted again alongside it, but only
+    # while something they could provide is still missing.
+    missing_details = not complaint or not mobile_number or needs_address
+    pending = list(state.get("deferred_messages") or ()) if missing_details else []
+    
+    # The local intent classifier decides whether the message holds anything the model still has
+    # to extract, and settles clear replies to a pending confirmation itself
+    intents = classify_intents(last_user_message) if last_user_message else None
+    local_intent = confirmation_reply(intents) if awaiting_confirmation else None
+    current_needs_model = bool(last_user_message) and (
+        (not complaint and may_contain(intents, "provides_complaint"))
+        or (phone_needs_model and may_contain(intents, "provides_phone"))
+        or (needs_address and may_contain(intents, "provides_address"))
+        or (awaiting_confirmation and local_intent is None)
+    )
+    if intents is not None:
+        INTENT_GATE.inc("model" if current_needs_model else "local_intent" if local_intent else "skipped")
+        trace_event("intent", labels=intents.labels(), decided=intents.decided(), local_intent=local_intent,
+                    model=current_needs_model)
+    if current_needs_model:
+        pending = [*pending, last_user_message]
+    extraction = TurnExtraction()
+    deferred = []
+    if pending:
+        results = await extract_within(pending, awaiting_confirmation and current_needs_model, extraction_deadline)
+        deferred = [message for message, result in zip(pending, results) if result is None]
+        if current_needs_model:
+            extraction = results.pop() or TurnExtraction()
+        # Fill in what this message didn't provide from earlier deferred messages (newest first);
+        # their confirmation intent is stale, so only their fields are used
+        for result in reversed(results):
+            if result is not None:
+                extraction = extraction.model_copy(update={
+                    name: getattr(extraction, name) or getattr(result, name)
+                    for name in ("complaint", "phone_number", "address")
+                })
+                phone_needs_model = phone_needs_model or not mobile_number
+    if local_intent is not None:
+        extraction = extraction.model_copy(update={"intent": local_intent})
+    if deferred:
+        degraded.append("extraction_deferred")
+    updates["deferred_messages"] = tuple(deferred[-MAX_DEFERRED_MESSAGES:])
+    
+    if summary_task is not None:
+        try:
+            summary = updates["summary"] = await summary_task
+            updates["summarized_lines"] = len(unsummarized)
+        except Exception as e:
+            # Keep the lines queued; the next turn tries again
+            print(f"Error summarizing conversation: {e}")
+            degraded.append("summary_deferred")
+    
+    # Complaint, if not already collected
+    if not complaint and extraction.complaint and len(extraction.complaint.strip()) > 10:
+        updates["complaint"] = extraction.complaint.strip()
+        complaint = updates["complaint"]
+        # Another complaint after one was filed: it has to be confirmed and queued in turn
+        updates["submitted"] = False
+    
+    # Mobile number the model read from the message when the local parser couldn't
+    if phone_needs_model and extraction.phone_number:
+        model_phone = parse_phone_number(extraction.phone_number)
+        if model_phone is not None:
+            updates.update(lookup_customer(model_phone.national))
+            mobile_number = updates["mobile_number"]
+            is_registered = updates["is_registered"]
+            customer_data = updates["customer_data"]
+    
+    extracted_address = (extraction.address or "").strip()
+    if len(extracted_address) <= 5:
+        extracted_address = None
+    
+    if mobile_number and is_registered is False and customer_data.get("clientAddress") is None:
+        # Non-registered customer providing the address where the issue is happening
+        if local_address is not None or extracted_address:
+            updates["customer_data"] = with_address(customer_data, extracted_address, local_address)
+            updates["address_updated_by_user"] = True  # Mark that user provided the address
+    elif awaiting_confirmation:
+        if extracted_address and extraction.intent != "confirm":
+            # User provided a new address - update it, new confirmation will follow
+            updates["customer_data"] = with_address(customer_data, extracted_address)
+            updates["address_updated_by_user"] = True  # Mark that user updated the address
+            updates["confirmation"] = None  # The new address is read back for its own confirmation
+        elif extraction.intent == "change_address":
+            # User wants new address but hasn't provided it yet - don't confirm yet
+            pass
+        elif extraction.intent == "decline":
+            updates["confirmation"] = False
+        elif extraction.intent == "confirm":
             updates["confirmation"] = True
     
     # Check if address was just updated BY USER in this iteration
     address_just_updated_by_user = updates.get("address_updated_by_user", False)
     
-    # Apply all updates to state (including confirmation if set)
-    if updates:
-        state = {**state, **updates}
-    
-    # Get current values for response generation (AFTER applying updates)
-    current_state = state
-    current_complaint = current_state.get("complaint")
-    current_mobile = current_state.get("mobile_number")
-    current_confirmation = current_state.get("confirmation")
-    current_is_registered = current_state.get("is_registered")
-    current_customer_data = current_state.get("customer_data", {})
+    # Get current values for response generation (with this turn's updates applied)
+    current_complaint = complaint
+    current_mobile = mobile_number
+    current_confirmation = updates.get("confirmation", confirmation)
+    current_is_registered = is_registered
+    current_customer_data = updates.get("customer_data", customer_data)
+    current_submitted = updates.get("submitted", state.get("submitted", False))
     current_has_address = current_customer_data.get("clientAddress") is not None
     
-    # Determine which model to use and build prompt
+    # Determine the dialogue state and which model to use
     # Use mini for simple follow-ups, gpt-4o for complex tasks
     use_mini = False
     
-    # Build conversation history for context
-    conversation_history = []
-    for msg in messages[-5:]:  # Last 5 messages for context
-        if isinstance(msg, HumanMessage):
-            conversation_history.append(f"User: {msg.content}")
-        elif isinstance(msg, AIMessage):
-            conversation_history.append(f"{msg.content}")
-    
-    system_prompt = """You are Alora, a customer service AI assistant. Your role is to help customers report technical issues and complaints.
-
-Communication Style:
-- Be warm, empathetic, and professional
-- Show genuine concern for their issues
-- Be proactive and reassuring ("Let's get this sorted right away")
-- Explain what you're doing and what happens next
-- Use natural, conversational language
-- Keep responses concise but complete
-
-Always:
-- Express empathy for their situation
-- Be transparent about the process
-- Confirm details clearly before submission
-- Explain next steps after submission"""
-    
     if not current_complaint:
-        instruction = """Greet the customer warmly. Introduce yourself as Alora, their customer service AI assistant. 
-Explain that you're here to help them report any technical issues or complaints they're facing.
-Then ask them to describe the issue they're experiencing.
-
-Example tone: "Hi, good morning! I'm Alora, your customer service AI assistant. I'm here to help you report any technical issues you're facing today."
-
-Be warm, professional, and welcoming."""
         use_mini = False  # Use gpt-4o for initial greeting/asking for complaint
+        dialogue_state = "greeting"
     elif not current_mobile:
-        instruction = f"""Complaint received: {current_complaint}
-
-Respond with empathy and reassurance:
-1. Express empathy for their issue (e.g., "Oh no, I'm really sorry you're dealing with that" or "That must be frustrating")
-2. Be proactive: "Let's get this sorted right away"
-3. Explain the process: "I'll raise a report to our technical team. I just need a couple of details first."
-4. Ask for their phone number politely: "Can we start with your phone number, please?"
-
-Be warm, empathetic, and reassuring. Keep it concise."""
         use_mini = False  # Use gpt-4o for empathetic response
+        dialogue_state = "ask_phone"
     elif current_mobile and current_is_registered is False and not current_has_address:
         # Non-registered customer needs to provide address
-        instruction = f"""Complaint: {current_complaint}
-Mobile Number: {current_mobile}
-Customer is NOT registered.
-
-Response:
-1. Acknowledge the phone number: "Thank you"
-2. Ask for the address: "Can you please provide the address where the issue is happening?" or "Could you share the location where you're experiencing this issue?"
-
-Be polite and clear."""
         use_mini = True
+        dialogue_state = "ask_address"
     elif address_just_updated_by_user and current_confirmation is None:
         # Address was just updated BY USER - acknowledge it and ask for confirmation
-        new_address = current_customer_data.get("clientAddress", "")
-        instruction = f"""Complaint: {current_complaint}
-Mobile Number: {current_mobile}
-NEW Address just provided by customer: {new_address}
-
-Provide clear confirmation:
-"Just to confirm—you're reporting [brief issue] at this address: {new_address}. Anything else you'd like to add before I submit the report?"
-
-Show the full address clearly. Be professional and warm."""
         use_mini = False  # Use gpt-4o for personalized response
+        dialogue_state = "confirm_new_address"
     elif current_confirmation is None and current_complaint and current_mobile and current_has_address:
         # Ready for confirmation
         if current_is_registered:
             # Registered customer - mention the address found
-            address = current_customer_data.get("clientAddress", "")
-            instruction = f"""Complaint: {current_complaint}
-Mobile Number: {current_mobile}
-Customer is REGISTERED.
-Address found in system: {address}
-
-Response structure:
-1. Acknowledge receipt: "Thank you."
-2. Show you're checking: "Let me check..." or "I see..."
-3. Present the address: "yes, I see an address linked to this number. It shows as: {address}"
-4. Ask for confirmation: "Should I file the complaint for this location?" or "Would you like me to submit this complaint with this address or would you prefer to use a different one?"
-
-Keep it natural and professional. Show the FULL address clearly."""
             use_mini = False  # Use gpt-4o for more nuanced message
+            dialogue_state = "confirm_registered_address"
         else:
             # Non-registered customer - normal confirmation
-            address = current_customer_data.get("clientAddress", "")
-            instruction = f"""Complaint: {current_complaint}
-Mobile Number: {current_mobile}
-Address provided: {address}
-
-Provide a clear confirmation:
-"Just to confirm—you're reporting [brief issue description] at this address: {address}. Anything else you'd like to add before I submit the report?"
-
-Be clear, professional, and show the full address."""
             use_mini = False
-    elif current_mobile and current_complaint and current_confirmation is None and not current_has_address and last_user_message and any(phrase in last_user_message.lower() for phrase in ["new address", "different address", "another address"]):
+            dialogue_state = "confirm_address"
+    elif current_mobile and current_complaint and current_confirmation is None and not current_has_address and extraction.intent == "change_address":
         # User asked for new address but hasn't provided it yet - prompt them to provide it
-        instruction = "The customer wants to provide a different address. Acknowledge and ask them politely: 'Of course, could you please provide the address where the issue is happening?' Be warm and professional."
         use_mini = True
+        dialogue_state = "ask_new_address"
     elif current_confirmation is False:
-        instruction = "The customer declined. Be understanding and helpful: 'No problem! What would you like to change or update?' Be warm and accommodating."
         use_mini = True  # Simple follow-up
-    elif current_confirmation is True and not current_state.get("submitted", False):
-        instruction = """The customer confirmed the submission.
-
-Response structure:
-1. Thank them: "Great, thank you" or "Perfect, thank you"
-2. Confirm submission: "Your issue has been reported successfully"
-3. Explain next steps: "Our technical team will review it and should contact you soon for a visit" or "Our team will look into this and contact you shortly"
-4. Offer continued help: "If you need anything else in the meantime, I'm here to help"
-
-Be warm, reassuring, and clear about what happens next. Example from Alora: "Great, thank you. Your issue has been reported successfully. Our technical team will review it and should contact you soon for a visit. If you need anything else in the meantime, I'm here to help." """
+        dialogue_state = "declined"
+    elif current_confirmation is True and not current_submitted:
         use_mini = False  # Use gpt-4o for complete closure message
+        dialogue_state = "submitted"
+        # Durably queue the complaint before telling the caller it was reported
+        await enqueue_complaint(current_complaint, current_mobile, current_is_registered, current_customer_data)
         # Mark as submitted and reset for next complaint
         updates["submitted"] = True
         updates["complaint"] = None  # Reset complaint for next one
@@ -390,56 +351,101 @@ Be warm, reassuring, and clear about what happens next. Example from Alora: "Gre
         # Keep mobile_number as it's the same customer
         updates["address_loaded_from_system"] = None  # Reset flags for next complaint
         updates["address_updated_by_user"] = None  # Reset flags for next complaint
-    elif current_state.get("submitted", False) and not current_complaint:
+    elif current_submitted and not current_complaint:
         # Post-submission: offer to help with new complaint or end conversation
-        instruction = "The previous complaint was submitted. Ask warmly if they have another issue they'd like to report: 'Is there anything else I can help you with today?' or 'Do you have another issue you'd like to report?' Be helpful and available."
         use_mini = True
+        dialogue_state = "anything_else"
     else:
-        instruction = "Continue the conversation naturally based on the context."
         use_mini = True
-    
-    # Apply any additional updates before generating response
-    if updates:
-        state = {**state, **updates}
-    
-    prompt = f"""{system_prompt}
-
-{instruction}
-
-Recent conversation:
-{chr(10).join(conversation_history) if conversation_history else 'None'}
-
-Generate a natural, friendly response:"""
+        dialogue_state = "continue"
     
     # Use appropriate model
     model_to_use = llm_mini if use_mini else llm
     
-    try:
-        response = model_to_use.invoke(prompt)
-        response_text = response.content.strip()
-        if not response_text:
-            # If empty, try again with the other model
-            response = llm.invoke(prompt)
-            response_text = response.content.strip()
-    except Exception as e:
-        # Try with the other model if first fails
+    # Deterministic states are rendered from templates without a model call
+    response_text = render_reply(
+        dialogue_state,
+        turn=len(messages),
+        address=current_customer_data.get("clientAddress"),
+        complaint=current_complaint
+    )
+    reply_source = "template"
+    
+    # Reply generated during the caller's think time, when this turn went where it was predicted
+    # (claimed every turn, so a stale speculation never outlives the turn after it)
+    speculated = await claim_speculation(
+        dialogue_state, (current_complaint, current_mobile, current_customer_data.get("clientAddress")), deadline
+    )
+    if response_text is None and speculated is not None:
+        response_text, model_to_use = speculated
+        reply_source = "speculative"
+    
+    # Shared prefix first, then only what varies this turn (built only when a model may be needed)
+    prompt = None
+    if response_text is None:
+        prompt = build_reply_messages(
+            dialogue_state,
+            complaint=current_complaint,
+            mobile=current_mobile,
+            address=current_customer_data.get("clientAddress"),
+            summary=summary,
+            messages=messages
+        )
+    
+    # Reply cache is off by default (replies are creative); see CALLTAKER_CACHE_REPLIES
+    reply_key = None
+    if response_text is None and reply_cache.enabled:
+        reply_key = make_key(getattr(model_to_use, "model_name", ""), f"reply:{dialogue_state}:{PREFIX_VERSION}", prompt[-1].content)
+        response_text = reply_cache.get(reply_key)
+        reply_source = "cache"
+    
+    if response_text is None:
+        reply_source = "model"
+        
+        async def generate(chat_model, config):
+            response = await chat_model.ainvoke(prompt, config=config)
+            text = response.content.strip()
+            if not text:
+                # An empty reply is retried on the other model like an error
+                raise ValueError(f"Empty reply from {getattr(chat_model, 'model_name', chat_model)}")
+            return text
+        
+        # Per-call deadline, hedging to the other model when slow, circuit breakers (see model_calls)
         try:
-            model_to_use = llm if use_mini else llm_mini
-            response = model_to_use.invoke(prompt)
-            response_text = response.content.strip()
-        except Exception as e2:
-            # Last resort: use gpt-4o
-            response = llm.invoke(prompt)
-            response_text = response.content.strip()
-        print(f"Error generating response: {e}")
-    
-    # Add assistant response to messages
-    new_messages = state.get("messages", []) + [AIMessage(content=response_text)]
-    
-    # Return updated state with all changes (including the submitted flag and reset fields)
+            response_text, model_to_use = await call_model(
+                REPLY_TAG, model_to_use, llm if use_mini else llm_mini, generate,
+                tags=[REPLY_TAG], deadline=deadline
+            )
+        except Exception as e:
+            # Out of time (or every model failed): answer with the state's pre-rendered utterance
+            print(f"Error generating response: {e}")
+            response_text = render_fallback(
+                dialogue_state,
+                turn=len(messages),
+                address=current_customer_data.get("clientAddress"),
+                complaint=current_complaint
+            )
+            reply_source = "fallback"
+            degraded.append("reply_fallback")
+        
+        if reply_key is not None and reply_source == "model":
+            reply_cache.set(reply_key, response_text)
+    
+    # Which source and model (the use_mini routing, after any fallback) produced the reply
+    reply_model = getattr(model_to_use, "model_name", "") if reply_source in ("model", "cache", "speculative") else ""
+    REPLIES.inc(reply_source, reply_model)
+    trace_event("reply", dialogue_state=dialogue_state, source=reply_source, model=reply_model)
+    
+    for reason in degraded:
+        TURN_DEGRADATIONS.inc(reason)
+    if degraded:
+        trace_event("degraded", reasons=degraded, deferred_messages=len(updates["deferred_messages"]))
+    
+    # Return only what changed this turn; the graph appends the reply to the message history
     return {
-        **state,
-        "messages": new_messages
+        **updates,
+        "degraded": degraded,
+        "messages": [AIMessage(content=response_text)]
     }
 
 
@@ -465,20 +471,36 @@ def should_continue(state: AgentState) -> Literal["collect_info", "get_confirmat
     return "end"
 
 
-def submit_complaint(state: AgentState) -> AgentState:
-    """Submit the complaint (placeholder for now)"""
-    complaint = state.get("complaint")
-    mobile_number = state.get("mobile_number")
-    
-    # TODO: Implement actual submission logic
-    print(f"Complaint submitted:")
-    print(f"Mobile: {mobile_number}")
-    print(f"Full Complaint: {complaint}")
+def _turn_ids() -> tuple:
+    """(session_id, turn_id) of the turn the calling graph node belongs to (see utils._turn_config)"""
+    try:
+        configurable = get_config().get("configurable", {})
+    except RuntimeError:
+        # Called outside a runnable context
+        return None, None
+    return configurable.get("session_id"), configurable.get("turn_id")
+
+
+async def enqueue_complaint(complaint: Optional[str], mobile_number: Optional[str], is_registered: Optional[bool],
+                            customer_data: Mapping) -> bool:
+    """Write the complaint to the submission outbox; returns False if this turn already queued it"""
+    session_id, turn_id = _turn_ids()
+    record = build_complaint_record(complaint, mobile_number, is_registered, customer_data or EMPTY_CUSTOMER_DATA,
+                                    session_id=session_id, turn_id=turn_id)
+    # The outbox commit waits on fsync, so keep it off the event loop
+    return await asyncio.to_thread(submit_complaint_record, record)
+
+
+async def submit_complaint(state: AgentState) -> AgentState:
+    """Queue the complaint for submission (idempotent per turn, so a complaint already queued is not filed twice)"""
+    await enqueue_complaint(
+        state.get("complaint"),
+        state.get("mobile_number"),
+        state.get("is_registered"),
+        state.get("customer_data")
+    )
     
-    return {
-        **state,
-        "submitted": True
-    }
+    return {"submitted": True}
 
 
 # Build the graph
@@ -487,8 +509,8 @@ def create_complaint_agent():
     workflow = StateGraph(AgentState)
     
     # Add nodes
-    workflow.add_node("process", process_conversation)
-    workflow.add_node("submit", submit_complaint)
+    workflow.add_node("process", time_node("process", process_conversation))
+    workflow.add_node("submit", time_node("submit", submit_complaint))
     
     # Set entry point
     workflow.set_entry_point("process")
@@ -510,6 +532,21 @@ def create_complaint_agent():
     return workflow.compile()
 
 
-# Create the agent instance
-agent = create_complaint_agent()
+_agent = None
+_agent_lock = threading.Lock()
+
+
+def get_agent():
+    """Shared compiled agent graph, built on first use"""
+    global _agent
+    with _agent_lock:
+        if _agent is None:
+            _agent = create_complaint_agent()
+        return _agent
+
 
+def __getattr__(name: str):
+    # `agent` is still importable, compiled on first access rather than at import
+    if name == "agent":
+        return get_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
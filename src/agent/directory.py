@@ -0,0 +1,172 @@
+"""
+Registered-customer directory
+Customers are looked up by normalized phone number in a read-only sqlite snapshot. New exports are
+imported into a fresh snapshot file and swapped in atomically; running workers pick it up on their
+next lookup without restarting.
+
+Import an export (CSV with a header row, or JSON Lines):
+    python -m src.agent.directory customers.csv customers.db
+"""
+
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Dict, Iterable, Iterator, Mapping, Optional, Tuple
+
+from .phone import parse_phone_number
+from .state import CUSTOMER_FIELDS
+
+# Column names accepted for the phone number in imported exports
+PHONE_COLUMNS = ("phone", "mobile_number", "mobileNumber", "phoneNumber")
+
+_SELECT = f"SELECT {', '.join(CUSTOMER_FIELDS)} FROM customers WHERE phone = ?"
+
+
+def normalize_phone(raw: str) -> Optional[str]:
+    """Directory key for a phone number (national format), or None if it isn't one"""
+    phone = parse_phone_number(str(raw))
+    return phone.national if phone is not None else None
+
+
+def _read_records(source_path: str) -> Iterator[dict]:
+    """Yield raw records from a CSV or JSONL export"""
+    with open(source_path, newline="", encoding="utf-8") as f:
+        if source_path.endswith((".jsonl", ".ndjson", ".json")):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+
+def _rows(records: Iterable[dict], stats: dict) -> Iterator[Tuple]:
+    for record in records:
+        raw_phone = next((record[column] for column in PHONE_COLUMNS if record.get(column)), None)
+        phone = normalize_phone(raw_phone) if raw_phone else None
+        if phone is None:
+            stats["skipped"] += 1
+            continue
+        stats["imported"] += 1
+        yield (phone, *(record.get(name) or None for name in CUSTOMER_FIELDS))
+
+
+def build_snapshot(records: Iterable[dict], db_path: str) -> dict:
+    """
+    Write records into a new snapshot and atomically replace db_path with it.
+
+    Returns import counts ({"imported": n, "skipped": n}); duplicate phones keep the last record.
+    """
+    directory = os.path.dirname(os.path.abspath(db_path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".directory-", suffix=".db", dir=directory)
+    os.close(fd)
+    stats = {"imported": 0, "skipped": 0}
+    try:
+        db = sqlite3.connect(tmp_path)
+        db.execute("PRAGMA journal_mode=OFF")
+        db.execute("PRAGMA synchronous=OFF")
+        columns = ", ".join(f"{name} TEXT" for name in CUSTOMER_FIELDS)
+        db.execute(f"CREATE TABLE customers (phone TEXT PRIMARY KEY, {columns}) WITHOUT ROWID")
+        placeholders = ", ".join("?" * (len(CUSTOMER_FIELDS) + 1))
+        with db:
+            db.executemany(f"INSERT OR REPLACE INTO customers VALUES ({placeholders})", _rows(records, stats))
+        db.close()
+        os.replace(tmp_path, db_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return stats
+
+
+def import_customers(source_path: str, db_path: str) -> dict:
+    """Bulk import a CSV/JSONL export into a directory snapshot"""
+    return build_snapshot(_read_records(source_path), db_path)
+
+
+class CustomerDirectory:
+    """Phone-keyed customer lookups against the current snapshot"""
+
+    def __init__(self, db_path: Optional[str] = None, seed: Optional[Mapping[str, Mapping]] = None,
+                 reload_interval: float = 5.0):
+        """
+        Args:
+            db_path: Snapshot file built by import_customers; None to use only the seed records
+            seed: In-memory records keyed by phone, used when there is no snapshot
+            reload_interval: Seconds between checks for a replaced snapshot file
+        """
+        self.db_path = db_path
+        self.reload_interval = reload_interval
+        self._seed: Dict[str, dict] = {}
+        for phone, record in (seed or {}).items():
+            key = normalize_phone(phone)
+            if key is not None:
+                self._seed[key] = dict(record)
+        self._local = threading.local()
+        self._snapshot_id = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _current_snapshot(self):
+        """Identity of the snapshot file, refreshed at most every reload_interval seconds"""
+        now = time.monotonic()
+        if now - self._checked_at >= self.reload_interval:
+            with self._lock:
+                try:
+                    st = os.stat(self.db_path)
+                    self._snapshot_id = (st.st_ino, st.st_mtime_ns, st.st_size)
+                except FileNotFoundError:
+                    self._snapshot_id = None
+                self._checked_at = now
+        return self._snapshot_id
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """Per-thread read-only connection to the current snapshot"""
+        if self.db_path is None:
+            return None
+        snapshot_id = self._current_snapshot()
+        if snapshot_id is None:
+            return None
+        cached = getattr(self._local, "connection", None)
+        if cached is not None and cached[0] == snapshot_id:
+            return cached[1]
+        if cached is not None:
+            cached[1].close()
+        db = sqlite3.connect(f"file:{self.db_path}?mode=ro&immutable=1", uri=True, check_same_thread=False)
+        db.execute("PRAGMA mmap_size=268435456")
+        self._local.connection = (snapshot_id, db)
+        return db
+
+    def reload(self) -> None:
+        """Check for a new snapshot on the next lookup instead of waiting for reload_interval"""
+        self._checked_at = 0.0
+
+    def lookup(self, phone: str) -> Optional[dict]:
+        """Customer record for a phone number, or None if the caller isn't registered"""
+        key = normalize_phone(phone)
+        if key is None:
+            return None
+        db = self._connection()
+        if db is not None:
+            row = db.execute(_SELECT, (key,)).fetchone()
+            return dict(zip(CUSTOMER_FIELDS, row)) if row is not None else None
+        record = self._seed.get(key)
+        return dict(record) if record is not None else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import a customer export into a directory snapshot")
+    parser.add_argument("source", help="CSV (with header) or JSONL export")
+    parser.add_argument("db_path", help="Snapshot file to create or replace")
+    args = parser.parse_args()
+    started = time.perf_counter()
+    stats = import_customers(args.source, args.db_path)
+    print(f"Imported {stats['imported']} customers ({stats['skipped']} skipped) "
+          f"into {args.db_path} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
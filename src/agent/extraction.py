@@ -0,0 +1,74 @@
+"""
+Structured information extraction for the complaint agent
+A single typed model call per turn replaces the separate free-text extraction prompts.
+"""
+
+from typing import Literal, Optional
+from pydantic import BaseModel, Field
+from .cache import extraction_cache, make_key
+from .metrics import EXTRACT_TAG
+from .model_calls import call_model
+from .tracing import trace_event
+
+
+class TurnExtraction(BaseModel):
+    """Everything the agent needs to pull out of one user message"""
+    complaint: Optional[str] = Field(
+        default=None,
+        description="The customer's complaint or technical issue, or null if none is described"
+    )
+    phone_number: Optional[str] = Field(
+        default=None,
+        description="Phone/mobile number given by the customer (digits only, also when spelled out in words), or null"
+    )
+    address: Optional[str] = Field(
+        default=None,
+        description="Address or location where the issue is happening, or null if none is mentioned"
+    )
+    intent: Literal["confirm", "decline", "change_address", "none"] = Field(
+        default="none",
+        description=(
+            "Reply to a pending confirmation: 'confirm' if the customer agrees/approves, "
+            "'decline' if they refuse, 'change_address' if they want a different address, otherwise 'none'"
+        )
+    )
+
+
+def build_extraction_prompt(message: str, awaiting_confirmation: bool = False) -> str:
+    """Build the extraction prompt for a single user message"""
+    context = (
+        "The assistant has just asked the customer to confirm the complaint details and address."
+        if awaiting_confirmation
+        else "The assistant is collecting the complaint, phone number and address."
+    )
+    return f"""Extract the complaint details from this customer service message.
+{context}
+Only fill a field when the information is actually present in the message; leave it null otherwise.
+
+Message: {message}"""
+
+
+def _cache_key(model, prompt: str) -> str:
+    model_name = getattr(model, "model_name", None) or type(model).__name__
+    return make_key(model_name, "extract_turn", prompt)
+
+
+async def aextract_turn(model, message: str, awaiting_confirmation: bool = False, fallback=None) -> TurnExtraction:
+    """Run the structured extraction call; hedges/falls back to the fallback model (see model_calls)"""
+    prompt = build_extraction_prompt(message, awaiting_confirmation)
+    key = _cache_key(model, prompt)
+    cached = extraction_cache.get(key)
+    if cached is not None:
+        trace_event("extraction", message=message, result=cached, cached=True)
+        return TurnExtraction.model_validate_json(cached)
+    
+    async def invoke(chat_model, config):
+        return await chat_model.with_structured_output(TurnExtraction).ainvoke(prompt, config=config)
+    
+    # Cached under the primary model's key whichever model answered
+    result, _ = await call_model(EXTRACT_TAG, model, fallback, invoke, tags=[EXTRACT_TAG])
+    result = result if result is not None else TurnExtraction()
+    result_json = result.model_dump_json()
+    extraction_cache.set(key, result_json)
+    trace_event("extraction", message=message, result=result_json, cached=False)
+    return result
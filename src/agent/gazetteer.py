@@ -0,0 +1,296 @@
+"""
+Offline gazetteer for resolving caller addresses
+Streets, districts and governorates are indexed by character trigrams so free-text addresses
+(including transliteration variants like "El"/"Al" and Arabic names) resolve locally, without a
+model round trip, to a canonical address plus areaId/sectorId candidates.
+
+The bundled data/gazetteer_cairo.json covers central Cairo and Giza with placeholder area and
+sector codes; point CALLTAKER_GAZETTEER at a full export in the same format for production.
+"""
+
+import json
+import os
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+DEFAULT_GAZETTEER_PATH = os.path.join(os.path.dirname(__file__), "data", "gazetteer_cairo.json")
+
+# Minimum trigram (Dice) similarity for a phrase to count as a match
+MATCH_THRESHOLD = 0.8
+
+# Longest phrase (in words) compared against gazetteer names
+MAX_PHRASE_WORDS = 6
+
+_ARABIC_LETTERS = str.maketrans("أإآىة", "ااايه")
+_TOKEN_ALIASES = {"el": "al", "st": "street", "str": "street", "rd": "road", "sq": "square"}
+_NUMBER_RE = re.compile(r"^\d{1,4}[a-z]?$")
+_SEGMENT_BREAK_RE = re.compile(r"[,;.!?\n،؛؟]")
+_PHONE_RE = re.compile(r"\d{7,}")
+
+# Words (normalized) that mark the text around a place name as an address rather than a
+# passing mention: street types, then building details and landmarks, then address talk
+_STREET_WORDS = {"street", "road", "avenue", "square", "lane", "شارع", "طريق", "ميدان"}
+_DETAIL_WORDS = {
+    "apartment", "apt", "flat", "floor", "building", "bldg", "block", "tower", "villa", "entrance",
+    "near", "behind", "beside", "next", "opposite",
+    "شقه", "دور", "الدور", "عماره", "العماره", "برج", "مدخل", "جنب", "بجوار", "امام", "قدام", "ورا", "خلف",
+}
+_ADDRESS_WORDS = _STREET_WORDS | _DETAIL_WORDS | {
+    "address", "district", "area", "neighborhood", "neighbourhood", "live", "located",
+    "عنوان", "عنواني", "العنوان", "ساكن", "ساكنه", "منطقه", "حي",
+}
+# Prepositions that place the caller at the name that follows ("I am in Maadi")
+_PLACE_PREPOSITIONS = {"in", "at", "on", "from", "في", "ف", "عند", "من"}
+
+
+class GazetteerEntry(NamedTuple):
+    kind: str  # "governorate", "district" or "street"
+    name: str
+    district: Optional[str]
+    governorate: str
+    area_id: Optional[str]
+    sector_id: Optional[str]
+
+
+class ResolvedAddress(NamedTuple):
+    """An address resolved against the gazetteer"""
+    canonical: str
+    street: Optional[str]
+    district: str
+    governorate: str
+    candidates: List[Tuple[str, str]]  # (areaId, sectorId) pairs, best first
+    score: float
+    text: str  # The part of the message giving the address, in the caller's words (apartment, landmarks, ...)
+
+
+def _tokenize(text: str) -> List[Tuple[str, int, int]]:
+    """Normalized tokens with their (start, end) offsets in text"""
+    tokens = []
+    current, start = "", 0
+    for index, char in enumerate(text.translate(_ARABIC_LETTERS)):
+        folded = unicodedata.normalize("NFKD", char.lower())
+        folded = "".join(c for c in folded if not unicodedata.combining(c))
+        if not folded:
+            continue  # A diacritic: part of the word it marks
+        if re.fullmatch(r"\w+", folded):
+            if not current:
+                start = index
+            current += folded
+            continue
+        if current:
+            tokens.append((_TOKEN_ALIASES.get(current, current), start, index))
+            current = ""
+    if current:
+        tokens.append((_TOKEN_ALIASES.get(current, current), start, len(text)))
+    return tokens
+
+
+def normalize_tokens(text: str) -> List[str]:
+    """Lowercase, strip accents and punctuation, and unify common spelling variants"""
+    return [token for token, _, _ in _tokenize(text)]
+
+
+def _trigrams(phrase: str) -> frozenset:
+    padded = f" {phrase} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class Gazetteer:
+    """Trigram index over governorate, district and street names"""
+
+    def __init__(self, data: dict):
+        self.entries: List[GazetteerEntry] = []
+        self._names: List[Tuple[int, frozenset]] = []  # (entry index, trigrams) per name/alias
+        self._index: Dict[str, List[int]] = defaultdict(list)  # trigram -> name indices
+
+        for governorate in data["governorates"]:
+            gov_name = governorate["name"]
+            self._add(GazetteerEntry("governorate", gov_name, None, gov_name, None, None),
+                      [gov_name, *governorate.get("aliases", [])])
+            for district in governorate.get("districts", []):
+                area_id, sector_id = district.get("areaId"), district.get("sectorId")
+                self._add(GazetteerEntry("district", district["name"], district["name"], gov_name, area_id, sector_id),
+                          [district["name"], *district.get("aliases", [])])
+                for street in district.get("streets", []):
+                    if isinstance(street, str):
+                        street = {"name": street}
+                    self._add(GazetteerEntry("street", street["name"], district["name"], gov_name,
+                                             street.get("areaId", area_id), street.get("sectorId", sector_id)),
+                              [street["name"], *street.get("aliases", [])])
+
+    @classmethod
+    def from_file(cls, path: str) -> "Gazetteer":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def _add(self, entry: GazetteerEntry, names: List[str]) -> None:
+        entry_index = len(self.entries)
+        self.entries.append(entry)
+        for name in names:
+            grams = _trigrams(" ".join(normalize_tokens(name)))
+            name_index = len(self._names)
+            self._names.append((entry_index, grams))
+            for gram in grams:
+                self._index[gram].append(name_index)
+
+    def _match(self, tokens: List[str]) -> Dict[int, Tuple[float, int, int]]:
+        """Best (score, start, end) per entry over all word n-grams of the message"""
+        best: Dict[int, Tuple[float, int, int]] = {}
+        for start in range(len(tokens)):
+            for end in range(start + 1, min(start + MAX_PHRASE_WORDS, len(tokens)) + 1):
+                grams = _trigrams(" ".join(tokens[start:end]))
+                shared: Dict[int, int] = defaultdict(int)
+                for gram in grams:
+                    for name_index in self._index.get(gram, ()):
+                        shared[name_index] += 1
+                for name_index, count in shared.items():
+                    entry_index, name_grams = self._names[name_index]
+                    score = 2 * count / (len(grams) + len(name_grams))
+                    if score >= MATCH_THRESHOLD and score > best.get(entry_index, (0.0,))[0]:
+                        best[entry_index] = (score, start, end)
+        return best
+
+    def resolve(self, text: str, cued_only: bool = False) -> Optional[ResolvedAddress]:
+        """
+        Resolve a free-text address, or None if no district can be identified.
+
+        With cued_only, the text must also read as an address: an address word anywhere in it, or a
+        house number or preposition just before the place name ("I am in Maadi"). Place names that
+        merely come up ("I cannot open the Al Ahram website") are then left alone.
+        """
+        spans = _tokenize(text)
+        tokens = [token for token, _, _ in spans]
+        matches = self._match(tokens)
+        by_kind = defaultdict(list)
+        for entry_index, (score, start, end) in matches.items():
+            by_kind[self.entries[entry_index].kind].append((score, start, end, self.entries[entry_index]))
+        for found in by_kind.values():
+            found.sort(key=lambda match: match[0], reverse=True)
+
+        governorates = {match[3].name for match in by_kind["governorate"]}
+        districts = [match for match in by_kind["district"]
+                     if not governorates or match[3].governorate in governorates]
+        streets = by_kind["street"]
+
+        street = None
+        if districts:
+            district = districts[0]
+            in_district = [match for match in streets if match[3].district == district[3].name]
+            street = in_district[0] if in_district else None
+        elif streets:
+            # No district named: only trust a street name that exists in a single district
+            top_score = streets[0][0]
+            best_streets = [match for match in streets if match[0] == top_score]
+            if len({match[3].district for match in best_streets}) != 1:
+                return None
+            street = best_streets[0]
+            district = street
+        else:
+            return None
+
+        first = min(m[1] for m in (street, district) if m is not None)
+        last = max(m[2] for m in (street, district) if m is not None)
+        if cued_only and not (
+            _ADDRESS_WORDS.intersection(tokens)
+            or (first > 0 and (tokens[first - 1] in _PLACE_PREPOSITIONS or _NUMBER_RE.match(tokens[first - 1])))
+        ):
+            return None
+
+        entry = (street or district)[3]
+        # Street-level codes first, then the district's own codes if they differ
+        candidates = [(entry.area_id, entry.sector_id)]
+        district_pair = (district[3].area_id, district[3].sector_id)
+        if district[3].kind == "district" and district_pair not in candidates:
+            candidates.append(district_pair)
+
+        address_text = self._address_text(text, spans, first, last, by_kind["governorate"])
+        street_part = self._street_part(address_text, tokens, street)
+        parts = [street_part] if street_part else []
+        parts += [entry.district, f"{entry.governorate} Governorate", "Egypt"]
+        score = min(m[0] for m in (street, district) if m is not None)
+        return ResolvedAddress(
+            canonical=", ".join(parts),
+            street=street[3].name if street else None,
+            district=entry.district,
+            governorate=entry.governorate,
+            candidates=candidates,
+            score=score,
+            text=address_text,
+        )
+
+    @staticmethod
+    def _address_text(text: str, spans: List[Tuple[str, int, int]], first: int, last: int, governorates) -> str:
+        """
+        The caller's address within the message: the matched names, widened to the house number and
+        street type around them and to neighbouring clauses giving building details or a street
+        ("Building 7, Road 9, Maadi"), but not to the complaint or a phone number beside them
+        """
+        tokens = [token for token, _, _ in spans]
+        # A governorate named alongside the district ("Dokki, Giza")
+        for _, start, end, _ in governorates:
+            if start == last or end == first:
+                first, last = min(first, start), max(last, end)
+        segment = [0]
+        for previous, current in zip(spans, spans[1:]):
+            segment.append(segment[-1] + bool(_SEGMENT_BREAK_RE.search(text, previous[2], current[1])))
+
+        def addressy(index: int) -> bool:
+            token = tokens[index]
+            return token in _STREET_WORDS or token in _DETAIL_WORDS or bool(_NUMBER_RE.match(token))
+
+        def segment_tokens(number: int) -> List[int]:
+            return [index for index in range(len(tokens)) if segment[index] == number]
+
+        def detail_segment(number: int) -> bool:
+            indices = segment_tokens(number)
+            clause = text[spans[indices[0]][1]:spans[indices[-1]][2]]
+            return any(addressy(index) for index in indices) and not _PHONE_RE.search(re.sub(r"[\s-]", "", clause))
+
+        # House number or building detail just before the name ("15 Abbas El Akkad", "building 5 on Tahrir")
+        for index in range(max(0, first - 3), first):
+            if segment[index] == segment[first] and addressy(index):
+                first = index
+                break
+        # Whole clauses before it that give details ("Building 7, Road 9, Maadi"), from their first detail
+        while segment[first] > 0 and detail_segment(segment[first] - 1):
+            first = next(index for index in segment_tokens(segment[first] - 1) if addressy(index))
+        # Street type and number after it ("Tahrir Street", "Road 9")
+        while last < len(tokens) and segment[last] == segment[last - 1] and addressy(last):
+            last += 1
+        # Whole clauses after it that give details ("..., apartment 4")
+        while segment[last - 1] < segment[-1] and detail_segment(segment[last - 1] + 1):
+            last = segment_tokens(segment[last - 1] + 1)[-1] + 1
+        return text[spans[first][1]:spans[last - 1][2]]
+
+    @staticmethod
+    def _street_part(address_text: str, tokens: List[str], street) -> Optional[str]:
+        """House number and street for the canonical address"""
+        if street is not None:
+            _, start, _, entry = street
+            # A house/building number just before the street name ("15 Abbas El Akkad")
+            number = next((token for token in reversed(tokens[max(0, start - 3):start]) if _NUMBER_RE.match(token)), None)
+            return f"{number} {entry.name}" if number else entry.name
+        # Unknown street: keep the caller's first comma-separated segment that has a number in it
+        for segment in re.split(r"[,\n،]", address_text):
+            if re.search(r"\d", segment):
+                segment = re.sub(r"^.*?\b(?:at|is|on|in)\s+(?=\d)", "", segment.strip(), flags=re.IGNORECASE)
+                return segment.strip() or None
+        return None
+
+
+_gazetteer: Optional[Gazetteer] = None
+
+
+def get_gazetteer() -> Gazetteer:
+    """Shared gazetteer, loaded on first use from CALLTAKER_GAZETTEER or the bundled data"""
+    global _gazetteer
+    if _gazetteer is None:
+        _gazetteer = Gazetteer.from_file(os.getenv("CALLTAKER_GAZETTEER") or DEFAULT_GAZETTEER_PATH)
+    return _gazetteer
+
+
+def resolve_address(text: str, cued_only: bool = False) -> Optional[ResolvedAddress]:
+    """Resolve a free-text address against the shared gazetteer"""
+    return get_gazetteer().resolve(text, cued_only)
@@ -0,0 +1,254 @@
+"""
+Local intent classifier
+Tells what a caller message holds without a model round trip: a reply to a pending confirmation
+(confirm, decline, change_address) and/or new details (provides_address, provides_phone,
+provides_complaint). Messages are hashed into character n-gram and word features and scored by one
+logistic regression per label with NumPy, in tens of microseconds. The agent only asks the
+extraction model about a message when the classifier says it may hold something still missing,
+and settles clear confirmation replies locally.
+
+The gate fails open: a message the classifier has not decided either way (mostly features it never
+saw in training, e.g. another language or dialect) always goes to the model, since its scores then
+only reflect the label base rates.
+
+The bundled model is trained on data/intent_train.jsonl and checked against data/intent_eval.jsonl;
+point CALLTAKER_INTENT_MODEL at another artifact, or set CALLTAKER_INTENT_GATE=0 to always ask the model.
+
+Train and evaluate:
+    python -m src.agent.intent train src/agent/data/intent_train.jsonl src/agent/data/intent_model.npz
+    python -m src.agent.intent eval src/agent/data/intent_eval.jsonl
+"""
+
+import argparse
+import json
+import os
+import string
+import time
+import zlib
+from typing import Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_INTENT_MODEL_PATH = os.path.join(os.path.dirname(__file__), "data", "intent_model.npz")
+
+LABELS = ("confirm", "decline", "change_address", "provides_address", "provides_phone", "provides_complaint")
+
+# Feature space: 2**HASH_BITS hashed buckets of character 2- to 4-grams and words
+HASH_BITS = 15
+
+# Probability from which a message may hold a label: the extraction model is asked (favours recall)
+GATE_THRESHOLD = 0.2
+# Probability from which a confirmation reply is settled without the model
+DECIDE_THRESHOLD = 0.9
+# Probability under which a label is decided absent
+REJECT_THRESHOLD = 0.1
+# Share of a message's features seen in training below which its scores aren't trusted
+MIN_COVERAGE = 0.7
+
+# Every digit reads as 0, so numbers are told apart by their length and shape, not their value
+_DIGITS = str.maketrans("0123456789٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹", "0" * 30)
+_PUNCTUATION = string.punctuation + "،؟"
+_GRAM_PRIME = np.uint64(1_000_003)
+_WORD_SALT = np.uint64(1 << 40)
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+_SHIFT = np.uint64(64 - HASH_BITS)
+
+
+class IntentScores(NamedTuple):
+    """Probability of each label for one message"""
+    confirm: float
+    decline: float
+    change_address: float
+    provides_address: float
+    provides_phone: float
+    provides_complaint: float
+    # Share of the message's features seen in training
+    coverage: float = 1.0
+
+    def labels(self, threshold: float = 0.5) -> List[str]:
+        return [label for label, score in zip(LABELS, self) if score >= threshold]
+
+    def decided(self) -> bool:
+        """Whether the classifier knows the message and has decided some label present or absent"""
+        return self.coverage >= MIN_COVERAGE and any(
+            score >= DECIDE_THRESHOLD or score < REJECT_THRESHOLD for score in self[:len(LABELS)]
+        )
+
+
+def features(text: str) -> np.ndarray:
+    """Hashed feature indices of a message, one per character n-gram and word (repeats count twice)"""
+    normalized = " ".join(text.lower().translate(_DIGITS).split())
+    codes = np.frombuffer(f" {normalized} ".encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    # Polynomial hashes of every 2-, 3- and 4-gram at once, each size extending the last (uint64 wraps)
+    bigrams = codes[:-1] * _GRAM_PRIME + codes[1:]
+    trigrams = bigrams[:-1] * _GRAM_PRIME + codes[2:]
+    fourgrams = trigrams[:-1] * _GRAM_PRIME + codes[3:]
+    words = np.fromiter((zlib.crc32(word.strip(_PUNCTUATION).encode("utf-8")) for word in normalized.split()),
+                        dtype=np.uint64)
+    # Multiplicative hashing into the top HASH_BITS bits
+    hashes = np.concatenate((bigrams, trigrams, fourgrams, words + _WORD_SALT)) * _MIX
+    return (hashes >> _SHIFT).astype(np.intp)
+
+
+def _feature_matrix(texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(row, column, value) triplets of the feature vectors, scaled by 1/sqrt(features) as in classify"""
+    columns = [features(text) for text in texts]
+    rows = np.concatenate([np.full(len(cols), index) for index, cols in enumerate(columns)])
+    values = np.concatenate([np.full(len(cols), 1.0 / np.sqrt(max(len(cols), 1))) for cols in columns])
+    return rows, np.concatenate(columns), values
+
+
+class IntentClassifier:
+    """One-vs-rest logistic regression over hashed message features"""
+
+    def __init__(self, weights: np.ndarray, bias: np.ndarray):
+        self.weights = weights  # (features, labels)
+        self.bias = bias  # (labels,)
+        # Buckets no training message hashed into keep their zero weights
+        self.known = (weights != 0).any(axis=1)
+
+    @classmethod
+    def from_file(cls, path: str) -> "IntentClassifier":
+        with np.load(path) as data:
+            if tuple(data["labels"]) != LABELS or data["weights"].shape[0] != 1 << HASH_BITS:
+                raise ValueError(f"{path} was trained for different labels or features")
+            return cls(data["weights"].astype(np.float32), data["bias"].astype(np.float32))
+
+    def save(self, path: str) -> None:
+        np.savez_compressed(path, weights=self.weights.astype(np.float16), bias=self.bias,
+                            labels=np.array(LABELS))
+
+    def classify(self, text: str) -> IntentScores:
+        """Label probabilities for one message"""
+        columns = features(text)
+        logits = self.weights[columns].sum(axis=0) / np.sqrt(max(len(columns), 1)) + self.bias
+        coverage = float(self.known[columns].mean()) if len(columns) else 0.0
+        return IntentScores(*(1.0 / (1.0 + np.exp(-logits))).tolist(), coverage=coverage)
+
+    @classmethod
+    def train(cls, examples: Sequence[Tuple[str, Iterable[str]]], epochs: int = 300, learning_rate: float = 0.05,
+              l2: float = 1e-5) -> "IntentClassifier":
+        """Fit on (text, labels) pairs with full-batch Adam on the mean cross-entropy"""
+        rows, columns, values = _feature_matrix([text for text, _ in examples])
+        targets = np.array([[label in set(labels) for label in LABELS] for _, labels in examples], dtype=np.float64)
+        count, dim = len(examples), 1 << HASH_BITS
+        weights = np.zeros((dim, len(LABELS)))
+        bias = np.log((targets.mean(axis=0) + 1e-3) / (1 - targets.mean(axis=0) + 1e-3))
+        moments = [np.zeros_like(weights), np.zeros_like(weights), np.zeros_like(bias), np.zeros_like(bias)]
+        beta1, beta2 = 0.9, 0.999
+        for step in range(1, epochs + 1):
+            logits = np.stack([np.bincount(rows, weights=values * weights[columns, k], minlength=count)
+                               for k in range(len(LABELS))], axis=1) + bias
+            errors = (1.0 / (1.0 + np.exp(-logits)) - targets) / count
+            grad_weights = np.stack([np.bincount(columns, weights=values * errors[rows, k], minlength=dim)
+                                     for k in range(len(LABELS))], axis=1) + l2 * weights
+            grad_bias = errors.sum(axis=0)
+            for param, grad, first, second in ((weights, grad_weights, moments[0], moments[1]),
+                                               (bias, grad_bias, moments[2], moments[3])):
+                first *= beta1
+                first += (1 - beta1) * grad
+                second *= beta2
+                second += (1 - beta2) * grad ** 2
+                param -= learning_rate * (first / (1 - beta1 ** step)) / (np.sqrt(second / (1 - beta2 ** step)) + 1e-8)
+        return cls(weights.astype(np.float32), bias.astype(np.float32))
+
+
+_classifier: Optional[IntentClassifier] = None
+
+
+def get_intent_classifier() -> IntentClassifier:
+    """Shared classifier, loaded on first use from CALLTAKER_INTENT_MODEL or the bundled model"""
+    global _classifier
+    if _classifier is None:
+        _classifier = IntentClassifier.from_file(os.getenv("CALLTAKER_INTENT_MODEL") or DEFAULT_INTENT_MODEL_PATH)
+    return _classifier
+
+
+def intent_gate_enabled() -> bool:
+    return os.getenv("CALLTAKER_INTENT_GATE", "1").lower() in ("1", "true", "yes")
+
+
+def classify_intents(text: str) -> Optional[IntentScores]:
+    """Label probabilities for a caller message, or None when the gate is disabled"""
+    return get_intent_classifier().classify(text) if intent_gate_enabled() else None
+
+
+def may_contain(scores: Optional[IntentScores], label: str) -> bool:
+    """Whether the extraction model should look for label in the message (always, without decided scores)"""
+    return scores is None or not scores.decided() or getattr(scores, label) >= GATE_THRESHOLD
+
+
+def confirmation_reply(scores: Optional[IntentScores]) -> Optional[str]:
+    """Reply to a pending confirmation clear enough to settle locally, or None to ask the model"""
+    if scores is None or not scores.decided() or may_contain(scores, "provides_address"):
+        # A new address has to be extracted anyway
+        return None
+    # "No, use a different address" is a decline too; the address change is what matters
+    if scores.change_address >= DECIDE_THRESHOLD and scores.confirm < GATE_THRESHOLD:
+        return "change_address"
+    if scores.confirm >= DECIDE_THRESHOLD and max(scores.decline, scores.change_address) < GATE_THRESHOLD:
+        return "confirm"
+    if scores.decline >= DECIDE_THRESHOLD and max(scores.confirm, scores.change_address) < GATE_THRESHOLD:
+        return "decline"
+    return None
+
+
+def load_examples(path: str) -> List[Tuple[str, List[str]]]:
+    """(text, labels) pairs from a JSONL file of {"text": ..., "labels": [...]} records"""
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return [(record["text"], record["labels"]) for record in records]
+
+
+def evaluate(classifier: IntentClassifier, examples: Sequence[Tuple[str, List[str]]]) -> dict:
+    """Per-label precision/recall at the gate and at 0.5, confirmation replies settled locally, undecided messages and latency"""
+    started = time.perf_counter()
+    scores = [classifier.classify(text) for text, _ in examples]
+    seconds = (time.perf_counter() - started) / max(len(examples), 1)
+    report = {"examples": len(examples), "classify_us": round(seconds * 1e6, 1), "labels": {}}
+    for index, label in enumerate(LABELS):
+        truth = np.array([label in labels for _, labels in examples])
+        report["labels"][label] = {}
+        for name, threshold in (("gate", GATE_THRESHOLD), ("0.5", 0.5)):
+            predicted = np.array([score[index] >= threshold for score in scores])
+            hits = int((predicted & truth).sum())
+            report["labels"][label][name] = {
+                "precision": round(hits / max(int(predicted.sum()), 1), 3),
+                "recall": round(hits / max(int(truth.sum()), 1), 3),
+            }
+    settled = [(confirmation_reply(score), labels) for score, (_, labels) in zip(scores, examples)]
+    settled = [(reply, labels) for reply, labels in settled if reply is not None]
+    report["settled_locally"] = len(settled)
+    report["settled_wrong"] = sum(reply not in labels for reply, labels in settled)
+    # Messages the gate sends to the model whatever their scores
+    report["undecided"] = sum(not score.decided() for score in scores)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train or evaluate the local intent classifier")
+    commands = parser.add_subparsers(dest="command", required=True)
+    train = commands.add_parser("train", help="Train on a JSONL file and save the model")
+    train.add_argument("data", help="JSONL with text and labels")
+    train.add_argument("model", help="Model file to write (.npz)")
+    train.add_argument("--epochs", type=int, default=300)
+    check = commands.add_parser("eval", help="Evaluate a model on a JSONL file")
+    check.add_argument("data", help="JSONL with text and labels")
+    check.add_argument("--model", default=None,
+                       help="Model file (defaults to CALLTAKER_INTENT_MODEL or the bundled one)")
+    args = parser.parse_args()
+
+    examples = load_examples(args.data)
+    if args.command == "train":
+        started = time.perf_counter()
+        classifier = IntentClassifier.train(examples, epochs=args.epochs)
+        classifier.save(args.model)
+        print(f"Trained on {len(examples)} examples in {time.perf_counter() - started:.1f}s, saved {args.model}")
+        classifier = IntentClassifier.from_file(args.model)
+    else:
+        classifier = IntentClassifier.from_file(args.model) if args.model else get_intent_classifier()
+    print(json.dumps(evaluate(classifier, examples), indent=2))
+
+
+if __name__ == "__main__":
+    main()
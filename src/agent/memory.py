@@ -0,0 +1,139 @@
+"""
+Token-budgeted conversation memory
+Reply prompts carry a running summary of the call plus a window of the most recent messages,
+together held under a fixed token cap, so prompt size stays flat however long the call runs.
+Messages that age out of the window are queued on the session and folded into the summary by one
+small model call, made only when something has aged out and run alongside the turn's extraction.
+
+    CALLTAKER_MEMORY_WINDOW_TOKENS=600   recent messages kept verbatim
+    CALLTAKER_MEMORY_SUMMARY_TOKENS=200  cap on the running summary
+
+Tokens are counted locally with tiktoken's o200k_base encoding (pre-download it into
+TIKTOKEN_CACHE_DIR for offline hosts); without it, ~4 characters per token.
+"""
+
+import math
+import os
+from typing import List, Optional, Sequence, Tuple
+
+from langchain_core.messages import HumanMessage
+
+from .metrics import SUMMARY_TAG
+from .model_calls import call_model
+
+WINDOW_TOKENS = int(os.getenv("CALLTAKER_MEMORY_WINDOW_TOKENS", "600"))
+SUMMARY_TOKENS = int(os.getenv("CALLTAKER_MEMORY_SUMMARY_TOKENS", "200"))
+
+# Aged-out lines kept while summarization keeps failing; older ones are dropped
+MAX_UNSUMMARIZED_LINES = 40
+
+_encoder = None
+
+
+def _get_encoder():
+    global _encoder
+    if _encoder is None:
+        try:
+            import tiktoken
+            _encoder = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _encoder = False
+    return _encoder
+
+
+def count_tokens(text: str) -> int:
+    """Tokens in text via tiktoken when its encoding is available locally, otherwise ~4 chars per token"""
+    encoder = _get_encoder()
+    if encoder:
+        return len(encoder.encode(text))
+    return math.ceil(len(text) / 4)
+
+
+def tokenizer_name() -> str:
+    """Which token counter count_tokens is using"""
+    return "o200k_base" if _get_encoder() else "chars/4"
+
+
+def truncate_to_tokens(text: str, limit: int) -> str:
+    """Leading part of text that fits in limit tokens"""
+    if count_tokens(text) <= limit:
+        return text
+    encoder = _get_encoder()
+    if encoder:
+        return encoder.decode(encoder.encode(text)[:limit]).rstrip() + "..."
+    return text[:limit * 4].rstrip() + "..."
+
+
+def message_line(message) -> str:
+    """One transcript line for a message"""
+    speaker = "User" if isinstance(message, HumanMessage) else "Alora"
+    return f"{speaker}: {message.content}"
+
+
+def split_window(messages: Sequence, budget: int = WINDOW_TOKENS) -> Tuple[list, list]:
+    """
+    Split messages into (aged_out, window): the window is the newest messages that fit in
+    budget tokens, and always holds at least the last message.
+    """
+    messages = list(messages)
+    used = 0
+    start = len(messages)
+    while start > 0:
+        tokens = count_tokens(message_line(messages[start - 1]))
+        if used + tokens > budget and start < len(messages):
+            break
+        used += tokens
+        start -= 1
+    return messages[:start], messages[start:]
+
+
+def conversation_context(summary: Optional[str], messages: Sequence) -> str:
+    """Summary plus recent messages for a prompt, within SUMMARY_TOKENS + WINDOW_TOKENS"""
+    parts = []
+    if summary:
+        parts.append(f"Earlier in the call: {truncate_to_tokens(summary, SUMMARY_TOKENS)}\n")
+    lines: List[str] = []
+    budget = WINDOW_TOKENS
+    for message in reversed(messages):
+        line = message_line(message)
+        tokens = count_tokens(line)
+        if tokens > budget:
+            if not lines:
+                # A single message longer than the window: keep its beginning
+                lines.append(truncate_to_tokens(line, budget))
+            break
+        lines.append(line)
+        budget -= tokens
+    parts.append("Recent conversation:\n" + ("\n".join(reversed(lines)) if lines else "None"))
+    return "\n".join(parts)
+
+
+def build_summary_prompt(summary: Optional[str], lines: Sequence[str]) -> str:
+    """Prompt folding aged-out transcript lines into the running summary"""
+    words = SUMMARY_TOKENS * 3 // 4
+    return f"""Update the running summary of a customer service call with the new transcript lines.
+Keep what matters for handling the call: the issue(s) reported, phone number, address, what the
+customer confirmed, declined or asked to change, and anything still open. At most {words} words.
+
+Current summary: {summary or 'None'}
+
+New transcript lines:
+{chr(10).join(lines)}
+
+Updated summary:"""
+
+
+async def summarize(model, fallback, summary: Optional[str], lines: Sequence[str],
+                    deadline: Optional[float] = None) -> str:
+    """New running summary covering lines; raises if no model answers in time"""
+    prompt = build_summary_prompt(summary, lines)
+
+    async def invoke(chat_model, config):
+        response = await chat_model.ainvoke(prompt, config=config)
+        text = response.content.strip()
+        if not text:
+            raise ValueError("Empty summary")
+        return text
+
+    text, _ = await call_model(SUMMARY_TAG, model, fallback, invoke, tags=[SUMMARY_TAG], deadline=deadline)
+    return truncate_to_tokens(text, SUMMARY_TOKENS)
@@ -0,0 +1,244 @@
+"""
+Prometheus-style metrics for the complaint agent
+Counters and histograms are plain in-process objects (a dict update under a lock per observation)
+rendered in the Prometheus text format on scrape. Values that are cheap to read on demand, like
+session counts and cache stats, are collected at scrape time instead of on the hot path.
+
+Each worker process keeps its own registry; scrape every worker (or run one) for complete numbers.
+"""
+
+import bisect
+import functools
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Latency buckets in seconds, from fast local turns up to slow model calls
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0)
+
+# Tags on extraction and summarization calls so model metrics can tell them apart from replies
+EXTRACT_TAG = "extract_turn"
+SUMMARY_TAG = "summarize"
+# Tag on replies generated ahead of the turn that may need them (see speculation.py)
+SPECULATE_TAG = "speculate"
+
+_registry: List["_Metric"] = []
+_collectors: List[Callable[[], Iterable[Tuple]]] = []
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Monotonic counter with optional labels"""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        lines = self._header()
+        for label_values, value in values:
+            lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram with optional labels"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        # Per label set: [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *label_values: str) -> int:
+        series = self._series.get(label_values)
+        return series[2] if series else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = [(labels, (list(counts), total, n)) for labels, (counts, total, n) in self._series.items()]
+        lines = self._header()
+        for label_values, (counts, total, n) in series:
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, float("inf")), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, label_values, le)} {cumulative}")
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {n}")
+        return lines
+
+
+def register_collector(collect: Callable[[], Iterable[Tuple]]) -> None:
+    """
+    Register a function called on every scrape.
+
+    It yields (name, kind, documentation, samples) tuples, where samples is a list of
+    (labels dict, value) pairs and kind is "gauge" or "counter".
+    """
+    _collectors.append(collect)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for collect in _collectors:
+        try:
+            collected = list(collect())
+        except Exception as e:
+            print(f"Metrics collector failed: {e}")
+            continue
+        for name, kind, documentation, samples in collected:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# Agent metrics
+TURN_SECONDS = Histogram("calltaker_turn_seconds", "Wall time of one agent turn", ("mode",))
+NODE_SECONDS = Histogram("calltaker_node_seconds", "Wall time per graph node", ("node",))
+LLM_SECONDS = Histogram("calltaker_llm_request_seconds", "Model call latency", ("model", "purpose"))
+LLM_REQUESTS = Counter("calltaker_llm_requests_total", "Model calls by outcome", ("model", "purpose", "outcome"))
+LLM_TOKENS = Counter("calltaker_llm_tokens_total", "Tokens used by model calls", ("model", "purpose", "kind"))
+REPLIES = Counter("calltaker_replies_total", "Replies by how they were produced", ("source", "model"))
+MODEL_HEDGES = Counter("calltaker_model_hedges_total", "Hedged model requests, by the attempt that won",
+                       ("purpose", "winner"))
+MODEL_FALLBACKS = Counter("calltaker_model_fallbacks_total", "Model calls moved to the other model",
+                          ("purpose", "reason"))
+MODEL_TIMEOUTS = Counter("calltaker_model_timeouts_total", "Model calls that missed their deadline", ("purpose",))
+TURN_DEGRADATIONS = Counter("calltaker_turn_degradations_total", "Turns degraded to stay within the turn budget",
+                            ("reason",))
+ADMISSION_SHED = Counter("calltaker_requests_shed_total", "Requests turned away by admission control", ("reason",))
+ADMISSION_WAIT = Histogram("calltaker_admission_wait_seconds", "Time requests waited for a turn slot")
+MODEL_SLOT_WAIT = Histogram("calltaker_model_slot_wait_seconds", "Time model calls waited for a concurrency slot",
+                            ("model",))
+INTENT_GATE = Counter("calltaker_intent_gate_total",
+                      "Caller messages by what the local intent classifier left for the extraction model",
+                      ("decision",))
+SPECULATIONS = Counter("calltaker_speculations_total", "Speculative next-turn replies by outcome",
+                       ("dialogue_state", "outcome"))
+BREAKER_TRANSITIONS = Counter("calltaker_circuit_breaker_transitions_total", "Circuit breaker state changes",
+                              ("model", "state"))
+
+
+def time_node(name: str, node: Callable) -> Callable:
+    """Wrap an async graph node so its wall time is recorded"""
+    @functools.wraps(node)
+    async def timed(state):
+        started = time.perf_counter()
+        try:
+            return await node(state)
+        finally:
+            NODE_SECONDS.observe(time.perf_counter() - started, name)
+    return timed
+
+
+def purpose_of(tags: Optional[List[str]]) -> str:
+    """Purpose label of a model call from its tags"""
+    tags = tags or ()
+    for purpose in ("reply", EXTRACT_TAG, SUMMARY_TAG, SPECULATE_TAG):
+        if purpose in tags:
+            return purpose
+    return "other"
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """Records latency, outcome and token usage of every chat model call"""
+    # Runs in the caller's thread/loop instead of being dispatched to an executor
+    run_inline = True
+
+    def __init__(self):
+        self._started: Dict[UUID, Tuple[float, str, str]] = {}
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages, *, run_id: UUID,
+                            tags: Optional[List[str]] = None, metadata: Optional[Dict[str, Any]] = None,
+                            **kwargs: Any) -> None:
+        model = (metadata or {}).get("ls_model_name") or (serialized or {}).get("kwargs", {}).get("model_name", "unknown")
+        self._started[run_id] = (time.perf_counter(), model, purpose_of(tags))
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self._started.pop(run_id, None)
+        if started is None:
+            return
+        start, model, purpose = started
+        LLM_SECONDS.observe(time.perf_counter() - start, model, purpose)
+        LLM_REQUESTS.inc(model, purpose, "ok")
+        usage = None
+        try:
+            usage = response.generations[0][0].message.usage_metadata
+        except (AttributeError, IndexError):
+            pass
+        if usage:
+            LLM_TOKENS.inc(model, purpose, "prompt", amount=usage.get("input_tokens", 0))
+            LLM_TOKENS.inc(model, purpose, "completion", amount=usage.get("output_tokens", 0))
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self._started.pop(run_id, None)
+        if started is None:
+            return
+        start, model, purpose = started
+        LLM_SECONDS.observe(time.perf_counter() - start, model, purpose)
+        LLM_REQUESTS.inc(model, purpose, "error")
+
+
+llm_metrics = LLMMetricsCallback()
@@ -0,0 +1,274 @@
+"""
+Model-call layer with timeouts, hedging and circuit breakers
+Every model call runs under a per-purpose deadline. If the primary model hasn't answered after a
+hedge delay, the same request is sent to the other model and whichever succeeds first wins (the
+loser is cancelled); a failed primary falls back to the other model straight away. Each model has
+a circuit breaker that stops routing to it while its recent error rate is high, and a cap on
+concurrent calls (waiting for a slot counts against the call's deadline).
+
+Timeouts and hedge delays (seconds) per purpose, e.g. for replies:
+    CALLTAKER_TIMEOUT_REPLY=10  CALLTAKER_HEDGE_AFTER_REPLY=3   (hedge delay <= 0 disables hedging)
+
+Concurrent calls per process:
+    CALLTAKER_LLM_CONCURRENCY=64     across all models
+    CALLTAKER_MODEL_CONCURRENCY=32   per model
+"""
+
+import asyncio
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+from .metrics import (BREAKER_TRANSITIONS, MODEL_FALLBACKS, MODEL_HEDGES, MODEL_SLOT_WAIT, MODEL_TIMEOUTS,
+                      register_collector)
+
+T = TypeVar("T")
+
+# Tag added to hedged requests, so streaming only forwards the primary request's tokens
+HEDGE_TAG = "hedge"
+
+# Speculative replies run during the caller's think time, so they wait longer and are never hedged
+DEFAULT_TIMEOUTS = {"reply": 10.0, "extract_turn": 8.0, "summarize": 8.0, "speculate": 15.0}
+DEFAULT_HEDGE_AFTER = {"reply": 3.0, "extract_turn": 2.5, "summarize": 3.0, "speculate": 0.0}
+
+
+class ModelCallTimeout(Exception):
+    """No model answered within the purpose's deadline"""
+
+
+def _env_seconds(prefix: str, purpose: str, defaults: Dict[str, float]) -> float:
+    value = os.getenv(f"{prefix}_{purpose.upper()}")
+    return float(value) if value else defaults.get(purpose, defaults["reply"])
+
+
+def timeout_for(purpose: str) -> float:
+    return _env_seconds("CALLTAKER_TIMEOUT", purpose, DEFAULT_TIMEOUTS)
+
+
+def hedge_delay_for(purpose: str) -> float:
+    return _env_seconds("CALLTAKER_HEDGE_AFTER", purpose, DEFAULT_HEDGE_AFTER)
+
+
+class CircuitBreaker:
+    """
+    Closed -> open when the failure rate over the last `window` calls reaches `failure_rate`;
+    open -> half-open after `cooldown_seconds`, letting one probe call through; the probe's
+    outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, name: str, window: int = 20, failure_rate: float = 0.5, min_calls: int = 5,
+                 cooldown_seconds: float = 30.0):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.cooldown_seconds = cooldown_seconds
+        self.state = "closed"
+        self._results = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def _transition(self, state: str) -> None:
+        self.state = state
+        BREAKER_TRANSITIONS.inc(self.name, state)
+
+    def allow(self) -> bool:
+        """Whether a call may be sent to this model now"""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.cooldown_seconds:
+                    return False
+                self._transition("half_open")
+                self._probe_in_flight = False
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record(self, success: bool) -> None:
+        with self._lock:
+            if self.state == "half_open":
+                self._probe_in_flight = False
+                if success:
+                    self._results.clear()
+                    self._transition("closed")
+                else:
+                    self._opened_at = time.monotonic()
+                    self._transition("open")
+                return
+            self._results.append(success)
+            failures = self._results.count(False)
+            if (self.state == "closed" and len(self._results) >= self.min_calls
+                    and failures / len(self._results) >= self.failure_rate):
+                self._opened_at = time.monotonic()
+                self._transition("open")
+
+    def release(self) -> None:
+        """A call was cancelled before it finished (e.g. it lost a hedge race); free the probe slot"""
+        with self._lock:
+            self._probe_in_flight = False
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def _model_name(model) -> str:
+    return getattr(model, "model_name", None) or type(model).__name__
+
+
+def breaker_for(model) -> CircuitBreaker:
+    """Shared circuit breaker of a model (keyed by model name)"""
+    name = _model_name(model)
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(
+                name,
+                window=int(os.getenv("CALLTAKER_BREAKER_WINDOW", "20")),
+                failure_rate=float(os.getenv("CALLTAKER_BREAKER_FAILURE_RATE", "0.5")),
+                min_calls=int(os.getenv("CALLTAKER_BREAKER_MIN_CALLS", "5")),
+                cooldown_seconds=float(os.getenv("CALLTAKER_BREAKER_COOLDOWN", "30")),
+            )
+        return breaker
+
+
+def _collect_breakers():
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    yield ("calltaker_circuit_breaker_open", "gauge", "1 while a model's circuit breaker is open or half-open",
+           [({"model": breaker.name}, 0 if breaker.state == "closed" else 1) for breaker in breakers])
+
+
+register_collector(_collect_breakers)
+
+# Concurrency slots per event loop (asyncio semaphores can't be shared across loops):
+# loop -> {model name: semaphore, "": the all-models semaphore}
+_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = (
+    weakref.WeakKeyDictionary()
+)
+_in_flight: Dict[str, int] = {}
+
+
+def _call_slots(name: str) -> Tuple[asyncio.Semaphore, asyncio.Semaphore]:
+    """(per-model, all-models) concurrency semaphores for the running loop"""
+    slots = _slots.setdefault(asyncio.get_running_loop(), {})
+    if "" not in slots:
+        slots[""] = asyncio.Semaphore(int(os.getenv("CALLTAKER_LLM_CONCURRENCY", "64")))
+    if name not in slots:
+        slots[name] = asyncio.Semaphore(int(os.getenv("CALLTAKER_MODEL_CONCURRENCY", "32")))
+    return slots[name], slots[""]
+
+
+def _collect_concurrency():
+    yield ("calltaker_model_calls_in_flight", "gauge", "Model calls holding a concurrency slot",
+           [({"model": name}, count) for name, count in list(_in_flight.items())])
+
+
+register_collector(_collect_concurrency)
+
+
+async def _attempt(model, invoke: Callable[[Any, dict], Awaitable[T]], config: dict) -> T:
+    breaker = breaker_for(model)
+    name = _model_name(model)
+    model_slot, global_slot = _call_slots(name)
+    waiting_since = time.perf_counter()
+    try:
+        # Model slot first, so a call queued behind a saturated model doesn't hold a global slot
+        async with model_slot, global_slot:
+            MODEL_SLOT_WAIT.observe(time.perf_counter() - waiting_since, name)
+            _in_flight[name] = _in_flight.get(name, 0) + 1
+            try:
+                result = await invoke(model, config)
+            finally:
+                _in_flight[name] -= 1
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
+    except Exception:
+        breaker.record(False)
+        raise
+    breaker.record(True)
+    return result
+
+
+async def call_model(purpose: str, primary, secondary, invoke: Callable[[Any, dict], Awaitable[T]],
+                     tags: Sequence[str] = (), deadline: Optional[float] = None) -> Tuple[T, Any]:
+    """
+    Run invoke(model, config) against primary, hedging/falling back to secondary.
+
+    invoke should raise for unusable results (e.g. an empty reply) so the other model is tried.
+    deadline (time.monotonic()) caps the purpose's timeout, e.g. at the turn deadline.
+    Returns (result, model that produced it). Raises ModelCallTimeout if nothing succeeds before
+    the deadline, or the last model error if every model failed.
+    """
+    started = time.monotonic()
+    model_deadline = started + timeout_for(purpose)
+    deadline = model_deadline if deadline is None else min(deadline, model_deadline)
+    if deadline <= started:
+        MODEL_TIMEOUTS.inc(purpose)
+        raise ModelCallTimeout(f"No time left for {purpose}")
+
+    models = [primary] + ([secondary] if secondary is not None and secondary is not primary else [])
+    allowed = [model for model in models if breaker_for(model).allow()]
+    if not allowed:
+        # Every breaker is open: still try the primary rather than failing the turn outright
+        allowed = models[:1]
+    elif allowed[0] is not primary:
+        MODEL_FALLBACKS.inc(purpose, "breaker_open")
+
+    hedge_at = started + hedge_delay_for(purpose) if hedge_delay_for(purpose) > 0 else None
+    backups = allowed[1:]
+    pending: Dict[asyncio.Task, Any] = {}
+    hedged = False
+    errors: List[BaseException] = []
+
+    def launch(model, hedge: bool) -> None:
+        config = {"tags": [*tags, HEDGE_TAG] if hedge else list(tags)}
+        pending[asyncio.ensure_future(_attempt(model, invoke, config))] = model
+
+    launch(allowed[0], hedge=False)
+    try:
+        while pending:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            wait = deadline - now
+            if backups and hedge_at is not None:
+                wait = min(wait, max(0.0, hedge_at - now))
+            done, _ = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                if backups and hedge_at is not None and time.monotonic() >= hedge_at:
+                    hedged = True
+                    launch(backups.pop(0), hedge=True)
+                continue
+            for task in done:
+                model = pending.pop(task)
+                if task.exception() is None:
+                    if hedged:
+                        MODEL_HEDGES.inc(purpose, "primary" if model is allowed[0] else "hedge")
+                    return task.result(), model
+                errors.append(task.exception())
+            if not pending and backups:
+                MODEL_FALLBACKS.inc(purpose, "error")
+                launch(backups.pop(0), hedge=False)
+
+        if pending or not errors:
+            MODEL_TIMEOUTS.inc(purpose)
+            if deadline == model_deadline:
+                # Only the model's own timeout counts against it, not a caller's tighter deadline
+                for model in pending.values():
+                    breaker_for(model).record(False)
+            raise ModelCallTimeout(f"No {purpose} response within {deadline - started:.1f}s")
+        raise errors[-1]
+    finally:
+        for task in pending:
+            task.cancel()
+        for model in backups:
+            # Allowed but never called: give back a half-open breaker's probe slot
+            breaker_for(model).release()
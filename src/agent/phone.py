@@ -0,0 +1,112 @@
+"""
+Local phone number parsing for the complaint agent
+Finds Egyptian phone numbers typed as digits or spelled out in words, without a model call.
+"""
+
+import re
+from typing import List, NamedTuple, Optional
+
+COUNTRY_CODE = "20"
+
+# Arabic-Indic and Extended (Persian) Arabic-Indic digits
+_DIGIT_TRANSLATION = str.maketrans("٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹", "01234567890123456789")
+
+DIGIT_WORDS = {
+    "zero": "0", "oh": "0", "o": "0", "nought": "0",
+    "one": "1", "two": "2", "three": "3", "four": "4", "five": "5",
+    "six": "6", "seven": "7", "eight": "8", "nine": "9",
+    "صفر": "0", "واحد": "1", "اتنين": "2", "اثنين": "2", "تلاتة": "3", "ثلاثة": "3",
+    "اربعة": "4", "أربعة": "4", "خمسة": "5", "ستة": "6", "سبعة": "7",
+    "تمانية": "8", "ثمانية": "8", "تسعة": "9",
+}
+
+REPEAT_WORDS = {"double": 2, "triple": 3}
+
+# Words that suggest the message talks about a phone number
+PHONE_CUES = ("phone", "number", "mobile", "cell", "call me", "reach me", "contact", "رقم", "موبايل", "تليفون")
+
+# Digits, words, or the separators allowed inside a phone number ("/" is excluded so dates never join up)
+_TOKEN_RE = re.compile(r"\+|\d+|[^\W\d_]+|[-.()]|\S", re.UNICODE)
+_SEPARATORS = {"-", ".", "(", ")"}
+
+
+class PhoneNumber(NamedTuple):
+    """A parsed phone number in national and E.164 form"""
+    national: str  # e.g. "0123456789", the form used for customer lookups
+    e164: str      # e.g. "+20123456789"
+
+
+def _normalize(digits: str, has_plus: bool) -> Optional[PhoneNumber]:
+    """Turn a raw digit run into a phone number, or None if it can't be one"""
+    if digits.startswith("00" + COUNTRY_CODE):
+        digits = "0" + digits[2 + len(COUNTRY_CODE):]
+    elif digits.startswith(COUNTRY_CODE) and (has_plus or len(digits) >= 11):
+        digits = "0" + digits[len(COUNTRY_CODE):]
+    elif has_plus:
+        # Foreign country code, not a number we can serve
+        return None
+    elif len(digits) == 10 and digits.startswith("1"):
+        # Mobile number given without the trunk 0
+        digits = "0" + digits
+
+    if not digits.startswith("0"):
+        return None
+
+    # Landlines are 9-10 digits with the trunk 0, mobiles 11
+    if not 9 <= len(digits) <= 11:
+        return None
+    return PhoneNumber(national=digits, e164=f"+{COUNTRY_CODE}{digits[1:]}")
+
+
+def _digit_runs(text: str) -> List[tuple]:
+    """Split a message into runs of digits that could form a single number"""
+    runs = []
+    current = []
+    has_plus = False
+    repeat = 1
+
+    def close():
+        nonlocal current, has_plus, repeat
+        if current:
+            runs.append(("".join(current), has_plus))
+        current = []
+        has_plus = False
+        repeat = 1
+
+    for token in _TOKEN_RE.findall(text.translate(_DIGIT_TRANSLATION).lower()):
+        if token.isdigit():
+            current.append(token[0] * repeat + token[1:])
+            repeat = 1
+        elif token in DIGIT_WORDS:
+            current.append(DIGIT_WORDS[token] * repeat)
+            repeat = 1
+        elif token in REPEAT_WORDS:
+            repeat = REPEAT_WORDS[token]
+        elif token == "+" and not current:
+            has_plus = True
+        elif token in _SEPARATORS:
+            continue
+        else:
+            close()
+    close()
+    return runs
+
+
+def parse_phone_number(text: str) -> Optional[PhoneNumber]:
+    """Find the first phone number in a message, or None"""
+    for digits, has_plus in _digit_runs(text):
+        phone = _normalize(digits, has_plus)
+        if phone is not None:
+            return phone
+    return None
+
+
+def needs_llm_fallback(text: str) -> bool:
+    """Whether a message may hold a phone number the local parser could not read"""
+    if parse_phone_number(text) is not None:
+        return False
+    lowered = text.lower()
+    if any(cue in lowered for cue in PHONE_CUES):
+        return True
+    # Long digit runs that don't form a valid number (e.g. a typo'd or foreign number)
+    return any(len(digits) >= 7 for digits, _ in _digit_runs(text))
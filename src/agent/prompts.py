@@ -0,0 +1,150 @@
+"""
+Reply prompt assembly
+Reply prompts are sent as a message list: a system message that is byte-identical for every reply
+in the same dialogue state (Alora's persona, which starts every prefix, then the state's response
+guide), followed by one message with everything that varies per turn (case details, conversation
+memory). Providers that cache prompt prefixes can then reuse the system message.
+
+Templates are parsed once at import; rendering a turn's prompt only joins pre-split segments.
+"""
+
+import hashlib
+from string import Formatter
+from typing import List, Optional, Sequence, Tuple
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+from .memory import conversation_context
+
+SYSTEM_PROMPT = """You are Alora, a customer service AI assistant. Your role is to help customers report technical issues and complaints.
+
+Communication Style:
+- Be warm, empathetic, and professional
+- Show genuine concern for their issues
+- Be proactive and reassuring ("Let's get this sorted right away")
+- Explain what you're doing and what happens next
+- Use natural, conversational language
+- Keep responses concise but complete
+
+Always:
+- Express empathy for their situation
+- Be transparent about the process
+- Confirm details clearly before submission
+- Explain next steps after submission"""
+
+# How to respond in each dialogue state. Static text only: the case details they refer to are
+# given in the final message, so the guides can live in the stable prefix.
+STATE_GUIDES = {
+    "greeting": """Greet the customer warmly. Introduce yourself as Alora, their customer service AI assistant.
+Explain that you're here to help them report any technical issues or complaints they're facing.
+Then ask them to describe the issue they're experiencing.
+
+Example tone: "Hi, good morning! I'm Alora, your customer service AI assistant. I'm here to help you report any technical issues you're facing today."
+
+Be warm, professional, and welcoming.""",
+    "ask_phone": """Respond with empathy and reassurance:
+1. Express empathy for their issue (e.g., "Oh no, I'm really sorry you're dealing with that" or "That must be frustrating")
+2. Be proactive: "Let's get this sorted right away"
+3. Explain the process: "I'll raise a report to our technical team. I just need a couple of details first."
+4. Ask for their phone number politely: "Can we start with your phone number, please?"
+
+Be warm, empathetic, and reassuring. Keep it concise.""",
+    "ask_address": """The customer is NOT registered.
+1. Acknowledge the phone number: "Thank you"
+2. Ask for the address: "Can you please provide the address where the issue is happening?" or "Could you share the location where you're experiencing this issue?"
+
+Be polite and clear.""",
+    "confirm_new_address": """The customer just provided a NEW address. Provide clear confirmation:
+"Just to confirm—you're reporting [brief issue] at this address: [new address]. Anything else you'd like to add before I submit the report?"
+
+Show the full address clearly. Be professional and warm.""",
+    "confirm_registered_address": """The customer is REGISTERED and an address was found in the system.
+1. Acknowledge receipt: "Thank you."
+2. Show you're checking: "Let me check..." or "I see..."
+3. Present the address: "yes, I see an address linked to this number. It shows as: [address]"
+4. Ask for confirmation: "Should I file the complaint for this location?" or "Would you like me to submit this complaint with this address or would you prefer to use a different one?"
+
+Keep it natural and professional. Show the FULL address clearly.""",
+    "confirm_address": """Provide a clear confirmation:
+"Just to confirm—you're reporting [brief issue description] at this address: [address]. Anything else you'd like to add before I submit the report?"
+
+Be clear, professional, and show the full address.""",
+    "ask_new_address": "The customer wants to provide a different address. Acknowledge and ask them politely: 'Of course, could you please provide the address where the issue is happening?' Be warm and professional.",
+    "declined": "The customer declined. Be understanding and helpful: 'No problem! What would you like to change or update?' Be warm and accommodating.",
+    "submitted": """The customer confirmed the submission.
+1. Thank them: "Great, thank you" or "Perfect, thank you"
+2. Confirm submission: "Your issue has been reported successfully"
+3. Explain next steps: "Our technical team will review it and should contact you soon for a visit" or "Our team will look into this and contact you shortly"
+4. Offer continued help: "If you need anything else in the meantime, I'm here to help"
+
+Be warm, reassuring, and clear about what happens next.""",
+    "anything_else": "The previous complaint was submitted. Ask warmly if they have another issue they'd like to report: 'Is there anything else I can help you with today?' or 'Do you have another issue you'd like to report?' Be helpful and available.",
+    "continue": "Continue the conversation naturally based on the context.",
+}
+
+
+class PromptTemplate:
+    """str.format-style template split into literal and field segments once, at construction"""
+    __slots__ = ("segments",)
+
+    def __init__(self, template: str):
+        self.segments: Tuple[Tuple[str, Optional[str]], ...] = tuple(
+            (literal, field) for literal, field, _, _ in Formatter().parse(template)
+        )
+
+    def render(self, **values) -> str:
+        parts = []
+        for literal, field in self.segments:
+            parts.append(literal)
+            if field is not None:
+                parts.append(str(values[field]))
+        return "".join(parts)
+
+
+# Case details shown for each state (states not listed only need the conversation)
+CASE_DETAILS = {
+    "ask_phone": PromptTemplate("Complaint received: {complaint}"),
+    "ask_address": PromptTemplate("Complaint: {complaint}\nMobile Number: {mobile}"),
+    "confirm_new_address": PromptTemplate(
+        "Complaint: {complaint}\nMobile Number: {mobile}\nNEW Address just provided by customer: {address}"
+    ),
+    "confirm_registered_address": PromptTemplate(
+        "Complaint: {complaint}\nMobile Number: {mobile}\nAddress found in system: {address}"
+    ),
+    "confirm_address": PromptTemplate("Complaint: {complaint}\nMobile Number: {mobile}\nAddress provided: {address}"),
+}
+
+TURN_TEMPLATE = PromptTemplate("""{details}{context}
+
+Generate a natural, friendly response:""")
+
+# One prebuilt system message per dialogue state
+REPLY_PREFIXES = {
+    state: SystemMessage(content=f"{SYSTEM_PROMPT}\n\n{guide}") for state, guide in STATE_GUIDES.items()
+}
+
+# Identifies the prefixes in cache keys, so changed prompts don't reuse old replies
+PREFIX_VERSION = hashlib.sha256(
+    "\x00".join(message.content for message in REPLY_PREFIXES.values()).encode("utf-8")
+).hexdigest()[:12]
+
+# Prefix text -> dialogue state, for recording prompts without repeating the prefix
+PREFIX_STATES = {message.content: state for state, message in REPLY_PREFIXES.items()}
+
+
+def render_turn(dialogue_state: str, complaint: Optional[str], mobile: Optional[str], address: Optional[str],
+                summary: Optional[str], messages: Sequence) -> str:
+    """The variable part of a reply prompt"""
+    details = CASE_DETAILS.get(dialogue_state)
+    return TURN_TEMPLATE.render(
+        details=details.render(complaint=complaint, mobile=mobile, address=address) + "\n\n" if details else "",
+        context=conversation_context(summary, messages),
+    )
+
+
+def build_reply_messages(dialogue_state: str, complaint: Optional[str] = None, mobile: Optional[str] = None,
+                         address: Optional[str] = None, summary: Optional[str] = None,
+                         messages: Sequence = ()) -> List[BaseMessage]:
+    """Reply prompt: the state's stable prefix, then this turn's details and conversation"""
+    prefix = REPLY_PREFIXES.get(dialogue_state, REPLY_PREFIXES["continue"])
+    return [prefix, HumanMessage(content=render_turn(dialogue_state, complaint, mobile, address, summary, messages))]
@@ -0,0 +1,182 @@
+"""
+Speculative next-turn replies
+While the caller reads the last reply and thinks, the reply their next turn most likely needs is
+generated in the background. Only replies that don't depend on what the caller says next are
+speculated: after the details are read back for confirmation the next turn is almost always the
+submission, whose acknowledgement is fixed by the case details alone. Replies that answer the
+caller's next message (a goodbye, a new question) are never speculated. A speculative reply is only
+used when the next turn lands in the predicted dialogue state with the same case details
+(complaint, mobile number, address); either way it is dropped at that turn.
+
+Templated states are already instant, so nothing is speculated while "submitted" is templated (the
+default); speculation only pays off when CALLTAKER_TEMPLATED_STATES leaves it to the model.
+Speculations are kept per worker, so a next turn served by another worker just generates its reply
+as usual.
+
+    CALLTAKER_SPECULATE=0                  1 enables speculation
+    CALLTAKER_SPECULATION_CONCURRENCY=8    speculative replies generated at once per worker
+    CALLTAKER_SPECULATION_SESSIONS=10000   sessions with a kept speculation per worker
+    CALLTAKER_SPECULATION_TTL=600          seconds a speculation is kept for its next turn
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from langgraph.config import get_config
+
+from .budget import remaining
+from .clients import get_models
+from .metrics import SPECULATE_TAG, SPECULATIONS, register_collector
+from .model_calls import call_model
+from .prompts import build_reply_messages
+from .templates import TEMPLATED_STATES
+
+# (complaint, mobile number, address) a reply was written for
+Case = Tuple[Optional[str], Optional[str], Optional[str]]
+
+
+def speculation_enabled() -> bool:
+    return os.getenv("CALLTAKER_SPECULATE", "0").lower() in ("1", "true", "yes", "on")
+
+
+def predict_next(session) -> Optional[Tuple[str, Case]]:
+    """Most likely dialogue state of the session's next turn and its case details, when predictable"""
+    address = session.customer_data.get("clientAddress")
+    if (session.complaint and session.mobile_number and address is not None and session.confirmation is None
+            and not session.submitted):
+        # Details were just read back: the caller confirms, and the acknowledgement doesn't depend
+        # on how they phrase it
+        return "submitted", (session.complaint, session.mobile_number, address)
+    return None
+
+
+class _Speculation:
+    __slots__ = ("dialogue_state", "case", "task", "created")
+
+    def __init__(self, dialogue_state: str, case: Case, task: asyncio.Task):
+        self.dialogue_state = dialogue_state
+        self.case = case
+        self.task = task
+        self.created = time.monotonic()
+
+
+# Session id -> its speculation, oldest first
+_speculations: "OrderedDict[str, _Speculation]" = OrderedDict()
+_generating = 0
+
+
+async def _generate(prompt: list) -> Optional[Tuple[str, object]]:
+    """(reply, model that wrote it), or None if no model produced one"""
+    global _generating
+    # The submission is acknowledged by the full model, as in process_conversation
+    llm, llm_mini = get_models()
+
+    async def generate(chat_model, config):
+        response = await chat_model.ainvoke(prompt, config=config)
+        text = response.content.strip()
+        if not text:
+            raise ValueError(f"Empty reply from {getattr(chat_model, 'model_name', chat_model)}")
+        return text
+
+    _generating += 1
+    try:
+        return await call_model(SPECULATE_TAG, llm, llm_mini, generate, tags=[SPECULATE_TAG])
+    except Exception as e:
+        print(f"Error generating speculative reply: {e}")
+        return None
+    finally:
+        _generating -= 1
+
+
+def _drop(entry: _Speculation, outcome: str) -> None:
+    if not entry.task.done():
+        entry.task.cancel()
+    SPECULATIONS.inc(entry.dialogue_state, outcome)
+
+
+def _evict() -> None:
+    max_sessions = int(os.getenv("CALLTAKER_SPECULATION_SESSIONS", "10000"))
+    expires = time.monotonic() - float(os.getenv("CALLTAKER_SPECULATION_TTL", "600"))
+    while _speculations:
+        session_id, oldest = next(iter(_speculations.items()))
+        if len(_speculations) <= max_sessions and oldest.created > expires:
+            break
+        del _speculations[session_id]
+        _drop(oldest, "expired")
+
+
+def speculate(session_id: Optional[str], session) -> None:
+    """Start generating the reply the session's next turn most likely needs (call with the loop running)"""
+    if not session_id or not speculation_enabled():
+        return
+    discard(session_id)
+    prediction = predict_next(session)
+    if prediction is None or prediction[0] in TEMPLATED_STATES:
+        return
+    dialogue_state, case = prediction
+    if _generating >= int(os.getenv("CALLTAKER_SPECULATION_CONCURRENCY", "8")):
+        # Speculation only uses spare capacity
+        SPECULATIONS.inc(dialogue_state, "skipped")
+        return
+
+    # Built now: the session is updated in place by its next turn
+    complaint, mobile, address = case
+    prompt = build_reply_messages(
+        dialogue_state, complaint=complaint, mobile=mobile, address=address,
+        summary=session.summary, messages=tuple(session.messages)
+    )
+    task = asyncio.ensure_future(_generate(prompt))
+    _speculations[session_id] = _Speculation(dialogue_state, case, task)
+    SPECULATIONS.inc(dialogue_state, "started")
+    _evict()
+
+
+def discard(session_id: str) -> None:
+    """Drop the session's speculation (e.g. when the session is cleared)"""
+    entry = _speculations.pop(session_id, None)
+    if entry is not None:
+        _drop(entry, "discarded")
+
+
+def _turn_session_id() -> Optional[str]:
+    try:
+        return get_config().get("configurable", {}).get("session_id")
+    except RuntimeError:
+        return None
+
+
+async def claim(dialogue_state: str, case: Case, deadline: Optional[float]) -> Optional[Tuple[str, object]]:
+    """
+    The speculative (reply, model) for the current turn if it predicted this state and case.
+
+    Called once per turn from the graph: the session's speculation is removed whether it is used or
+    not. A matching speculation still being generated is waited for until the deadline.
+    """
+    session_id = _turn_session_id()
+    entry = _speculations.pop(session_id, None) if session_id else None
+    if entry is None:
+        return None
+    task = entry.task
+    predicted = (entry.dialogue_state, entry.case) == (dialogue_state, case)
+    if not predicted or task.get_loop() is not asyncio.get_running_loop():
+        _drop(entry, "miss")
+        return None
+    if not task.done():
+        await asyncio.wait([task], timeout=remaining(deadline))
+        if not task.done():
+            _drop(entry, "late")
+            return None
+    result = None if task.cancelled() else task.result()
+    SPECULATIONS.inc(entry.dialogue_state, "hit" if result is not None else "failed")
+    return result
+
+
+def _collect_speculation_stats():
+    yield ("calltaker_speculations_pending", "gauge", "Sessions with a speculative reply kept for their next turn",
+           [({}, len(_speculations))])
+
+
+register_collector(_collect_speculation_stats)
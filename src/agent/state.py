@@ -0,0 +1,138 @@
+"""
+Compact per-session state for the complaint agent
+Sessions are held as slotted objects between turns and only turned into dicts at the API boundary.
+Message history is a token-budgeted window plus a running summary (see memory.py).
+"""
+
+from collections import deque
+from dataclasses import dataclass, field, replace
+from types import MappingProxyType
+from typing import Any, Deque, Dict, Mapping, Optional, Tuple
+
+from .memory import MAX_UNSUMMARIZED_LINES, message_line, split_window
+
+CUSTOMER_FIELDS = (
+    "priorityId",
+    "sectorId",
+    "networkId",
+    "areaId",
+    "labId",
+    "commercialBranchCode",
+    "clientAddress",
+)
+
+# Shared read-only record for customers we know nothing about yet; updates always copy it first
+EMPTY_CUSTOMER_DATA: Mapping[str, Any] = MappingProxyType({name: None for name in CUSTOMER_FIELDS})
+
+
+
+def _message_history(messages=()) -> Deque:
+    return deque(messages)
+
+
+@dataclass(slots=True)
+class SessionState:
+    """State carried between turns of one conversation"""
+    complaint: Optional[str] = None
+    mobile_number: Optional[str] = None
+    is_registered: Optional[bool] = None
+    customer_data: Mapping[str, Any] = field(default_factory=lambda: EMPTY_CUSTOMER_DATA)
+    address_loaded_from_system: Optional[bool] = None
+    address_updated_by_user: Optional[bool] = None
+    confirmation: Optional[bool] = None
+    submitted: bool = False
+    # User messages whose extraction missed the turn budget, extracted on the next turn
+    deferred_messages: Tuple[str, ...] = ()
+    # How the last turn degraded to stay within budget (empty when it didn't)
+    degraded: Tuple[str, ...] = ()
+    # Running summary of messages that aged out of the window
+    summary: Optional[str] = None
+    # Aged-out transcript lines not yet folded into the summary
+    unsummarized: Tuple[str, ...] = ()
+    # Most recent messages, within the memory window's token budget
+    messages: Deque = field(default_factory=_message_history)
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> "SessionState":
+        """Build a session from a plain state dict (missing keys take their defaults)"""
+        if data is None:
+            return cls()
+        return cls(
+            complaint=data.get("complaint"),
+            mobile_number=data.get("mobile_number"),
+            is_registered=data.get("is_registered"),
+            customer_data=data.get("customer_data") or EMPTY_CUSTOMER_DATA,
+            address_loaded_from_system=data.get("address_loaded_from_system"),
+            address_updated_by_user=data.get("address_updated_by_user"),
+            confirmation=data.get("confirmation"),
+            submitted=data.get("submitted", False),
+            deferred_messages=tuple(data.get("deferred_messages") or ()),
+            degraded=tuple(data.get("degraded") or ()),
+            summary=data.get("summary"),
+            unsummarized=tuple(data.get("unsummarized") or ()),
+            messages=_message_history(data.get("messages", ())),
+        )
+
+    def copy(self) -> "SessionState":
+        """Independent copy: every field but the message window is immutable or replaced, never mutated"""
+        return replace(self, messages=_message_history(self.messages))
+
+    def to_dict(self, include_messages: bool = True) -> Dict[str, Any]:
+        """Plain dict view for API responses and serialization"""
+        data = {
+            "complaint": self.complaint,
+            "mobile_number": self.mobile_number,
+            "is_registered": self.is_registered,
+            "customer_data": dict(self.customer_data),
+            "address_loaded_from_system": self.address_loaded_from_system,
+            "address_updated_by_user": self.address_updated_by_user,
+            "confirmation": self.confirmation,
+            "submitted": self.submitted,
+            "deferred_messages": list(self.deferred_messages),
+            "degraded": list(self.degraded),
+            "summary": self.summary,
+            "unsummarized": list(self.unsummarized),
+        }
+        if include_messages:
+            data["messages"] = list(self.messages)
+        return data
+
+    def graph_input(self, user_message) -> Dict[str, Any]:
+        """Input state for one agent turn, ending with the new user message"""
+        return {
+            "messages": [*self.messages, user_message],
+            "complaint": self.complaint,
+            "mobile_number": self.mobile_number,
+            "is_registered": self.is_registered,
+            "customer_data": self.customer_data,
+            "address_loaded_from_system": self.address_loaded_from_system,
+            "address_updated_by_user": self.address_updated_by_user,
+            "confirmation": self.confirmation,
+            "submitted": self.submitted,
+            "deferred_messages": list(self.deferred_messages),
+            "summary": self.summary,
+            "unsummarized": self.unsummarized,
+        }
+
+    def apply_turn(self, result: Dict[str, Any], user_message, reply_message) -> None:
+        """Record the outcome of a turn in place"""
+        self.complaint = result.get("complaint")
+        self.mobile_number = result.get("mobile_number")
+        self.is_registered = result.get("is_registered")
+        self.customer_data = result.get("customer_data") or EMPTY_CUSTOMER_DATA
+        self.address_loaded_from_system = result.get("address_loaded_from_system")
+        self.address_updated_by_user = result.get("address_updated_by_user")
+        self.confirmation = result.get("confirmation")
+        self.submitted = result.get("submitted", False)
+        self.deferred_messages = tuple(result.get("deferred_messages") or ())
+        self.degraded = tuple(result.get("degraded") or ())
+        # The turn may have folded the oldest unsummarized lines into a new summary
+        self.summary = result.get("summary", self.summary)
+        unsummarized = self.unsummarized[result.get("summarized_lines") or 0:]
+        self.messages.append(user_message)
+        self.messages.append(reply_message)
+        aged_out, window = split_window(self.messages)
+        if aged_out:
+            self.messages = _message_history(window)
+            unsummarized += tuple(message_line(message) for message in aged_out)
+        self.unsummarized = unsummarized[-MAX_UNSUMMARIZED_LINES:]
@@ -0,0 +1,343 @@
+"""
+Complaint submission pipeline
+Confirmed complaints are written to a durable sqlite outbox before the reply is returned, then
+background workers drain the outbox in size- or time-bounded batches to the ticketing sink with
+retries. Each complaint carries an idempotency key scoped to the session and the turn that
+confirmed it, so retried turns and retried batches are never filed twice while a later repeat of
+the same complaint is. Sent complaints are purged after CALLTAKER_OUTBOX_RETENTION seconds.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Mapping, Optional
+
+import httpx
+
+
+class OutboxFull(Exception):
+    """Raised when too many complaints are waiting to be submitted"""
+
+
+def idempotency_key(session_id: Optional[str], turn_id: str, mobile_number: Optional[str], complaint: Optional[str],
+                    address: Optional[str]) -> str:
+    """Key of one confirmation: a rerun of the confirming turn maps to it, a later repeat of the complaint doesn't"""
+    raw = "\x00".join(value or "" for value in (session_id, turn_id, mobile_number, complaint, address))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def build_complaint_record(complaint: Optional[str], mobile_number: Optional[str], is_registered: Optional[bool],
+                           customer_data: Mapping[str, Any], session_id: Optional[str] = None,
+                           turn_id: Optional[str] = None) -> Dict[str, Any]:
+    """Payload sent to the ticketing system for one complaint (confirmed in turn_id; untagged turns get a fresh id)"""
+    turn_id = turn_id or uuid.uuid4().hex
+    return {
+        "idempotency_key": idempotency_key(session_id, turn_id, mobile_number, complaint,
+                                           customer_data.get("clientAddress")),
+        "complaint": complaint,
+        "mobile_number": mobile_number,
+        "is_registered": is_registered,
+        "customer_data": dict(customer_data),
+        "confirmed_at": time.time(),
+    }
+
+
+class ComplaintOutbox:
+    """Durable queue of confirmed complaints (sqlite, WAL, synchronous commits)"""
+
+    def __init__(self, db_path: str, max_pending: Optional[int] = None, lease_seconds: float = 60.0):
+        self.db_path = db_path
+        self.max_pending = max_pending
+        self.lease_seconds = lease_seconds
+        self._local = threading.local()
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "idempotency_key TEXT NOT NULL UNIQUE, "
+                "payload TEXT NOT NULL, "
+                "status TEXT NOT NULL DEFAULT 'pending', "  # pending, inflight, sent, failed
+                "attempts INTEGER NOT NULL DEFAULT 0, "
+                "next_attempt_at REAL NOT NULL, "
+                "created_at REAL NOT NULL, "
+                "last_error TEXT)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread"""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=10.0, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=FULL")
+            self._local.db = db
+        return db
+
+    def enqueue(self, record: Dict[str, Any]) -> bool:
+        """
+        Durably store a complaint. Returns False if the same complaint was already queued.
+
+        Raises OutboxFull when max_pending complaints are already waiting.
+        """
+        db = self._connect()
+        now = time.time()
+        # The capacity check and the insert are one transaction, so concurrent writers can't overshoot it
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            if self.max_pending is not None and self.pending_count() >= self.max_pending:
+                raise OutboxFull(f"{self.max_pending} complaints waiting for submission")
+            cursor = db.execute(
+                "INSERT OR IGNORE INTO outbox (idempotency_key, payload, next_attempt_at, created_at) "
+                "VALUES (?, ?, ?, ?)",
+                (record["idempotency_key"], json.dumps(record), now, now)
+            )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return cursor.rowcount == 1
+
+    def pending_count(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM outbox WHERE status = 'pending'").fetchone()[0]
+
+    def oldest_due(self) -> Optional[float]:
+        """created_at of the oldest complaint ready to send, or None"""
+        row = self._connect().execute(
+            "SELECT MIN(created_at) FROM outbox WHERE status = 'pending' AND next_attempt_at <= ?", (time.time(),)
+        ).fetchone()
+        return row[0]
+
+    def claim_batch(self, limit: int) -> List[tuple]:
+        """Atomically mark up to limit due complaints as in flight and return (id, payload) pairs"""
+        db = self._connect()
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            # Complaints claimed by a worker that died are released once their lease runs out
+            db.execute(
+                "UPDATE outbox SET status = 'pending' WHERE status = 'inflight' AND next_attempt_at <= ?", (now,)
+            )
+            rows = db.execute(
+                "SELECT id, payload FROM outbox WHERE status = 'pending' AND next_attempt_at <= ? "
+                "ORDER BY id LIMIT ?", (now, limit)
+            ).fetchall()
+            if rows:
+                db.executemany(
+                    "UPDATE outbox SET status = 'inflight', next_attempt_at = ? WHERE id = ?",
+                    [(now + self.lease_seconds, row[0]) for row in rows]
+                )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return rows
+
+    def mark_sent(self, ids: List[int]) -> None:
+        self._connect().executemany("UPDATE outbox SET status = 'sent' WHERE id = ?", [(i,) for i in ids])
+
+    def purge_sent(self, older_than_seconds: float) -> int:
+        """Delete sent complaints queued more than older_than_seconds ago; returns how many were deleted"""
+        cursor = self._connect().execute(
+            "DELETE FROM outbox WHERE status = 'sent' AND created_at < ?", (time.time() - older_than_seconds,)
+        )
+        return cursor.rowcount
+
+    def mark_failed(self, ids: List[int], error: str, max_attempts: int, backoff_seconds: float) -> None:
+        """Schedule a retry with exponential backoff, or give up after max_attempts"""
+        db = self._connect()
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            for outbox_id in ids:
+                attempts = db.execute("SELECT attempts FROM outbox WHERE id = ?", (outbox_id,)).fetchone()[0] + 1
+                status = "failed" if attempts >= max_attempts else "pending"
+                db.execute(
+                    "UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                    (status, attempts, now + backoff_seconds * 2 ** (attempts - 1), error[:500], outbox_id)
+                )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def counts(self) -> Dict[str, int]:
+        """Number of complaints per status"""
+        rows = self._connect().execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+        counts = {"pending": 0, "inflight": 0, "sent": 0, "failed": 0}
+        counts.update(dict(rows))
+        return counts
+
+
+class FileSink:
+    """Sink that appends each batch to a JSON Lines file (local stand-in for the ticketing system)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def submit_batch(self, records: List[Dict[str, Any]]) -> None:
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class HttpSink:
+    """Sink that POSTs each batch as a JSON array; the receiver deduplicates on idempotency_key"""
+
+    def __init__(self, url: str, timeout: float = 10.0):
+        self.url = url
+        self._client = httpx.Client(timeout=timeout)
+
+    def submit_batch(self, records: List[Dict[str, Any]]) -> None:
+        response = self._client.post(self.url, json=records)
+        response.raise_for_status()
+
+
+class SubmissionPipeline:
+    """Background workers draining the outbox to a sink in batches"""
+
+    def __init__(self, outbox: ComplaintOutbox, sink, batch_size: int = 50, max_wait_seconds: float = 2.0,
+                 workers: int = 2, max_attempts: int = 5, backoff_seconds: float = 1.0, poll_seconds: float = 0.2,
+                 retention_seconds: float = 86400.0, purge_every_seconds: float = 60.0):
+        self.outbox = outbox
+        self.sink = sink
+        self.batch_size = batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.poll_seconds = poll_seconds
+        self.retention_seconds = retention_seconds
+        self.purge_every_seconds = purge_every_seconds
+        self.batches_sent = 0
+        self.complaints_purged = 0
+        self._last_purge = 0.0
+        self.complaints_sent = 0
+        self.batch_failures = 0
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Start the worker threads (no-op if already running)"""
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"complaint-submitter-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the workers after their current batch"""
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def notify(self) -> None:
+        """Wake a worker to check whether a full batch is ready"""
+        self._wake.set()
+
+    def _batch_ready(self) -> bool:
+        oldest = self.outbox.oldest_due()
+        if oldest is None:
+            return False
+        return time.time() - oldest >= self.max_wait_seconds or self.outbox.pending_count() >= self.batch_size
+
+    def _purge_if_due(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_purge < self.purge_every_seconds:
+                return
+            self._last_purge = now
+        self.complaints_purged += self.outbox.purge_sent(self.retention_seconds)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._purge_if_due()
+                if self._batch_ready():
+                    self.drain_once()
+                    continue
+            except Exception as e:
+                print(f"Complaint submission worker error: {e}")
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+
+    def drain_once(self) -> int:
+        """Send one batch of due complaints; returns how many were sent"""
+        rows = self.outbox.claim_batch(self.batch_size)
+        if not rows:
+            return 0
+        ids = [row[0] for row in rows]
+        try:
+            self.sink.submit_batch([json.loads(row[1]) for row in rows])
+        except Exception as e:
+            self.batch_failures += 1
+            self.outbox.mark_failed(ids, str(e), self.max_attempts, self.backoff_seconds)
+            return 0
+        self.outbox.mark_sent(ids)
+        self.batches_sent += 1
+        self.complaints_sent += len(ids)
+        return len(ids)
+
+    def stats(self) -> Dict[str, Any]:
+        """Backpressure metrics: queue depth per status, age of the oldest due complaint, throughput"""
+        oldest = self.outbox.oldest_due()
+        return {
+            **self.outbox.counts(),
+            "oldest_pending_age_seconds": round(time.time() - oldest, 3) if oldest is not None else 0.0,
+            "batches_sent": self.batches_sent,
+            "complaints_sent": self.complaints_sent,
+            "batch_failures": self.batch_failures,
+            "complaints_purged": self.complaints_purged,
+            "running": bool(self._threads),
+        }
+
+
+def create_sink(spec: str):
+    """Sink from a spec: an http(s) URL, or a JSONL file path (optionally prefixed with file:)"""
+    if spec.startswith(("http://", "https://")):
+        return HttpSink(spec)
+    return FileSink(spec[len("file:"):] if spec.startswith("file:") else spec)
+
+
+_pipeline: Optional[SubmissionPipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def get_submission_pipeline() -> SubmissionPipeline:
+    """Shared pipeline configured from CALLTAKER_OUTBOX_DB / CALLTAKER_SUBMISSION_SINK, created on first use"""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            max_pending = os.getenv("CALLTAKER_OUTBOX_MAX_PENDING")
+            _pipeline = SubmissionPipeline(
+                ComplaintOutbox(os.getenv("CALLTAKER_OUTBOX_DB", "outbox.db"),
+                                max_pending=int(max_pending) if max_pending else None),
+                create_sink(os.getenv("CALLTAKER_SUBMISSION_SINK", "file:submitted_complaints.jsonl")),
+                batch_size=int(os.getenv("CALLTAKER_SUBMISSION_BATCH_SIZE", "50")),
+                max_wait_seconds=float(os.getenv("CALLTAKER_SUBMISSION_MAX_WAIT", "2.0")),
+                workers=int(os.getenv("CALLTAKER_SUBMISSION_WORKERS", "2")),
+                retention_seconds=float(os.getenv("CALLTAKER_OUTBOX_RETENTION", "86400")),
+            )
+        return _pipeline
+
+
+def submit_complaint_record(record: Dict[str, Any]) -> bool:
+    """Durably enqueue a confirmed complaint; returns False if it was already queued"""
+    pipeline = get_submission_pipeline()
+    queued = pipeline.outbox.enqueue(record)
+    pipeline.notify()
+    return queued
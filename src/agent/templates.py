@@ -0,0 +1,112 @@
+"""
+Response templates for deterministic dialogue states
+Fixed-text turns (ask for the address, decline follow-up, ...) are rendered locally instead of
+calling the model. Each state is opt-in; states without a template always go to the model.
+"""
+
+import os
+from typing import Optional
+
+# Phrasing variants per dialogue state. Slots: {address}, {complaint}
+RESPONSE_TEMPLATES = {
+    "ask_address": [
+        "Thank you. Can you please provide the address where the issue is happening?",
+        "Thank you! Could you share the location where you're experiencing this issue?",
+        "Thanks for that. What's the address where the problem is happening, please?",
+    ],
+    "ask_new_address": [
+        "Of course, could you please provide the address where the issue is happening?",
+        "Sure thing! What's the address you'd like me to use for this report?",
+        "No problem. Please tell me the address where the issue is happening.",
+    ],
+    "declined": [
+        "No problem! What would you like to change or update?",
+        "That's completely fine. What would you like me to change?",
+        "Of course, no worries. What should I update before we continue?",
+    ],
+    "anything_else": [
+        "Is there anything else I can help you with today?",
+        "Do you have another issue you'd like to report? I'm here to help.",
+        "Is there anything else you'd like to report today?",
+    ],
+    "submitted": [
+        "Great, thank you. Your issue has been reported successfully. Our technical team will review it "
+        "and should contact you soon for a visit. If you need anything else in the meantime, I'm here to help.",
+        "Perfect, thank you. Your issue has been reported successfully. Our team will look into this and "
+        "contact you shortly. If you need anything else in the meantime, I'm here to help.",
+    ],
+    "confirm_address": [
+        "Just to confirm, you're reporting: {complaint}, at this address: {address}. "
+        "Anything else you'd like to add before I submit the report?",
+    ],
+    "confirm_new_address": [
+        "Thank you for the new address. Just to confirm, you're reporting: {complaint}, at this address: "
+        "{address}. Anything else you'd like to add before I submit the report?",
+    ],
+    "confirm_registered_address": [
+        "Thank you. Let me check... yes, I see an address linked to this number. It shows as: {address}. "
+        "Should I file the complaint for this location, or would you prefer to use a different one?",
+    ],
+}
+
+# States rendered from templates by default; override with a comma-separated CALLTAKER_TEMPLATED_STATES
+DEFAULT_TEMPLATED_STATES = "ask_address,ask_new_address,declined,anything_else,submitted"
+
+
+def _load_templated_states() -> frozenset:
+    """Read the opted-in states from the environment"""
+    configured = os.getenv("CALLTAKER_TEMPLATED_STATES", DEFAULT_TEMPLATED_STATES)
+    return frozenset(name.strip() for name in configured.split(",") if name.strip() in RESPONSE_TEMPLATES)
+
+
+TEMPLATED_STATES = _load_templated_states()
+
+
+# Last-resort replies when the model misses the turn deadline, for states without a usable template
+FALLBACK_REPLIES = {
+    "greeting": "Hi, I'm Alora, your customer service assistant. I'm here to help you report any technical "
+                "issues. Could you describe the issue you're experiencing?",
+    "ask_phone": "I'm really sorry you're dealing with that. Let's get this sorted right away. "
+                 "Can we start with your phone number, please?",
+    "confirm_address": "Just to confirm, should I go ahead and submit your report for this address?",
+    "confirm_new_address": "Thank you for the new address. Should I go ahead and submit your report?",
+    "confirm_registered_address": "Thank you. I see an address linked to this number. "
+                                  "Should I file the complaint for this location?",
+    "continue": "Sorry, could you say that again, please?",
+}
+
+
+def render_fallback(dialogue_state: str, turn: int = 0, **slots) -> str:
+    """
+    Reply for a dialogue state that never needs the model (used when the turn runs out of time).
+
+    Uses the state's template when its slots are available, otherwise a fixed utterance.
+    """
+    variants = RESPONSE_TEMPLATES.get(dialogue_state)
+    if variants:
+        slots = {name: value for name, value in slots.items() if value}
+        try:
+            return variants[turn % len(variants)].format(**slots)
+        except KeyError:
+            pass
+    return FALLBACK_REPLIES.get(dialogue_state, FALLBACK_REPLIES["continue"])
+
+
+def render_reply(dialogue_state: str, turn: int = 0, **slots) -> Optional[str]:
+    """
+    Render the reply for a dialogue state, or None if the state should go to the model.
+
+    Args:
+        dialogue_state: Name of the branch taken in process_conversation
+        turn: Turn index, used to rotate between phrasing variants
+        **slots: Values for the template placeholders (address, complaint)
+    """
+    if dialogue_state not in TEMPLATED_STATES:
+        return None
+    variants = RESPONSE_TEMPLATES[dialogue_state]
+    slots = {name: value for name, value in slots.items() if value}
+    try:
+        return variants[turn % len(variants)].format(**slots)
+    except (KeyError, IndexError):
+        # Missing slot value - let the model phrase it
+        return None
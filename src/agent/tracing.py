@@ -0,0 +1,271 @@
+"""
+Per-turn trace flight recorder
+When a turn is sampled, a callback handler records a span tree for it: the graph run, each node,
+every model call with its prompt, response, timing and tokens, and the branch should_continue
+took. The trace also captures extraction results (cached or not), how the reply was produced, and
+the session state before and after the turn. Finished traces go to a bounded in-memory ring buffer
+and, optionally, to rotating JSONL files. benchmarks/replay.py re-runs a recorded turn offline.
+
+Off unless CALLTAKER_TRACE_SAMPLE is set (fraction of turns to record, e.g. 0.05).
+"""
+
+import json
+import logging
+import logging.handlers
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from .metrics import EXTRACT_TAG, purpose_of
+from .prompts import PREFIX_STATES, PREFIX_VERSION
+
+_active: ContextVar[Optional["TurnTrace"]] = ContextVar("calltaker_trace", default=None)
+
+
+def trace_event(kind: str, **data: Any) -> None:
+    """Attach an event to the turn being traced (no-op when the turn isn't sampled)"""
+    trace = _active.get()
+    if trace is not None:
+        trace.events.append({"kind": kind, "at_ms": trace.elapsed_ms(), **data})
+
+
+def session_snapshot(session) -> Dict[str, Any]:
+    """Full session state, with messages as [type, content] pairs, for recording and replay"""
+    data = session.to_dict(include_messages=False)
+    data["messages"] = [[message.type, message.content] for message in session.messages]
+    return data
+
+
+def _state_diff(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, List[Any]]:
+    return {key: [before.get(key), after.get(key)]
+            for key in after if key != "messages" and before.get(key) != after.get(key)}
+
+
+class TurnTrace(BaseCallbackHandler):
+    """Span tree and events for one traced turn"""
+    run_inline = True
+
+    def __init__(self, session_id: Optional[str], user_message: str, state_before: Dict[str, Any], mode: str):
+        self.trace_id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.user_message = user_message
+        self.state_before = state_before
+        self.mode = mode
+        self.started_at = time.time()
+        self.events: List[Dict[str, Any]] = []
+        self._start = time.perf_counter()
+        self._spans: Dict[str, Dict[str, Any]] = {}
+
+    def elapsed_ms(self) -> float:
+        return round((time.perf_counter() - self._start) * 1000, 3)
+
+    def _open(self, run_id: UUID, parent_run_id: Optional[UUID], kind: str, name: str, **data: Any) -> None:
+        self._spans[str(run_id)] = {
+            "id": str(run_id),
+            "parent": str(parent_run_id) if parent_run_id else None,
+            "kind": kind,
+            "name": name,
+            "start_ms": self.elapsed_ms(),
+            **data,
+        }
+
+    def _close(self, run_id: UUID, **data: Any) -> Optional[Dict[str, Any]]:
+        span = self._spans.get(str(run_id))
+        if span is not None:
+            span["duration_ms"] = round(self.elapsed_ms() - span["start_ms"], 3)
+            span.update(data)
+        return span
+
+    def on_chain_start(self, serialized, inputs, *, run_id: UUID, parent_run_id: Optional[UUID] = None,
+                       tags: Optional[List[str]] = None, metadata: Optional[Dict[str, Any]] = None,
+                       **kwargs: Any) -> None:
+        name = kwargs.get("name") or (serialized or {}).get("name") or "chain"
+        if parent_run_id is None:
+            kind = "graph"
+        elif name == (metadata or {}).get("langgraph_node"):
+            kind = "node"
+        elif name == "should_continue":
+            kind = "branch"
+        elif EXTRACT_TAG in (tags or ()):
+            kind = "extraction"
+        else:
+            kind = "chain"
+        self._open(run_id, parent_run_id, kind, name)
+
+    def on_chain_end(self, outputs, *, run_id: UUID, **kwargs: Any) -> None:
+        span = self._close(run_id)
+        if span is not None and span["kind"] == "branch":
+            span["output"] = outputs
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._close(run_id, error=repr(error))
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, parent_run_id: Optional[UUID] = None,
+                            tags: Optional[List[str]] = None, metadata: Optional[Dict[str, Any]] = None,
+                            **kwargs: Any) -> None:
+        messages = messages[0] if messages else []
+        # Stable reply prefixes are recorded by dialogue state and version only
+        prompt = [[message.type, f"<reply prefix {PREFIX_STATES[message.content]}@{PREFIX_VERSION}>"
+                   if message.content in PREFIX_STATES else message.content]
+                  for message in messages]
+        model = (metadata or {}).get("ls_model_name") or "unknown"
+        self._open(run_id, parent_run_id, "llm", model, purpose=purpose_of(tags), prompt=prompt,
+                   prompt_chars=sum(len(str(message.content)) for message in messages))
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any) -> None:
+        data: Dict[str, Any] = {}
+        try:
+            message = response.generations[0][0].message
+            data["response"] = message.content
+            if getattr(message, "tool_calls", None):
+                data["tool_calls"] = [{"name": call["name"], "args": call["args"]} for call in message.tool_calls]
+            usage = message.usage_metadata
+            if usage:
+                data["tokens"] = {"prompt": usage.get("input_tokens", 0), "completion": usage.get("output_tokens", 0)}
+        except (AttributeError, IndexError):
+            pass
+        self._close(run_id, **data)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._close(run_id, error=repr(error))
+
+    def _tree(self) -> List[Dict[str, Any]]:
+        """Spans nested under their parents (roots first, children in start order)"""
+        spans = {span_id: {**span, "children": []} for span_id, span in self._spans.items()}
+        roots = []
+        for span in sorted(spans.values(), key=lambda s: s["start_ms"]):
+            parent = spans.get(span["parent"]) if span["parent"] else None
+            (parent["children"] if parent is not None else roots).append(span)
+        return roots
+
+    def finish(self, session, error: Optional[BaseException] = None) -> Dict[str, Any]:
+        """The trace record; session is the (in-place updated) session after the turn"""
+        state_after = session_snapshot(session)
+        branches = [span["output"] for span in self._spans.values() if span["kind"] == "branch" and "output" in span]
+        llm_spans = [span for span in self._spans.values() if span["kind"] == "llm"]
+        return {
+            "trace_id": self.trace_id,
+            "session_id": self.session_id,
+            "mode": self.mode,
+            "started_at": self.started_at,
+            "duration_ms": self.elapsed_ms(),
+            "user_message": self.user_message,
+            "reply": None if error else (state_after["messages"][-1][1] if state_after["messages"] else None),
+            "error": repr(error) if error else None,
+            "branch": branches[-1] if branches else None,
+            "llm_calls": len(llm_spans),
+            "state_before": self.state_before,
+            "state_diff": _state_diff(self.state_before, state_after),
+            "events": self.events,
+            "spans": self._tree(),
+        }
+
+
+class TraceRecorder:
+    """Sampling, ring buffer and rotating JSONL output for turn traces"""
+
+    def __init__(self, sample_rate: float = 0.0, buffer_size: int = 500, path: Optional[str] = None,
+                 max_bytes: int = 10_000_000, backups: int = 5):
+        self.sample_rate = sample_rate
+        self.path = path
+        self._buffer: Deque[Dict[str, Any]] = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        self._logger = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups,
+                                                           encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._logger = logging.getLogger(f"calltaker.traces.{path}")
+            self._logger.propagate = False
+            self._logger.setLevel(logging.INFO)
+            self._logger.addHandler(handler)
+
+    @classmethod
+    def from_env(cls) -> "TraceRecorder":
+        return cls(
+            sample_rate=float(os.getenv("CALLTAKER_TRACE_SAMPLE", "0")),
+            buffer_size=int(os.getenv("CALLTAKER_TRACE_BUFFER", "500")),
+            path=os.getenv("CALLTAKER_TRACE_FILE") or None,
+            max_bytes=int(os.getenv("CALLTAKER_TRACE_MAX_BYTES", "10000000")),
+            backups=int(os.getenv("CALLTAKER_TRACE_BACKUPS", "5")),
+        )
+
+    def should_sample(self) -> bool:
+        return self.sample_rate > 0 and (self.sample_rate >= 1 or random.random() < self.sample_rate)
+
+    def record(self, trace: Dict[str, Any]) -> None:
+        with self._lock:
+            self._buffer.append(trace)
+        if self._logger is not None:
+            self._logger.info(json.dumps(trace, default=str, ensure_ascii=False))
+
+    def for_session(self, session_id: str, include_files: bool = False) -> List[Dict[str, Any]]:
+        """Traces of one session, oldest first (ring buffer, plus the JSONL files if asked)"""
+        with self._lock:
+            found = {t["trace_id"]: t for t in self._buffer if t["session_id"] == session_id}
+        if include_files and self.path:
+            for trace in read_traces(self.path, include_rotated=True):
+                if trace.get("session_id") == session_id:
+                    found.setdefault(trace["trace_id"], trace)
+        return sorted(found.values(), key=lambda t: t["started_at"])
+
+
+def read_traces(path: str, include_rotated: bool = False) -> Iterator[Dict[str, Any]]:
+    """Yield traces from a JSONL file (and its rotated backups, oldest first)"""
+    paths = [path]
+    if include_rotated:
+        # RotatingFileHandler keeps path.1 (newest) .. path.N (oldest)
+        index = 1
+        while os.path.exists(f"{path}.{index}"):
+            paths.insert(0, f"{path}.{index}")
+            index += 1
+    for file_path in paths:
+        if not os.path.exists(file_path):
+            continue
+        with open(file_path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+recorder = TraceRecorder.from_env()
+
+
+@contextmanager
+def traced_turn(session_id: Optional[str], user_message: str, session, mode: str) -> Iterator[Optional[TurnTrace]]:
+    """
+    Trace one turn if it is sampled; yields the TurnTrace to pass as a graph callback, or None.
+
+    The session must be updated in place during the block (SessionState.apply_turn does).
+    """
+    if not recorder.should_sample():
+        yield None
+        return
+    trace = TurnTrace(session_id, user_message, session_snapshot(session), mode)
+    token = _active.set(trace)
+    error = None
+    try:
+        yield trace
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        try:
+            _active.reset(token)
+        except ValueError:
+            # A streaming turn closed from another context (e.g. client disconnect)
+            _active.set(None)
+        try:
+            recorder.record(trace.finish(session, error))
+        except Exception as e:
+            print(f"Failed to record trace: {e}")
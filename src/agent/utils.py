@@ -2,107 +2,159 @@
 Utility functions for the complaint agent
 """
 
-from typing import Tuple
-from langchain_core.messages import HumanMessage
-from .complaint_agent import agent, AgentState
+import asyncio
+import time
+import uuid
+from typing import Any, AsyncIterator, Optional, Tuple, Union
+from langchain_core.messages import HumanMessage, AIMessage
+from .complaint_agent import REPLY_TAG, get_agent
+from .budget import new_deadline
+from .clients import release_loop_clients
+from .model_calls import HEDGE_TAG
+from .speculation import speculate
+from .metrics import TURN_SECONDS
+from .state import SessionState
+from .tracing import traced_turn
 
 
-def process_user_message(user_input: str, current_state: dict = None) -> Tuple[str, dict]:
+def _as_session(current_state: Union[SessionState, dict, None]) -> SessionState:
+    """Accept a SessionState, a plain state dict, or None for a new conversation"""
+    if isinstance(current_state, SessionState):
+        return current_state
+    return SessionState.from_dict(current_state)
+
+
+def _reply_message(result: dict) -> AIMessage:
+    """Get the assistant reply from the graph output"""
+    messages = result.get("messages", [])
+    for msg in reversed(messages):
+        if isinstance(msg, AIMessage) and msg.content:
+            return msg
+
+    # If no response found, this is an error - should not happen
+    raise Exception("No response generated by agent")
+
+
+def _turn_config(budget: Optional[float], session_id: Optional[str] = None, turn_id: Optional[str] = None) -> dict:
+    """
+    Graph config for one turn, carrying its deadline (see budget.py), session (see speculation.py)
+    and turn id (the client's, or a fresh one; scopes the complaint's idempotency key, see submission.py)
+    """
+    return {"recursion_limit": 20, "configurable": {
+        "turn_deadline": new_deadline(budget),
+        "session_id": session_id,
+        "turn_id": turn_id or uuid.uuid4().hex,
+    }}
+
+
+async def aprocess_user_message(
+    user_input: str, current_state: Union[SessionState, dict, None] = None, session_id: Optional[str] = None,
+    budget: Optional[float] = None, turn_id: Optional[str] = None
+) -> Tuple[str, SessionState]:
     """
     Process a user message through the agent and return the response and updated state.
-    
+
     Args:
         user_input: The user's message
-        current_state: Current agent state (optional)
-    
+        current_state: Current session state (optional); a SessionState is updated in place
+        session_id: Session id recorded with sampled turn traces (optional)
+        budget: Turn latency budget in seconds (optional, defaults to CALLTAKER_TURN_BUDGET)
+        turn_id: Client id of the turn, so a rerun of it doesn't queue its complaint twice (optional)
+
     Returns:
         Tuple of (response_text, updated_state)
     """
-    from langchain_core.messages import AIMessage
-    
-    # Initialize state if not provided
-    if current_state is None:
-        state = {
-            "messages": [],
-            "complaint": None,
-            "mobile_number": None,
-            "is_registered": None,
-            "customer_data": {
-                "priorityId": None,
-                "sectorId": None,
-                "networkId": None,
-                "areaId": None,
-                "labId": None,
-                "commercialBranchCode": None,
-                "clientAddress": None
-            },
-            "address_loaded_from_system": None,
-            "address_updated_by_user": None,
-            "confirmation": None,
-            "submitted": False
-        }
-    else:
-        # Deep copy the state, preserving messages and other fields
-        state = {
-            "messages": list(current_state.get("messages", [])),  # Copy message list
-            "complaint": current_state.get("complaint"),
-            "mobile_number": current_state.get("mobile_number"),
-            "is_registered": current_state.get("is_registered"),
-            "customer_data": current_state.get("customer_data", {
-                "priorityId": None,
-                "sectorId": None,
-                "networkId": None,
-                "areaId": None,
-                "labId": None,
-                "commercialBranchCode": None,
-                "clientAddress": None
-            }),
-            "address_loaded_from_system": current_state.get("address_loaded_from_system"),
-            "address_updated_by_user": current_state.get("address_updated_by_user"),
-            "confirmation": current_state.get("confirmation"),
-            "submitted": current_state.get("submitted", False)
-        }
-    
-    # Add user message to state
+    session = _as_session(current_state)
     user_message = HumanMessage(content=user_input)
-    state["messages"] = state.get("messages", []) + [user_message]
-    
+
     # Invoke the agent
-    config = {"recursion_limit": 20}
-    result = agent.invoke(state, config)
-    
-    # Get the last assistant message
-    response_text = None
-    messages = result.get("messages", [])
-    for msg in reversed(messages):
-        if isinstance(msg, AIMessage) and msg.content:
-            response_text = msg.content
-            break
-    
-    # If no response found, this is an error - should not happen
-    if response_text is None:
-        raise Exception("No response generated by agent")
-    
-    # Return response and updated state (but don't store all messages to avoid memory issues)
-    updated_state = {
-        "complaint": result.get("complaint"),
-        "mobile_number": result.get("mobile_number"),
-        "is_registered": result.get("is_registered"),
-        "customer_data": result.get("customer_data", {
-            "priorityId": None,
-            "sectorId": None,
-            "networkId": None,
-            "areaId": None,
-            "labId": None,
-            "commercialBranchCode": None,
-            "clientAddress": None
-        }),
-        "address_loaded_from_system": result.get("address_loaded_from_system"),
-        "address_updated_by_user": result.get("address_updated_by_user"),
-        "confirmation": result.get("confirmation"),
-        "submitted": result.get("submitted", False),
-        "messages": messages[-10:] if len(messages) > 10 else messages  # Keep only last 10 messages
-    }
-    
-    return response_text, updated_state
+    config = _turn_config(budget, session_id, turn_id)
+    with traced_turn(session_id, user_input, session, "invoke") as trace:
+        if trace is not None:
+            config["callbacks"] = [trace]
+        started = time.perf_counter()
+        result = await get_agent().ainvoke(session.graph_input(user_message), config)
+        TURN_SECONDS.observe(time.perf_counter() - started, "invoke")
+
+        reply = _reply_message(result)
+        session.apply_turn(result, user_message, reply)
+    # Prepare the next turn's likely reply while the caller reads this one
+    speculate(session_id, session)
+    return reply.content, session
+
+
+async def astream_user_message(
+    user_input: str, current_state: Union[SessionState, dict, None] = None, session_id: Optional[str] = None,
+    budget: Optional[float] = None, turn_id: Optional[str] = None
+) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Process a user message through the agent, streaming the reply as it is generated.
+
+    Yields ("token", text) for every reply token, then a single ("done", (response_text, updated_state)).
+    ("reset", None) comes in between when the tokens streamed so far turn out not to be the reply: the
+    call streaming them failed partway and another one took over (its tokens follow), or the reply came
+    from a hedged request or a fallback template instead (response_text has it).
+
+    Args:
+        user_input: The user's message
+        current_state: Current session state (optional); a SessionState is updated in place
+        session_id: Session id recorded with sampled turn traces (optional)
+        budget: Turn latency budget in seconds (optional, defaults to CALLTAKER_TURN_BUDGET)
+        turn_id: Client id of the turn, so a rerun of it doesn't queue its complaint twice (optional)
+    """
+    session = _as_session(current_state)
+    user_message = HumanMessage(content=user_input)
+
+    config = _turn_config(budget, session_id, turn_id)
+    result = None
+    streamed, streaming_id = "", None
+    with traced_turn(session_id, user_input, session, "stream") as trace:
+        if trace is not None:
+            config["callbacks"] = [trace]
+        started = time.perf_counter()
+        async for mode, chunk in get_agent().astream(session.graph_input(user_message), config, stream_mode=["messages", "values"]):
+            if mode == "messages":
+                message_chunk, metadata = chunk
+                # Only forward tokens from the primary reply call, not extraction output or hedged requests
+                tags = metadata.get("tags", [])
+                if REPLY_TAG in tags and HEDGE_TAG not in tags and message_chunk.content:
+                    if streamed and message_chunk.id != streaming_id:
+                        # A different reply call: the one streamed so far failed partway
+                        yield "reset", None
+                        streamed = ""
+                    streaming_id = message_chunk.id
+                    streamed += message_chunk.content
+                    yield "token", message_chunk.content
+            else:
+                result = chunk
+        TURN_SECONDS.observe(time.perf_counter() - started, "stream")
+
+        reply = _reply_message(result)
+        session.apply_turn(result, user_message, reply)
+    speculate(session_id, session)
+    if streamed and streamed.strip() != reply.content.strip():
+        yield "reset", None
+    yield "done", (reply.content, session)
+
+
+def process_user_message(
+    user_input: str, current_state: Union[SessionState, dict, None] = None
+) -> Tuple[str, SessionState]:
+    """
+    Synchronous wrapper around aprocess_user_message for callers without an event loop (e.g. Streamlit).
+
+    Args:
+        user_input: The user's message
+        current_state: Current session state (optional)
+
+    Returns:
+        Tuple of (response_text, updated_state)
+    """
+    async def turn():
+        try:
+            return await aprocess_user_message(user_input, current_state)
+        finally:
+            # The loop ends with this turn: close the connections it opened rather than leave them behind
+            await release_loop_clients()
 
+    return asyncio.run(turn())
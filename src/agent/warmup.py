@@ -0,0 +1,92 @@
+"""
+Worker warm-up
+Builds what the first turn would otherwise pay for (the compiled graph, the model clients, the
+gazetteer, the intent classifier and the tokenizer) and opens keep-alive connections to the model
+API ahead of traffic, so a readiness probe can hold requests back until the worker is warm.
+
+    CALLTAKER_WARMUP_CONNECTIONS=2   connections opened at startup (0 skips it, e.g. offline)
+"""
+
+import asyncio
+import os
+import time
+from typing import Any, Dict
+
+from .clients import api_base_url, get_http_clients, get_models
+from .complaint_agent import get_agent
+from .gazetteer import get_gazetteer
+from .intent import get_intent_classifier
+from .memory import tokenizer_name
+from .metrics import register_collector
+
+# Connection attempts before the worker is marked ready without them
+WARMUP_ATTEMPTS = 3
+
+_status: Dict[str, Any] = {"ready": False, "seconds": None, "connections": 0, "error": None}
+
+
+def is_ready() -> bool:
+    return _status["ready"]
+
+
+def warmup_status() -> Dict[str, Any]:
+    """Whether the worker is warm, how long warming took and how many connections it opened"""
+    return dict(_status)
+
+
+def prime() -> None:
+    """Build the shared objects used by every turn"""
+    get_agent()
+    get_models()
+    get_gazetteer()
+    get_intent_classifier()
+    tokenizer_name()
+
+
+async def open_connections(count: int, timeout: float = 5.0) -> int:
+    """Open up to count pooled connections to the model API; returns how many got a response"""
+    _, client = get_http_clients()
+    url = f"{api_base_url()}/models"
+    headers = {"Authorization": f"Bearer {os.getenv('OPENAI_API_KEY', '')}"}
+    # Concurrent requests each need their own connection; any HTTP response means it was set up
+    responses = await asyncio.gather(
+        *(client.get(url, headers=headers, timeout=timeout) for _ in range(count)), return_exceptions=True
+    )
+    return sum(not isinstance(response, BaseException) for response in responses)
+
+
+async def warm_up() -> Dict[str, Any]:
+    """
+    Warm this worker, then mark it ready.
+
+    The worker stays not ready if building the shared objects fails. If the model API can't be
+    reached it is still marked ready after WARMUP_ATTEMPTS tries (turns then degrade per call,
+    see model_calls), with the connections opened reported in the status.
+    """
+    started = time.perf_counter()
+    try:
+        # Graph compilation and file loads are blocking work; keep them off the event loop
+        await asyncio.to_thread(prime)
+    except Exception as e:
+        print(f"Warm-up failed: {e}")
+        _status["error"] = f"{type(e).__name__}: {e}"
+        return warmup_status()
+
+    wanted = int(os.getenv("CALLTAKER_WARMUP_CONNECTIONS", "2"))
+    for attempt in range(WARMUP_ATTEMPTS if wanted > 0 else 0):
+        _status["connections"] = await open_connections(wanted)
+        if _status["connections"] == wanted:
+            break
+        print(f"Warm-up opened {_status['connections']}/{wanted} model API connections")
+        if attempt < WARMUP_ATTEMPTS - 1:
+            await asyncio.sleep(2 ** attempt)
+
+    _status.update(ready=True, seconds=round(time.perf_counter() - started, 3), error=None)
+    return warmup_status()
+
+
+def _collect_readiness():
+    yield "calltaker_ready", "gauge", "1 once the worker has finished warming up", [({}, int(_status["ready"]))]
+
+
+register_collector(_collect_readiness)
@@ -1,5 +1,9 @@
+import uuid
+
 import streamlit as st
 from src.agent.utils import process_user_message
+from src.agent.state import SessionState
+from src.agent.submission import get_submission_pipeline
 
 # Page configuration
 st.set_page_config(
@@ -8,27 +12,15 @@ st.set_page_config(
     layout="wide"
 )
 
+# Drain queued complaints in the background (start() is a no-op on reruns)
+get_submission_pipeline().start()
+
 # Initialize chat history and agent state
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
 if "agent_state" not in st.session_state:
-    st.session_state.agent_state = {
-        "complaint": None,
-        "mobile_number": None,
-        "is_registered": None,
-        "customer_data": {
-            "priorityId": None,
-            "sectorId": None,
-            "networkId": None,
-            "areaId": None,
-            "labId": None,
-            "commercialBranchCode": None,
-            "clientAddress": None
-        },
-        "confirmation": None,
-        "submitted": False
-    }
+    st.session_state.agent_state = SessionState()
 
 # Custom CSS for better UI
 st.markdown("""
@@ -59,13 +51,14 @@ with st.sidebar:
     # Always display state dict if it exists
     if st.session_state.agent_state is not None:
         # Display state dict without emojis
+        state = st.session_state.agent_state
         state_dict = {
-            "complaint": st.session_state.agent_state.get("complaint"),
-            "mobile_number": st.session_state.agent_state.get("mobile_number"),
-            "is_registered": st.session_state.agent_state.get("is_registered"),
-            "customer_data": st.session_state.agent_state.get("customer_data"),
-            "confirmation": st.session_state.agent_state.get("confirmation"),
-            "submitted": st.session_state.agent_state.get("submitted", False)
+            "complaint": state.complaint,
+            "mobile_number": state.mobile_number,
+            "is_registered": state.is_registered,
+            "customer_data": dict(state.customer_data),
+            "confirmation": state.confirmation,
+            "submitted": state.submitted
         }
         st.json(state_dict)
     else:
@@ -81,18 +74,18 @@ with chat_container:
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
 
+
+def start_turn():
+    """Give each submitted message its own turn id"""
+    st.session_state.turn_id = str(uuid.uuid4())
+
+
 # Chat input
-if prompt := st.chat_input("Type your complaint or question here..."):
-    # Check if we've already processed this exact message (to avoid duplicate on rerun)
-    last_two = st.session_state.messages[-2:] if len(st.session_state.messages) >= 2 else []
-    already_processed = (
-        len(last_two) == 2 and 
-        last_two[0].get("role") == "user" and 
-        last_two[0].get("content") == prompt and
-        last_two[1].get("role") == "assistant"
-    )
-    
-    if not already_processed:
+if prompt := st.chat_input("Type your complaint or question here...", on_submit=start_turn):
+    # A rerun hands back the same submission under the same turn id: run each turn once
+    if st.session_state.get("turn_id") != st.session_state.get("last_turn_id"):
+        st.session_state.last_turn_id = st.session_state.get("turn_id")
+        
         # Add user message to chat history
         st.session_state.messages.append({"role": "user", "content": prompt})
         
@@ -108,23 +101,8 @@ if prompt := st.chat_input("Type your complaint or question here..."):
                         prompt, 
                         st.session_state.agent_state
                     )
-                    # Update state immediately - ensure all fields are present
-                    st.session_state.agent_state = {
-                        "complaint": updated_state.get("complaint"),
-                        "mobile_number": updated_state.get("mobile_number"),
-                        "is_registered": updated_state.get("is_registered"),
-                        "customer_data": updated_state.get("customer_data", {
-                            "priorityId": None,
-                            "sectorId": None,
-                            "networkId": None,
-                            "areaId": None,
-                            "labId": None,
-                            "commercialBranchCode": None,
-                            "clientAddress": None
-                        }),
-                        "confirmation": updated_state.get("confirmation"),
-                        "submitted": updated_state.get("submitted", False)
-                    }
+                    # SessionState is updated in place and keeps the message history between turns
+                    st.session_state.agent_state = updated_state
                     st.markdown(response)
                     st.session_state.messages.append({"role": "assistant", "content": response})
                     # Force rerun to update sidebar with new state
@@ -133,31 +111,10 @@ if prompt := st.chat_input("Type your complaint or question here..."):
                     error_msg = f"Error: {str(e)}. Please check your .env file has OPENAI_API_KEY set."
                     st.error(error_msg)
                     st.session_state.messages.append({"role": "assistant", "content": error_msg})
-    else:
-        # Just display the messages (already processed)
-        with st.chat_message("user"):
-            st.markdown(prompt)
-        with st.chat_message("assistant"):
-            st.markdown(st.session_state.messages[-1]["content"])
 
 # Clear chat button
 if st.button("Clear Chat"):
     st.session_state.messages = []
-    st.session_state.agent_state = {
-        "complaint": None,
-        "mobile_number": None,
-        "is_registered": None,
-        "customer_data": {
-            "priorityId": None,
-            "sectorId": None,
-            "networkId": None,
-            "areaId": None,
-            "labId": None,
-            "commercialBranchCode": None,
-            "clientAddress": None
-        },
-        "confirmation": None,
-        "submitted": False
-    }
+    st.session_state.agent_state = SessionState()
     st.rerun()
 
@@ -0,0 +1,92 @@
+"""
+Shared test setup
+Tests drive the agent with the benchmark fakes (benchmarks/fake_llm.py) or the local model API stub
+(benchmarks/stub_openai.py); complaints go to an outbox in each test's temporary directory.
+"""
+
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Read at import by some modules: set before anything from src is imported
+_workdir = tempfile.mkdtemp(prefix="calltaker-tests-")
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+os.environ["CALLTAKER_OUTBOX_DB"] = os.path.join(_workdir, "outbox.db")
+os.environ["CALLTAKER_SUBMISSION_SINK"] = f"file:{os.path.join(_workdir, 'submitted.jsonl')}"
+os.environ["CALLTAKER_WARMUP_CONNECTIONS"] = "0"
+
+from benchmarks.fake_llm import FakeScript, install_fake_models  # noqa: E402
+from src.agent import submission  # noqa: E402
+from src.agent.cache import extraction_cache, reply_cache  # noqa: E402
+from src.agent.clients import close_http_clients  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def _fresh_caches():
+    extraction_cache.clear()
+    reply_cache.clear()
+    yield
+
+
+@pytest.fixture
+def outbox(tmp_path, monkeypatch):
+    """The complaint outbox turns enqueue into, empty and not drained"""
+    pipeline = submission.SubmissionPipeline(
+        submission.ComplaintOutbox(str(tmp_path / "outbox.db")),
+        submission.FileSink(str(tmp_path / "submitted.jsonl")),
+    )
+    monkeypatch.setattr(submission, "_pipeline", pipeline)
+    return pipeline.outbox
+
+
+@pytest.fixture
+def fake_script():
+    """Fake llm/llm_mini for the test; fill in extractions keyed by user message"""
+    script = FakeScript()
+    restore = install_fake_models(script)
+    yield script
+    restore()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture(scope="session")
+def stub_api():
+    """Base URL of the OpenAI-compatible stub, served from a background thread"""
+    import uvicorn
+    from benchmarks import stub_openai
+
+    stub_openai.config.latency = stub_openai.LatencyDistribution("0.01")
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(stub_openai.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError("Model API stub did not start")
+        time.sleep(0.02)
+    yield f"http://127.0.0.1:{port}/v1"
+    server.should_exit = True
+    thread.join(timeout=5)
+
+
+@pytest.fixture
+def stub_models(stub_api, monkeypatch):
+    """Real chat models pointed at the stub (built afresh for the test)"""
+    monkeypatch.setenv("OPENAI_BASE_URL", stub_api)
+    asyncio.run(close_http_clients())
+    yield stub_api
+    asyncio.run(close_http_clients())
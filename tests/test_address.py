@@ -0,0 +1,45 @@
+import asyncio
+
+from src.agent.gazetteer import resolve_address
+from src.agent.utils import aprocess_user_message
+
+UNREGISTERED_PHONE = "01012345678"
+
+
+def test_address_mentioned_with_the_complaint_keeps_only_the_address(fake_script, outbox):
+    message = f"My router is broken, I am in Maadi, number {UNREGISTERED_PHONE}"
+    fake_script.extractions[message] = {"complaint": "Router is broken"}
+
+    _, state = asyncio.run(aprocess_user_message(message))
+
+    assert state.is_registered is False
+    assert state.customer_data["clientAddress"] == "Maadi"
+    assert state.customer_data["resolvedAddress"] == "Maadi, Cairo Governorate, Egypt"
+
+
+def test_place_name_in_passing_is_not_taken_for_the_address(fake_script, outbox):
+    message = f"I cannot open the Al Ahram website, my number is {UNREGISTERED_PHONE}"
+    fake_script.extractions[message] = {"complaint": "Cannot open the Al Ahram website"}
+
+    _, state = asyncio.run(aprocess_user_message(message))
+
+    assert state.customer_data["clientAddress"] is None
+
+
+def test_answer_to_the_address_prompt_resolves_without_a_cue(fake_script, outbox):
+    first = f"My router is broken, my number is {UNREGISTERED_PHONE}"
+    fake_script.extractions[first] = {"complaint": "Router is broken"}
+    _, state = asyncio.run(aprocess_user_message(first))
+    assert state.customer_data["clientAddress"] is None
+
+    _, state = asyncio.run(aprocess_user_message("Dokki", state))
+
+    assert state.customer_data["clientAddress"] == "Dokki"
+    assert state.customer_data["resolvedAddress"] == "Dokki, Giza Governorate, Egypt"
+
+
+def test_address_text_keeps_building_details_but_not_the_phone_number():
+    resolved = resolve_address(f"I live at 15 Abbas El Akkad St, Nasr City, apartment 4, call {UNREGISTERED_PHONE}")
+
+    assert resolved.text == "15 Abbas El Akkad St, Nasr City, apartment 4"
+    assert resolved.canonical == "15 Abbas El Akkad, Nasr City, Cairo Governorate, Egypt"
@@ -0,0 +1,35 @@
+from benchmarks.run import check_outcomes, compare
+from benchmarks.scenarios import SCENARIOS
+
+
+def _results(**overrides):
+    scenarios = {
+        scenario.name: {"llm_calls": 3, "prompt_tokens": 700, "wall_ms": 100.0, "queued": list(scenario.queued)}
+        for scenario in SCENARIOS
+    }
+    for name, values in overrides.items():
+        scenarios[name].update(values)
+    return {"meta": {"tokenizer": "chars/4"}, "scenarios": scenarios}
+
+
+def test_more_calls_or_prompt_tokens_fail_against_the_baseline():
+    baseline = _results()
+    failures, _ = compare(_results(decline={"llm_calls": 4}, registered_caller={"prompt_tokens": 701}),
+                          baseline, tolerance=0.25, slack_ms=10.0)
+
+    assert len(failures) == 2
+
+
+def test_slower_runs_only_warn():
+    baseline = _results()
+    failures, warnings = compare(_results(decline={"wall_ms": 1000.0}), baseline, tolerance=0.25, slack_ms=10.0)
+
+    assert failures == []
+    assert len(warnings) == 1
+
+
+def test_lost_complaint_fails_the_run():
+    results = _results(multi_complaint={"queued": ["Internet connection drops every few minutes"]})
+
+    assert check_outcomes(_results()) == []
+    assert [failure.split(":")[0] for failure in check_outcomes(results)] == ["multi_complaint"]
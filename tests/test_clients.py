@@ -0,0 +1,19 @@
+from benchmarks.scenarios import SCENARIOS
+from benchmarks.stub_openai import REPLY_TEXT
+from src.agent.metrics import MODEL_FALLBACKS
+from src.agent.utils import process_user_message
+
+
+def test_sync_turns_reuse_no_connections_from_a_closed_loop(stub_models, outbox):
+    # Each sync turn runs in its own asyncio.run; the second used to hit the first loop's pooled
+    # connections ("Event loop is closed") and fall back to the mini model
+    fallbacks = MODEL_FALLBACKS.value("reply", "error")
+    turns = SCENARIOS[0].turns
+
+    first_reply, state = process_user_message(turns[0].message)
+    second_reply, state = process_user_message(turns[1].message, state)
+
+    assert first_reply == REPLY_TEXT
+    assert second_reply == REPLY_TEXT
+    assert state.mobile_number == turns[1].extraction["phone_number"]
+    assert MODEL_FALLBACKS.value("reply", "error") == fallbacks
@@ -0,0 +1,36 @@
+import asyncio
+
+import pytest
+
+from src.agent.intent import classify_intents, may_contain
+from src.agent.utils import aprocess_user_message
+
+COMPLAINT = "Internet has been down since yesterday"
+
+
+@pytest.mark.parametrize("message", [
+    "النت مقطوع من امبارح",          # Egyptian Arabic
+    "el net fasel men embare7",      # Franco-Arabic
+    "我家的网络从昨天开始就断了",      # a script the classifier never saw
+])
+def test_non_english_complaint_reaches_extraction(message, fake_script, outbox):
+    fake_script.extractions[message] = {"complaint": COMPLAINT}
+
+    _, state = asyncio.run(aprocess_user_message(message))
+
+    assert [call.purpose for call in fake_script.calls].count("extract") == 1
+    assert state.complaint == COMPLAINT
+
+
+def test_unknown_text_is_not_decided():
+    scores = classify_intents("我家的网络从昨天开始就断了")
+
+    assert not scores.decided()
+    assert all(may_contain(scores, label) for label in ("provides_complaint", "provides_phone", "provides_address"))
+
+
+def test_small_talk_still_skips_extraction():
+    scores = classify_intents("thanks a lot")
+
+    assert scores.decided()
+    assert not may_contain(scores, "provides_complaint")
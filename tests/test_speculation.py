@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from benchmarks.scenarios import SCENARIOS, Turn
+from src.agent import speculation, templates
+from src.agent.metrics import REPLIES, SPECULATIONS
+from src.agent.state import SessionState
+from src.agent.utils import aprocess_user_message
+
+SESSION_ID = "speculation-test"
+READ_BACK = SCENARIOS[0].turns[:2]  # Complaint, then a registered number: the details are read back
+
+
+@pytest.fixture
+def speculating(monkeypatch):
+    """Speculation on, with the submission acknowledgement left to the model"""
+    monkeypatch.setenv("CALLTAKER_SPECULATE", "1")
+    states = templates.TEMPLATED_STATES - {"submitted"}
+    monkeypatch.setattr(templates, "TEMPLATED_STATES", states)
+    monkeypatch.setattr(speculation, "TEMPLATED_STATES", states)
+
+
+def _run(turns, fake_script):
+    fake_script.extractions = {turn.message: turn.extraction for turn in turns}
+
+    async def conversation():
+        # One loop for the whole conversation, as in the backend: speculations run between turns
+        state = SessionState()
+        for turn in turns[:-1]:
+            _, state = await aprocess_user_message(turn.message, state, session_id=SESSION_ID)
+        calls = len(fake_script.calls)
+        _, state = await aprocess_user_message(turns[-1].message, state, session_id=SESSION_ID)
+        return [call.purpose for call in fake_script.calls[calls:]]
+
+    return asyncio.run(conversation())
+
+
+def test_speculated_reply_is_used_when_the_caller_confirms(speculating, fake_script, outbox):
+    hits, speculative = SPECULATIONS.value("submitted", "hit"), REPLIES.value("speculative", "gpt-4o")
+
+    last_turn_calls = _run([*READ_BACK, Turn("Yes, that's correct", {"intent": "confirm"})], fake_script)
+
+    assert "speculate" in [call.purpose for call in fake_script.calls]
+    assert "reply" not in last_turn_calls
+    assert SPECULATIONS.value("submitted", "hit") == hits + 1
+    assert REPLIES.value("speculative", "gpt-4o") == speculative + 1
+
+
+@pytest.mark.parametrize("answer", [
+    Turn("No", {"intent": "decline"}),
+    Turn("No, use 5 Tahrir Street, Dokki", {"address": "5 Tahrir Street, Dokki", "intent": "change_address"}),
+])
+def test_speculated_reply_is_dropped_when_the_state_changes(answer, speculating, fake_script, outbox):
+    misses, speculative = SPECULATIONS.value("submitted", "miss"), REPLIES.value("speculative", "gpt-4o")
+
+    _run([*READ_BACK, answer], fake_script)
+
+    assert SPECULATIONS.value("submitted", "miss") == misses + 1
+    assert REPLIES.value("speculative", "gpt-4o") == speculative
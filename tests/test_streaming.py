@@ -0,0 +1,73 @@
+import asyncio
+
+from langchain_core.messages import AIMessageChunk
+from langchain_core.outputs import ChatGenerationChunk
+
+from benchmarks.fake_llm import FakeChatModel
+from src.agent.clients import set_models
+from src.agent.metrics import REPLIES
+from src.agent.utils import astream_user_message
+
+MESSAGE = "My internet has been down since this morning"
+PARTIAL = ["I'm so sorry ", "to hear "]
+
+
+class StreamThenFail(FakeChatModel):
+    """Streams the start of a reply, then stalls (hang=True) or drops the connection"""
+    hang: bool = False
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        self._record("reply", "")
+        for text in PARTIAL:
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=text))
+            if run_manager is not None:
+                await run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
+        if self.hang:
+            await asyncio.sleep(30)
+        raise ConnectionError("Stream dropped")
+
+
+def _stream(fake_script, primary, budget=None):
+    fake_script.extractions[MESSAGE] = {"complaint": "Internet has been down since this morning"}
+    previous = set_models((primary, FakeChatModel(model_name="gpt-4o-mini", script=fake_script)))
+
+    async def collect():
+        return [(kind, payload) async for kind, payload in astream_user_message(MESSAGE, budget=budget)]
+
+    try:
+        return asyncio.run(collect())
+    finally:
+        set_models(previous)
+
+
+def _spoken_after_last_reset(events):
+    kinds = [kind for kind, _ in events]
+    start = len(kinds) - kinds[::-1].index("reset") if "reset" in kinds else 0
+    return "".join(payload for kind, payload in events[start:] if kind == "token")
+
+
+def test_reply_that_fails_midstream_is_reset_before_the_fallback_streams(fake_script, outbox):
+    events = _stream(fake_script, StreamThenFail(model_name="gpt-4o", script=fake_script))
+
+    kinds = [kind for kind, _ in events]
+    assert kinds[:3] == ["token", "token", "reset"]
+    response, _ = events[-1][1]
+    assert response == fake_script.reply_text
+    assert _spoken_after_last_reset(events) == response
+
+
+def test_streamed_tokens_are_reset_when_a_template_answers_instead(fake_script, outbox):
+    fallbacks = REPLIES.value("fallback", "")
+
+    events = _stream(fake_script, StreamThenFail(model_name="gpt-4o", script=fake_script, hang=True), budget=1.0)
+
+    kinds = [kind for kind, _ in events]
+    assert kinds == ["token", "token", "reset", "done"]
+    assert REPLIES.value("fallback", "") == fallbacks + 1
+
+
+def test_no_reset_when_the_streamed_reply_is_the_response(fake_script, outbox):
+    events = _stream(fake_script, FakeChatModel(model_name="gpt-4o", script=fake_script))
+
+    assert [kind for kind, _ in events] == ["token", "done"]
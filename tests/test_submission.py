@@ -0,0 +1,38 @@
+import asyncio
+import json
+
+import pytest
+
+from benchmarks.scenarios import SCENARIOS
+from src.agent.state import SessionState
+from src.agent.utils import aprocess_user_message
+
+
+def _run_scenario(name, fake_script):
+    scenario = next(scenario for scenario in SCENARIOS if scenario.name == name)
+    fake_script.extractions = {turn.message: turn.extraction for turn in scenario.turns}
+    state = SessionState()
+    for turn in scenario.turns:
+        _, state = asyncio.run(aprocess_user_message(turn.message, state))
+    return state
+
+
+def _queued(outbox):
+    return [json.loads(payload) for _, payload in outbox.claim_batch(10)]
+
+
+@pytest.mark.parametrize("scenario", SCENARIOS, ids=lambda scenario: scenario.name)
+def test_scenario_queues_its_complaints(scenario, fake_script, outbox):
+    # multi_complaint used to lose its second complaint: submitted stayed set after the first
+    state = _run_scenario(scenario.name, fake_script)
+
+    assert [record["complaint"] for record in _queued(outbox)] == scenario.queued
+    assert state.submitted
+
+
+def test_caller_who_declined_can_correct_the_address_and_confirm(fake_script, outbox):
+    _run_scenario("decline", fake_script)
+
+    [record] = _queued(outbox)
+    assert record["complaint"] == "Electricity meter is broken"
+    assert record["customer_data"]["clientAddress"] == "20 Makram Ebeid, Nasr City"